@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User, UserSearchToken
+from lms_project.tenancy import tenant_db
+
+
+class Command(BaseCommand):
+    help = "Rebuild the user directory search tokens, e.g. after bulk imports that bypass User.save()"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk, done = 0, 0
+        while True:
+            users = list(User.objects.filter(pk__gt=last_pk).order_by('pk').only('email', 'full_name')[:batch_size])
+            if not users:
+                break
+            with transaction.atomic(using=tenant_db()):
+                UserSearchToken.objects.reindex(users)
+            last_pk = users[-1].pk
+            done += len(users)
+            self.stdout.write(f"Indexed {done} users...")
+        self.stdout.write(self.style.SUCCESS(f"Done, {done} users indexed"))
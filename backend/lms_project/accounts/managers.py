@@ -1,4 +1,8 @@
 from django.contrib.auth.models import BaseUserManager
+from django.db import models
+
+from .search import search_tokens
+
 
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -17,3 +21,16 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault('role', 'admin')
 
         return self.create_user(email, password, **extra_fields)
+
+
+class UserSearchTokenManager(models.Manager):
+    # Bulk user writes skip User.save(), see accounts.search.search_tokens
+    def reindex(self, users, replace=True):
+        """Replace the search tokens of ``users``; replace=False for users that have none yet"""
+        users = list(users)
+        if replace:
+            self.filter(user__in=[user.pk for user in users]).delete()
+        self.bulk_create([
+            self.model(user_id=user.pk, token=token)
+            for user in users for token in search_tokens(user.email, user.full_name)
+        ])
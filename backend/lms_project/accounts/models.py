@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
-from .managers import UserManager
+from .managers import UserManager, UserSearchTokenManager
 from django.utils import timezone
 
 # Create your models here.
@@ -36,5 +36,50 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
 
+    class Meta:
+        # Keyset pages of the admin directory, newest first, optionally within a role or status
+        indexes = [
+            models.Index(fields=['date_joined', 'id'], name='user_joined_idx'),
+            models.Index(fields=['role', 'date_joined', 'id'], name='user_role_joined_idx'),
+            models.Index(fields=['is_active', 'date_joined', 'id'], name='user_active_joined_idx'),
+        ]
+
+    def __str__(self):
+        return self.email
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._indexed = (instance.__dict__.get('email'), instance.__dict__.get('full_name'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Only rebuild search tokens when the searchable fields changed
+        if getattr(self, '_indexed', None) == (self.email, self.full_name):
+            return super().save(*args, **kwargs)
+        adding = self._state.adding
+        # save(using=...) outside a request must not send the tokens to the current tenant's database
+        alias = kwargs.get('using') or router.db_for_write(User, instance=self)
+        with transaction.atomic(using=alias):
+            super().save(*args, **kwargs)
+            UserSearchToken.objects.db_manager(alias).reindex([self], replace=not adding)
+        self._indexed = (self.email, self.full_name)
+
+
+class UserSearchToken(models.Model):
+    """Lower-cased email and name words of a user, for prefix search (see accounts.search)"""
+    user = models.ForeignKey(User, related_name='search_tokens', on_delete=models.CASCADE, db_index=False)
+    token = models.CharField(max_length=64)
+
+    objects = UserSearchTokenManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'user'], name='user_search_token_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'token'], name='user_search_token_uniq'),
+        ]
+
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.token
\ No newline at end of file
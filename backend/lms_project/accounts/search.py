@@ -0,0 +1,84 @@
+"""
+Prefix search and keyset paging for the admin user directory.
+
+Each user has a few lower-cased search tokens (the email, the words of
+its local part and the words of the full name) in UserSearchToken,
+indexed on (token, user). A search term is matched as a prefix of any
+token with a plain range (``token >= term AND token < term + U+10FFFF``),
+which any b-tree can serve, unlike LIKE or case-insensitive lookups.
+Several terms must all match.
+
+Pages are ordered newest first on (date_joined, id) and continue from an
+opaque cursor holding the last row's key, so page 1000 costs the same as
+page 1.
+"""
+import base64
+import re
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+TOKEN_LENGTH = 64
+WORD_RE = re.compile(r'\w+')
+MAX_CHAR = '\U0010ffff'
+
+
+def search_tokens(email, full_name):
+    """
+    Tokens stored for a user. User.save() writes them; bulk_create(),
+    bulk_update() and QuerySet.update() do not, so their callers must run
+    UserSearchToken.objects.reindex() (or manage.py reindex_users).
+    """
+    email = (email or '').lower()
+    words = WORD_RE.findall(email.split('@')[0]) + WORD_RE.findall((full_name or '').lower())
+    return {token[:TOKEN_LENGTH] for token in [email, *words] if token}
+
+
+def search_terms(query):
+    return [term[:TOKEN_LENGTH] for term in query.lower().split()]
+
+
+def prefix_filter(term, field='token'):
+    return Q(**{f'{field}__gte': term, f'{field}__lt': term + MAX_CHAR})
+
+
+def search_users(users, query):
+    """Users with a token starting with every term of ``query``"""
+    from .models import UserSearchToken
+
+    for term in search_terms(query):
+        users = users.filter(pk__in=UserSearchToken.objects.filter(prefix_filter(term)).values('user'))
+    return users
+
+
+def encode_cursor(user):
+    raw = f"{user['date_joined'].isoformat()}|{user['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(date_joined, id) from a cursor, or ValueError if it was tampered with"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        joined, pk = raw.rsplit('|', 1)
+        date_joined = parse_datetime(joined)
+        if date_joined is None:
+            raise ValueError
+        return date_joined, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_page(users, limit, cursor=None):
+    """
+    One page of ``users`` (a values() queryset with id and date_joined),
+    newest first. Returns (rows, cursor of the next page or None).
+    """
+    users = users.order_by('-date_joined', '-id')
+    if cursor:
+        date_joined, pk = decode_cursor(cursor)
+        users = users.filter(Q(date_joined__lt=date_joined) | Q(date_joined=date_joined, id__lt=pk))
+    rows = list(users[:limit + 1])
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
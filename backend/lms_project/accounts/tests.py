@@ -1,3 +1,60 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import User, UserSearchToken
+
+
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='pass12345', full_name='Admin', role='admin'
+        )
+        self.jane = User.objects.create_user(
+            email='jane.doe@example.com', password='pass12345', full_name='Jane Doe', role='student'
+        )
+        self.john = User.objects.create_user(
+            email='jsmith@example.com', password='pass12345', full_name='John Smith', role='instructor'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def emails(self, query=''):
+        response = self.client.get(f'/api/users/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [row['email'] for row in response.data['results']]
+
+    def test_prefix_search_on_email_and_name(self):
+        self.assertEqual(self.emails('q=DOE'), ['jane.doe@example.com'])
+        self.assertEqual(self.emails('q=jsm'), ['jsmith@example.com'])
+        self.assertEqual(self.emails('q=j+smi'), ['jsmith@example.com'])
+        self.assertEqual(self.emails('q=oe'), [])
+
+    def test_filters(self):
+        self.jane.is_active = False
+        self.jane.save()
+        self.assertEqual(self.emails('role=instructor'), ['jsmith@example.com'])
+        self.assertEqual(self.emails('is_active=false'), ['jane.doe@example.com'])
+        self.assertEqual(self.client.get('/api/users/?role=owner').status_code, 400)
+        self.assertEqual(self.client.get('/api/users/?is_active=maybe').status_code, 400)
+
+    def test_cursor_pages_cover_every_user_once(self):
+        seen, cursor = [], ''
+        while True:
+            response = self.client.get(f'/api/users/?limit=2{cursor}')
+            seen += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            cursor = f"&cursor={response.data['next']}"
+        self.assertEqual(sorted(seen), sorted(User.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(self.client.get('/api/users/?cursor=garbage').status_code, 400)
+
+    def test_tokens_follow_profile_changes(self):
+        self.jane.full_name = 'Jane Roe'
+        self.jane.save()
+        self.assertEqual(self.emails('q=roe'), ['jane.doe@example.com'])
+        self.assertEqual(self.emails('q=jane+doe'), ['jane.doe@example.com'])
+        self.assertEqual(
+            set(UserSearchToken.objects.filter(user=self.jane).values_list('token', flat=True)),
+            {'jane.doe@example.com', 'jane', 'doe', 'roe'},
+        )
@@ -0,0 +1,124 @@
+"""
+JWT authentication for tenant databases.
+
+User ids are only unique within one tenant's database, so a token carries
+the slug of the tenant that issued it and is accepted only by that tenant
+(lms_project/tenancy.py resolves the tenant before authentication runs).
+Revoked tokens are rejected through api.revocation, which answers from
+memory unless its filter reports a hit.
+
+A login starts a session: its refresh token gets a ``sid`` claim, which
+simplejwt copies into every access token minted from it and which rotation
+keeps. Logout revokes the session, so access tokens the client refreshed
+earlier stop working too instead of living out their lifetime.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+
+from accounts.models import User
+from lms_project.tenancy import CLAIM, UnknownTenant, current_tenant, use_tenant
+from .revocation import is_revoked, is_session_revoked, revoke, revoke_session
+
+SESSION_CLAIM = 'sid'
+
+
+def tokens_for(user):
+    """Refresh token (with its access token) for a user of the current tenant"""
+    refresh = RefreshToken.for_user(user)
+    refresh[SESSION_CLAIM] = refresh[api_settings.JTI_CLAIM]
+    if current_tenant():
+        refresh[CLAIM] = current_tenant()
+    return refresh
+
+
+def validated_refresh(raw_token):
+    """
+    RefreshToken for a raw token that is valid, not revoked, and whose user is
+    still active; raises InvalidToken otherwise. Refresh tokens come in the
+    body, where TenantMiddleware does not look, so the token's own (verified)
+    tenant claim picks the database unless the request named a tenant too.
+    Callers run their own queries under use_tenant(refresh.get(CLAIM)).
+    """
+    try:
+        refresh = RefreshToken(raw_token)
+    except TokenError as e:
+        raise InvalidToken(str(e))
+    tenant = refresh.get(CLAIM)
+    if current_tenant() is not None and tenant != current_tenant():
+        raise InvalidToken("Token belongs to another organization")
+    try:
+        with use_tenant(tenant):
+            if is_revoked(refresh) or session_revoked(refresh):
+                raise InvalidToken("Token has been revoked")
+            user_id = refresh.get(api_settings.USER_ID_CLAIM)
+            if not User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}, is_active=True).exists():
+                raise InvalidToken("User not found or inactive")
+    except UnknownTenant:
+        raise InvalidToken("Token belongs to an unknown organization")
+    return refresh
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that rejects revoked tokens and tokens issued by another tenant"""
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        # Before the revocation check, which reads the current tenant's database
+        if validated_token.get(CLAIM) != current_tenant():
+            raise AuthenticationFailed("Token belongs to another organization", code='wrong_tenant')
+        if is_revoked(validated_token) or session_revoked(validated_token):
+            raise InvalidToken("Token has been revoked")
+        return validated_token
+
+
+def session_revoked(token):
+    session_id = token.get(SESSION_CLAIM)
+    # Tokens issued before sessions existed have none
+    return session_id is not None and is_session_revoked(session_id)
+
+
+def end_session(token):
+    """Revoke the session of a validated token, long enough to outlive every token in it"""
+    session_id = token.get(SESSION_CLAIM)
+    if session_id is None:
+        return False
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME + api_settings.ACCESS_TOKEN_LIFETIME
+    return revoke_session(session_id, timezone.now() + lifetime)
+
+
+class StreamTicket(Token):
+    """
+    Opens the live dashboard stream once. Browsers cannot set headers on
+    EventSource connections, so the stream takes this in the URL instead of
+    an access token, which would then end up in server and proxy logs.
+    """
+    token_type = 'stream'
+    lifetime = timedelta(seconds=getattr(settings, 'LIVE_FEED_TICKET_LIFETIME', 30))
+
+
+def stream_ticket_for(user):
+    ticket = StreamTicket.for_user(user)
+    if current_tenant():
+        ticket[CLAIM] = current_tenant()
+    return ticket
+
+
+def redeem_stream_ticket(raw_token):
+    """User of an unused, unexpired stream ticket of the current tenant; raises InvalidToken"""
+    try:
+        ticket = StreamTicket(raw_token)
+    except TokenError as e:
+        raise InvalidToken(str(e))
+    if ticket.get(CLAIM) != current_tenant():
+        raise InvalidToken("Ticket belongs to another organization")
+    # Revoking it is what uses it up, in every worker
+    if not revoke(ticket):
+        raise InvalidToken("Ticket has already been used")
+    return TenantJWTAuthentication().get_user(ticket)
@@ -0,0 +1,130 @@
+"""
+Helpers for the request batching endpoint (BatchAPIView).
+
+Sub-requests are dispatched straight to the resolved view with the user
+already authenticated by the outer request, so JWT validation runs once per
+batch. Consecutive GET sub-requests run concurrently in a thread pool;
+anything else runs on its own, in order, so writes keep their sequencing.
+"""
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+
+from lms_project.tenancy import bind
+
+MAX_SUBREQUESTS = getattr(settings, 'BATCH_MAX_SUBREQUESTS', 20)
+MAX_WORKERS = getattr(settings, 'BATCH_MAX_WORKERS', 4)
+ALLOWED_PREFIXES = ('/api/', '/lms/')
+ALLOWED_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+
+class SubRequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def validate_subrequest(item):
+    """Normalize one entry of the batch payload or raise SubRequestError"""
+    if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+        raise SubRequestError(400, "Each request needs a 'path'")
+    method = str(item.get('method', 'GET')).upper()
+    if method not in ALLOWED_METHODS:
+        raise SubRequestError(405, f"Method {method} is not allowed in a batch")
+    url = urlsplit(item['path'])
+    if not url.path.startswith(ALLOWED_PREFIXES):
+        raise SubRequestError(400, "Only /api/ and /lms/ routes can be batched")
+    return {'method': method, 'path': url.path, 'query': url.query, 'body': item.get('body')}
+
+
+def _build_request(parent, subrequest):
+    body = b'' if subrequest['body'] is None else json.dumps(subrequest['body']).encode()
+    environ = {
+        key: value for key, value in parent.META.items()
+        if key.startswith('HTTP_') or key in ('SERVER_NAME', 'SERVER_PORT', 'REMOTE_ADDR', 'SCRIPT_NAME')
+    }
+    environ.update({
+        'REQUEST_METHOD': subrequest['method'],
+        'PATH_INFO': subrequest['path'],
+        'QUERY_STRING': subrequest['query'],
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': parent.scheme,
+    })
+    request = WSGIRequest(environ)
+    # DRF's Request honours these and skips its authenticators
+    request._force_auth_user = parent.user
+    request._force_auth_token = parent.auth
+    return request
+
+
+def _response_body(response):
+    if hasattr(response, 'data'):
+        return response.data
+    if response.streaming:
+        # Releases what it streams from, such as a FileResponse's open file
+        response.close()
+        raise SubRequestError(400, "Streaming endpoints cannot be batched")
+    content = response.content.decode(response.charset or 'utf-8')
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(content) if content else None
+    return content
+
+
+def execute(parent, subrequest):
+    """Run one validated sub-request and return its {status, body} entry"""
+    try:
+        match = resolve(subrequest['path'])
+    except Resolver404:
+        return {'status': 404, 'body': {'error': 'Not found'}}
+    if match.url_name == 'batch' or iscoroutinefunction(match.func):
+        return {'status': 400, 'body': {'error': 'This endpoint cannot be batched'}}
+
+    try:
+        response = match.func(_build_request(parent, subrequest), *match.args, **match.kwargs)
+        return {'status': response.status_code, 'body': _response_body(response)}
+    except Http404:
+        return {'status': 404, 'body': {'error': 'Not found'}}
+    except SubRequestError as e:
+        return {'status': e.status, 'body': {'error': e.message}}
+
+
+def _execute_in_thread(parent, subrequest):
+    try:
+        return execute(parent, subrequest)
+    finally:
+        connections.close_all()
+
+
+def execute_all(parent, subrequests):
+    """Run a batch, fanning out runs of consecutive GETs to the thread pool"""
+    results = [None] * len(subrequests)
+    run_in_thread = bind(_execute_in_thread)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        index = 0
+        while index < len(subrequests):
+            if subrequests[index]['method'] != 'GET':
+                results[index] = execute(parent, subrequests[index])
+                index += 1
+                continue
+            end = index
+            while end < len(subrequests) and subrequests[end]['method'] == 'GET':
+                end += 1
+            if end - index == 1:
+                results[index] = execute(parent, subrequests[index])
+            else:
+                futures = {i: pool.submit(run_in_thread, parent, subrequests[i]) for i in range(index, end)}
+                for i, future in futures.items():
+                    results[i] = future.result()
+            index = end
+    return results
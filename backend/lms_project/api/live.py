@@ -0,0 +1,162 @@
+"""
+Live admin dashboard feed over Server-Sent Events.
+
+One LiveFeed per process and tenant tails the outbox and fans the result
+out to every connected admin, so N open dashboards cost one poll and one
+aggregation instead of N polling loops rerunning DashboardSummaryAPIView. The stream is
+an async view and needs an ASGI server (see lms_project/asgi.py).
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from lms.models import Enrollment, OutboxEvent
+from lms.projections import counter_deltas, current_counters
+from lms_project.tenancy import current_tenant
+
+from .authentication import TenantJWTAuthentication, redeem_stream_ticket
+
+POLL_INTERVAL = getattr(settings, 'LIVE_FEED_POLL_INTERVAL', 1.0)
+KEEPALIVE_INTERVAL = 15
+QUEUE_SIZE = 100
+
+
+class LiveFeed:
+    """Shared outbox tail; each subscriber gets its own bounded queue"""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.subscribers = set()
+        self.totals = None
+        self.last_event_id = None
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.totals is not None:
+            queue.put_nowait(('snapshot', dict(self.totals)))
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, name, data):
+        for queue in self.subscribers:
+            if queue.full():
+                # Slow consumer: drop its oldest message rather than block everyone
+                queue.get_nowait()
+            queue.put_nowait((name, data))
+
+    def _prime(self):
+        head = OutboxEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        return head, current_counters()
+
+    def _poll(self):
+        events = list(OutboxEvent.objects.filter(pk__gt=self.last_event_id).order_by('pk')[:1000])
+        if not events:
+            return [], {}
+        new_ids = [e.aggregate_id for e in events if e.event_type == 'enrollment.created']
+        enrollments = Enrollment.objects.filter(pk__in=new_ids).select_related('student', 'course')
+        new_enrollments = [{
+            'id': e.id,
+            'student': e.student.full_name,
+            'course': e.course.title,
+            'enrolled_at': e.enrolled_at,
+        } for e in enrollments]
+        self.last_event_id = events[-1].pk
+        return new_enrollments, counter_deltas(events)
+
+    async def _run(self):
+        try:
+            # Totals are computed once per feed, not once per connected admin
+            self.last_event_id, self.totals = await sync_to_async(self._prime)()
+            # Copies: queued messages must not change as the totals move on
+            self.publish('snapshot', dict(self.totals))
+            while self.subscribers:
+                await asyncio.sleep(self.interval)
+                new_enrollments, deltas = await sync_to_async(self._poll)()
+                deltas = {key: delta for key, delta in deltas.items() if delta}
+                if deltas:
+                    for key, delta in deltas.items():
+                        self.totals[key] = self.totals.get(key, 0) + delta
+                    self.publish('counters', {'deltas': deltas, 'totals': dict(self.totals)})
+                for enrollment in new_enrollments:
+                    self.publish('enrollment', enrollment)
+        finally:
+            # Restarted by the next subscriber with fresh totals
+            self.totals = None
+
+
+feeds = {}
+
+
+def feed_for(tenant):
+    # The polling task copies the context of the first subscriber, tenant included
+    if tenant not in feeds:
+        feeds[tenant] = LiveFeed()
+    return feeds[tenant]
+
+
+def _format(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def _stream(feed, queue):
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                name, data = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield _format(name, data)
+    finally:
+        feed.unsubscribe(queue)
+
+
+async def _authenticate(request):
+    """
+    Access token from the Authorization header, or a single-use ?ticket=
+    since browsers cannot set headers on EventSource connections.
+    """
+    if request.GET.get('ticket'):
+        return await sync_to_async(redeem_stream_ticket)(request.GET['ticket'])
+    auth = TenantJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    # Checking revocation may query the database
+    validated = await sync_to_async(auth.get_validated_token)(raw_token)
+    return await sync_to_async(auth.get_user)(validated)
+
+
+async def dashboard_stream(request):
+    """
+    Live admin dashboard (Admin only)
+    GET /api/dashboard/stream/?ticket=<ticket from POST /api/dashboard/stream/ticket/>
+    Emits `snapshot`, `counters` (deltas and totals) and `enrollment` events.
+    """
+    try:
+        user = await _authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return JsonResponse({"error": "Invalid or expired token"}, status=401)
+    if user is None:
+        return JsonResponse({"error": "Authentication credentials were not provided."}, status=401)
+    if user.role != 'admin':
+        return JsonResponse({"error": "Only admins can access the live dashboard"}, status=403)
+
+    feed = feed_for(current_tenant())
+    response = StreamingHttpResponse(_stream(feed, feed.subscribe()), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
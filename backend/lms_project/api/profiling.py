@@ -0,0 +1,182 @@
+"""
+On-demand request profiling for admins.
+
+An admin fetches a short-lived signed token from /api/profiles/token/ and
+sends it back as the ``X-Profile-Token`` header on the request to inspect.
+That request then runs under cProfile with every SQL statement timed, and
+the result is written to PROFILE_DIR as ``<name>.prof`` (pstats) plus
+``<name>.json`` (request metadata and SQL timings). Tokens name the tenant
+they were issued in and each tenant's profiles have a directory of their
+own, since user ids and captured SQL are per tenant. Only the newest
+PROFILE_KEEP profiles of a tenant are kept. Requests without the header only pay for
+one dict lookup in the middleware.
+
+The middleware is async-capable so async views (the live dashboard
+stream) are not pushed onto a thread, but it does not profile them: their
+queries run in sync_to_async threads, out of reach of both cProfile and the
+execute wrappers installed here. Profile a sync endpoint instead.
+"""
+import cProfile
+import io
+import json
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import connections
+from django.utils import timezone
+
+from lms_project.tenancy import current_tenant, tenant_db
+
+HEADER = 'HTTP_X_PROFILE_TOKEN'
+SALT = 'api.profiling'
+TOKEN_MAX_AGE = getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 300)
+NAME_RE = re.compile(r'^[\w.-]+$')
+
+# cProfile allows one active profiler per process on recent Pythons
+_profiler_lock = threading.Lock()
+
+
+def profile_dir():
+    """Profiles of the current tenant"""
+    return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles')) / tenant_db()
+
+
+def make_token(user):
+    return signing.dumps({'user': user.pk, 'tenant': current_tenant()}, salt=SALT)
+
+
+def check_token(token):
+    """User id the token was issued to, or None if it is forged, expired or from another tenant"""
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=TOKEN_MAX_AGE)
+        if payload['tenant'] != current_tenant():
+            return None
+        return payload['user']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+class QueryTimer:
+    """Execute wrapper recording each statement with its duration"""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            # Served but not profiled, see the module docstring
+            return self.get_response(request)
+        token = request.META.get(HEADER)
+        if token is None:
+            return self.get_response(request)
+        user_id = check_token(token)
+        if user_id is None or not get_user_model().objects.filter(pk=user_id, role='admin', is_active=True).exists():
+            return self.get_response(request)
+        if not _profiler_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request, user_id)
+        finally:
+            _profiler_lock.release()
+
+    def profile(self, request, user_id):
+        timers = [QueryTimer(alias) for alias in connections]
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for timer in timers:
+                stack.enter_context(connections[timer.alias].execute_wrapper(timer))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed = (time.perf_counter() - started) * 1000
+
+        name = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(directory / f"{name}.prof")
+
+        queries = [query for timer in timers for query in timer.queries]
+        meta = {
+            'name': name,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'requested_by': user_id,
+            'captured_at': timezone.now().isoformat(),
+            'total_ms': round(elapsed, 3),
+            'sql_ms': round(sum(query['ms'] for query in queries), 3),
+            'query_count': len(queries),
+            'queries': queries,
+        }
+        (directory / f"{name}.json").write_text(json.dumps(meta, indent=2))
+        prune_profiles()
+        response['X-Profile-Name'] = name
+        return response
+
+
+def prune_profiles():
+    """Delete all but the newest PROFILE_KEEP profiles"""
+    keep = getattr(settings, 'PROFILE_KEEP', 100)
+    # Names start with the capture time, so they sort oldest first
+    for path in sorted(profile_dir().glob('*.json'), reverse=True)[keep:]:
+        path.unlink(missing_ok=True)
+        path.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Metadata of captured profiles, newest first, without the query lists"""
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        meta = json.loads(path.read_text())
+        meta.pop('queries', None)
+        profiles.append(meta)
+    return profiles
+
+
+def profile_path(name, suffix):
+    if not NAME_RE.match(name):
+        return None
+    path = profile_dir() / f"{name}{suffix}"
+    return path if path.exists() else None
+
+
+def stats_text(path, limit=40):
+    """Top functions by cumulative time, as pstats prints them"""
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,156 @@
+"""
+Revoked JWTs, checked without a query per request.
+
+Logout and refresh token rotation write the token's jti to RevokedToken.
+Each worker also keeps the jtis of unexpired revoked tokens in an in-memory
+Bloom filter (under 2 bytes per token at a 0.1% false positive rate). A
+check hashes the jti and tests a few bits. Only when every bit is set
+(a revoked token, or a rare false positive) does it ask the table.
+
+Workers stay in sync through the table itself. A check finding the
+filter older than SYNC_INTERVAL seconds first loads the rows added since
+the last id it saw, so a worker accepts a token revoked elsewhere for at
+most that long. The worker that revokes a token adds it to its own filter
+right away. Every REBUILD_INTERVAL the filter is rebuilt from the
+unexpired rows only, which keeps expired tokens from filling it up. There
+is one filter per tenant database. ``manage.py purge_revoked_tokens``
+deletes the rows of expired tokens, which are rejected anyway.
+
+Logout also revokes the whole session, every token descended from one
+login, under the id ``session:<sid>`` in the same filter and table.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from lms_project.tenancy import tenant_db
+from .models import RevokedToken
+
+
+def revocation_option(name):
+    defaults = {'CAPACITY': 100_000, 'ERROR_RATE': 0.001, 'SYNC_INTERVAL': 1.0, 'REBUILD_INTERVAL': 3600}
+    return getattr(settings, 'TOKEN_REVOCATION', {}).get(name, defaults[name])
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] >> (position & 7) & 1 for position in self._positions(key))
+
+
+class RevocationList:
+    """One database's revoked tokens: the filter and the table behind it"""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.lock = threading.Lock()
+        self.filter = None
+        self.last_id = 0
+        self.synced = self.built = 0.0
+
+    def sync(self):
+        """Bring the filter up to date if it is older than SYNC_INTERVAL"""
+        now = time.monotonic()
+        if self.filter is not None and now - self.synced < revocation_option('SYNC_INTERVAL'):
+            return
+        with self.lock:
+            if self.filter is not None and now - self.synced < revocation_option('SYNC_INTERVAL'):
+                return
+            revoked = RevokedToken.objects.using(self.alias)
+            if self.filter is None or now - self.built >= revocation_option('REBUILD_INTERVAL'):
+                rows = list(revoked.filter(expires_at__gt=timezone.now()).values_list('id', 'jti'))
+                # Sized for the current rows so a burst of revocations cannot flood it
+                self.filter = BloomFilter(
+                    max(revocation_option('CAPACITY'), 2 * len(rows)), revocation_option('ERROR_RATE')
+                )
+                self.built = now
+            else:
+                rows = list(revoked.filter(pk__gt=self.last_id).values_list('id', 'jti'))
+            for pk, jti in rows:
+                self.filter.add(jti)
+                self.last_id = max(self.last_id, pk)
+            self.synced = now
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return RevokedToken.objects.using(self.alias).filter(jti=jti).exists()
+
+    def revoke(self, jti, token_type, expires_at):
+        """Record a revocation; False if the token was already revoked"""
+        try:
+            with transaction.atomic(using=self.alias):
+                RevokedToken.objects.using(self.alias).create(jti=jti, token_type=token_type, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+        return True
+
+
+_lists = {}
+_lists_lock = threading.Lock()
+
+
+def revocations():
+    """RevocationList of the current tenant's database"""
+    alias = tenant_db()
+    with _lists_lock:
+        if alias not in _lists:
+            _lists[alias] = RevocationList(alias)
+        return _lists[alias]
+
+
+def reset():
+    """Forget every filter; the next check reloads from the table"""
+    with _lists_lock:
+        _lists.clear()
+
+
+def is_revoked(token):
+    return revocations().is_revoked(token[api_settings.JTI_CLAIM])
+
+
+SESSION_PREFIX = 'session:'
+
+
+def is_session_revoked(session_id):
+    return revocations().is_revoked(SESSION_PREFIX + session_id)
+
+
+def revoke_session(session_id, expires_at):
+    """Reject every token of a session until ``expires_at``; False if it was already revoked"""
+    return revocations().revoke(SESSION_PREFIX + session_id, 'session', expires_at)
+
+
+def revoke(token):
+    """Revoke a validated simplejwt token; False if it was already revoked"""
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    return revocations().revoke(
+        token[api_settings.JTI_CLAIM], token[api_settings.TOKEN_TYPE_CLAIM], expires_at
+    )
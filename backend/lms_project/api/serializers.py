@@ -41,6 +41,10 @@ class ProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ('email', 'role')
 
 
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=True)
+
+
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
     password = serializers.CharField(required=True, write_only=True)
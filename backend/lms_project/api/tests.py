@@ -1,3 +1,980 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import JsonResponse
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from PIL import Image
+from rest_framework.test import APIClient
+
+import api.urls
+import lms.urls
+from accounts.models import User, UserSearchToken
+from accounts.search import encode_cursor
+from lms.models import (
+    Announcement, AnnouncementDelivery, ArchivedEnrollment, Category, Course, CourseMaterial, CourseTag, DeletionJob,
+    Enrollment, EnrollmentPeriod, Lesson, LessonProgress, MaterialUpload, Module, Question, Quiz, QuizAnswer,
+    QuizSubmission, Tag,
+)
+from lms.materials import material_path
+from lms.outbox import record_event
+from lms.progress import progress_buffer
+from lms_project.query_inspector import NPlusOneError, QueryInspectorMiddleware
+from lms_project.tenancy import (
+    TenantMiddleware, TenantRouter, UnknownTenant, bind, current_tenant, tenant_alias, tenant_db,
+    tenant_from_request, use_tenant,
+)
+from . import live, revocation
+from .authentication import tokens_for
+from .profiling import ProfilingMiddleware
+from .models import RevokedToken
+from .batch import MAX_SUBREQUESTS
+from .throttling import LocalBuckets, local_buckets
+
+BUDGETS_FILE = Path(__file__).with_name('query_budgets.json')
+
+# Routes the suite cannot drive through the test client, with the reason
+SKIPPED = {
+    'dashboard-stream': 'async server-sent events stream that never completes',
+}
+
+
+def seed(size):
+    """
+    Fixture where every list an endpoint can return has ``size`` rows: the
+    instructor owns ``size`` courses in ``size`` nested categories, the student is
+    enrolled in all of them (and has ``size`` archived enrollments), and the
+    first course has ``size`` other students enrolled, ``size`` materials,
+    ``size`` modules of one lesson each, with the student's progress in every lesson,
+    ``size`` quizzes, the first with ``size`` questions and a submission from
+    every other student, and ``size`` announcements, the first delivered to
+    every other student. ``size`` unexpired tokens are revoked. The newcomer
+    is a student with no enrollments.
+    """
+    fx = {
+        'admin': User.objects.create_user(
+            email='admin@example.com', password='pass12345', full_name='Admin', role='admin'
+        ),
+        'instructor': User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        ),
+        'student': User.objects.create_user(
+            email='student@example.com', password='pass12345', full_name='Student', role='student'
+        ),
+        'newcomer': User.objects.create_user(
+            email='newcomer@example.com', password='pass12345', full_name='Newcomer', role='student'
+        ),
+    }
+    categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(size)])
+    # A binary tree, so depth grows with size too
+    for i, category in enumerate(categories):
+        category.parent = categories[(i - 1) // 2] if i else None
+        parent_path = category.parent.path if category.parent else '/'
+        category.path = f"{parent_path}{category.pk:0{Category.PATH_STEP}d}/"
+    Category.objects.bulk_update(categories, ['parent', 'path'])
+    courses = Course.objects.bulk_create([
+        Course(title=f'Course {i}', description='Seeded', category=category, instructor=fx['instructor'])
+        for i, category in enumerate(categories)
+    ])
+    tags = Tag.objects.bulk_create([
+        Tag(facet=facet, value=f'{facet}-{i}') for facet in Tag.FACETS for i in range(3)
+    ])
+    CourseTag.objects.bulk_create([
+        CourseTag(course=course, tag=tag) for i, course in enumerate(courses) for tag in tags[i % 3::3]
+    ])
+    others = User.objects.bulk_create([
+        User(email=f'other{i}@example.com', full_name=f'Other {i}', role='student', password='!')
+        for i in range(size)
+    ])
+    UserSearchToken.objects.reindex(others)
+    enrollments = Enrollment.objects.bulk_create(
+        [Enrollment(student=fx['student'], course=course) for course in courses]
+        + [Enrollment(student=other, course=courses[0]) for other in others]
+    )
+    Course.refresh_enrollment_counts()
+    enrolled_at = timezone.now() - timedelta(days=400)
+    ArchivedEnrollment.objects.bulk_create([
+        ArchivedEnrollment(
+            id=10_000_000 + i, student=fx['student'], course=course,
+            enrolled_at=enrolled_at, year=enrolled_at.year
+        )
+        for i, course in enumerate(courses)
+    ])
+    EnrollmentPeriod.objects.bulk_create(
+        [EnrollmentPeriod(student=e.student, course=e.course, started_at=enrolled_at) for e in enrollments]
+        + [EnrollmentPeriod(
+            student=fx['student'], course=course,
+            started_at=enrolled_at - timedelta(days=60), ended_at=enrolled_at - timedelta(days=30),
+        ) for course in courses]
+    )
+    modules = Module.objects.bulk_create([
+        Module(course=courses[0], title=f'Module {i}', position=i) for i in range(size)
+    ])
+    lessons = Lesson.objects.bulk_create([
+        Lesson(module=module, title=f'Lesson {i}', duration_seconds=600) for i, module in enumerate(modules)
+    ])
+    LessonProgress.objects.bulk_create([
+        LessonProgress(student=fx['student'], lesson=lesson, position_seconds=60, updated_at=enrolled_at)
+        for lesson in lessons
+    ])
+    materials = CourseMaterial.objects.bulk_create([
+        CourseMaterial(
+            course=courses[0], title=f'Slides {i}', file_name='slides.pdf', content_type='application/pdf',
+            size=1024, storage_name=f'{courses[0].pk}/slides-{i}.pdf',
+        )
+        for i in range(size)
+    ])
+    quizzes = Quiz.objects.bulk_create([Quiz(course=courses[0], title=f'Quiz {i}') for i in range(size)])
+    questions = Question.objects.bulk_create([
+        Question(
+            quiz=quizzes[0], text=f'Question {i}', options=['a', 'b', 'c'], correct=0b101,
+            partial_credit=i % 2 == 0, position=i,
+        )
+        for i in range(size)
+    ])
+    submissions = QuizSubmission.objects.bulk_create([
+        QuizSubmission(quiz=quizzes[0], student=other) for other in others
+    ])
+    QuizAnswer.objects.bulk_create([
+        QuizAnswer(submission=submission, question=question, selected=0b001)
+        for submission, question in zip(submissions, questions)
+    ])
+    announcements = Announcement.objects.bulk_create([
+        Announcement(course=courses[0], author=fx['instructor'], subject=f'News {i}', body='Seeded', status='done')
+        for i in range(size)
+    ])
+    AnnouncementDelivery.objects.bulk_create([
+        AnnouncementDelivery(announcement=announcements[0], student=other, status='sent', sent_at=enrolled_at)
+        for other in others
+    ])
+    RevokedToken.objects.bulk_create([
+        RevokedToken(jti=f'seeded-{i}', token_type='access', expires_at=timezone.now() + timedelta(days=1))
+        for i in range(size)
+    ])
+    material_path(materials[0]).parent.mkdir(parents=True, exist_ok=True)
+    material_path(materials[0]).write_bytes(b'%' * 1024)
+    fx.update(
+        material=materials[0],
+        upload=MaterialUpload.objects.create(
+            course=courses[0], title='Video', file_name='intro.mp4', content_type='video/mp4',
+            size=10, uploaded_by=fx['instructor'],
+        ),
+        category=categories[0],
+        module=modules[0],
+        lesson=lessons[0],
+        quiz=quizzes[0],
+        empty_quiz=quizzes[-1],
+        question=questions[0],
+        announcement=announcements[0],
+        course=courses[0],
+        other=others[0],
+        job=DeletionJob.objects.create(target_type='course', target_id=courses[-1].pk, requested_by=fx['admin']),
+    )
+    return fx
+
+
+def png_file(name='cover.png', color='teal'):
+    out = io.BytesIO()
+    Image.new('RGB', (320, 200), color).save(out, 'PNG')
+    return SimpleUploadedFile(name, out.getvalue(), content_type='image/png')
+
+
+def bearer(token):
+    return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+
+def reset_token(user):
+    return f"{urlsafe_base64_encode(force_bytes(user.pk))}:{default_token_generator.make_token(user)}"
+
+
+# (url name, method, user, builder returning (url kwargs, data, query string[, request headers])[, label to
+# tell variants apart]). Bytes data is sent as a raw octet-stream body, data with files as multipart.
+SPECS = [
+    ('register', 'POST', None,
+        lambda fx: ({}, {'email': 'new@example.com', 'full_name': 'New', 'password': 'pass12345'}, '')),
+    ('login', 'POST', None,
+        lambda fx: ({}, {'email': 'student@example.com', 'password': 'pass12345'}, '')),
+    ('token-refresh', 'POST', None, lambda fx: ({}, {'refresh': str(tokens_for(fx['student']))}, '')),
+    ('token-rotate', 'POST', None, lambda fx: ({}, {'refresh': str(tokens_for(fx['student']))}, '')),
+    # Both tokens of one login, so of one session
+    ('logout', 'POST', None, lambda fx: (lambda refresh: (
+        {}, {'refresh': str(refresh)}, '', bearer(refresh.access_token)
+    ))(tokens_for(fx['student']))),
+    ('protected', 'GET', 'student', lambda fx: ({}, None, '')),
+    ('protected', 'GET', None, lambda fx: ({}, None, '', bearer(tokens_for(fx['student']).access_token)), 'jwt'),
+    ('profile', 'GET', 'student', lambda fx: ({}, None, '')),
+    ('profile', 'PUT', 'student', lambda fx: ({}, {'full_name': 'Renamed'}, '')),
+    ('forgot-password', 'POST', None, lambda fx: ({}, {'email': 'student@example.com'}, '')),
+    ('reset-password', 'POST', None,
+        lambda fx: ({}, {'token': reset_token(fx['student']), 'new_password': 'newpass12345'}, '')),
+    ('dashboard-summary', 'GET', 'admin', lambda fx: ({}, None, '')),
+    ('dashboard-stream-ticket', 'POST', 'admin', lambda fx: ({}, None, '')),
+    ('dashboard-summary', 'GET', 'instructor', lambda fx: ({}, None, '')),
+    ('dashboard-summary', 'GET', 'student', lambda fx: ({}, None, '')),
+    ('user-statistics', 'GET', 'admin', lambda fx: ({}, None, '')),
+    ('course-statistics', 'GET', 'admin', lambda fx: ({}, None, '')),
+    ('course-statistics', 'GET', 'instructor', lambda fx: ({}, None, '')),
+    ('enrollment-statistics', 'GET', 'admin', lambda fx: ({}, None, 'include_archived=true')),
+    ('enrollment-statistics', 'GET', 'instructor', lambda fx: ({}, None, '')),
+    ('cohort-retention', 'GET', 'admin', lambda fx: ({}, None, 'weeks=52')),
+    ('cohort-retention', 'GET', 'instructor', lambda fx: ({}, None, '')),
+    ('reports', 'GET', 'admin', lambda fx: ({}, None, '')),
+    ('user-list', 'GET', 'admin', lambda fx: ({}, None, '')),
+    ('user-list', 'GET', 'admin',
+        lambda fx: ({}, None, 'q=other+oth&role=student&is_active=true&limit=20'), 'search'),
+    ('user-list', 'GET', 'admin',
+        lambda fx: ({}, None, f"limit=20&cursor={encode_cursor(User.objects.values('id', 'date_joined').get(pk=fx['other'].pk))}"),
+        'cursor'),
+    ('user-delete', 'DELETE', 'admin', lambda fx: ({'pk': fx['other'].pk}, None, '')),
+    ('create-instructor', 'POST', 'admin',
+        lambda fx: ({}, {'email': 'teacher@example.com', 'full_name': 'Teacher', 'password': 'pass12345'}, '')),
+    ('batch', 'POST', 'student',
+        lambda fx: ({}, {'requests': [{'method': 'GET', 'path': '/lms/student/enrollments/'}]}, '')),
+    ('profile-list', 'GET', 'admin', lambda fx: ({}, None, '')),
+    ('profile-token', 'POST', 'admin', lambda fx: ({}, None, '')),
+    ('profile-download', 'GET', 'admin', lambda fx: ({'name': 'missing'}, None, '')),
+    ('category-list-create', 'GET', None, lambda fx: ({}, None, '')),
+    ('category-list-create', 'POST', 'admin', lambda fx: ({}, {'name': 'New category'}, '')),
+    ('category-detail', 'GET', None, lambda fx: ({'pk': fx['category'].pk}, None, '')),
+    ('category-detail', 'PUT', 'admin', lambda fx: ({'pk': fx['category'].pk}, {'description': 'Updated'}, '')),
+    ('category-detail', 'DELETE', 'admin', lambda fx: ({'pk': fx['category'].pk}, None, '')),
+    ('category-tree', 'GET', None, lambda fx: ({}, None, '')),
+    ('category-subtree', 'GET', None, lambda fx: ({'pk': fx['category'].pk}, None, '')),
+    ('category-courses', 'GET', None, lambda fx: ({'pk': fx['category'].pk}, None, '')),
+    ('course-list', 'GET', None, lambda fx: ({}, None, '')),
+    ('course-list', 'GET', None, lambda fx: ({}, None, 'topic=topic-0,topic-1&level=level-1'), 'tagged'),
+    ('course-facets', 'GET', None, lambda fx: ({}, None, 'topic=topic-0,topic-1&level=level-1')),
+    ('course-list', 'GET', None,
+        lambda fx: ({}, None, f'category={fx["category"].pk}&min_enrollments=1&sort=popularity&limit=20'), 'filtered'),
+    ('course-detail', 'GET', 'student', lambda fx: ({'pk': fx['course'].pk}, None, '')),
+    ('course-batch-detail', 'GET', 'student',
+        lambda fx: ({}, None, 'ids=' + ','.join(str(pk) for pk in Course.objects.values_list('pk', flat=True)[:100]))),
+    ('course-create', 'POST', 'instructor',
+        lambda fx: ({}, {
+            'title': 'New course', 'description': 'New', 'category': fx['category'].pk,
+            'tags': ['topic:python', 'level:beginner'],
+        }, '')),
+    ('course-update', 'PUT', 'instructor', lambda fx: ({'pk': fx['course'].pk}, {'title': 'Renamed'}, '')),
+    ('course-delete', 'DELETE', 'instructor', lambda fx: ({'pk': fx['course'].pk}, None, '')),
+    ('course-cover', 'POST', 'instructor', lambda fx: ({'pk': fx['course'].pk}, {'image': png_file()}, '')),
+    ('course-cover', 'DELETE', 'instructor', lambda fx: ({'pk': fx['course'].pk}, None, '')),
+    ('instructor-courses', 'GET', 'instructor', lambda fx: ({}, None, '')),
+    ('instructor-courses', 'GET', 'admin', lambda fx: ({}, None, '')),
+    ('instructor-courses', 'GET', 'instructor', lambda fx: ({}, None, 'sort=title&limit=20'), 'sorted'),
+    ('deletion-job-detail', 'GET', 'admin', lambda fx: ({'pk': fx['job'].pk}, None, '')),
+    ('student-enroll', 'POST', 'newcomer', lambda fx: ({'course_id': fx['course'].pk}, None, '')),
+    ('student-unenroll', 'DELETE', 'student', lambda fx: ({'course_id': fx['course'].pk}, None, '')),
+    ('student-enrollments', 'GET', 'student', lambda fx: ({}, None, 'include_archived=true')),
+    ('course-enrollments', 'GET', 'instructor', lambda fx: ({'course_id': fx['course'].pk}, None, '')),
+    ('course-modules', 'GET', None, lambda fx: ({'course_id': fx['course'].pk}, None, '')),
+    ('course-modules', 'POST', 'instructor', lambda fx: ({'course_id': fx['course'].pk}, {'title': 'New'}, '')),
+    ('module-detail', 'PUT', 'instructor', lambda fx: ({'pk': fx['module'].pk}, {'title': 'Renamed'}, '')),
+    ('module-detail', 'DELETE', 'instructor', lambda fx: ({'pk': fx['module'].pk}, None, '')),
+    ('module-lessons', 'POST', 'instructor', lambda fx: ({'module_id': fx['module'].pk}, {'title': 'New'}, '')),
+    ('lesson-detail', 'GET', 'student', lambda fx: ({'pk': fx['lesson'].pk}, None, '')),
+    ('lesson-detail', 'PUT', 'instructor', lambda fx: ({'pk': fx['lesson'].pk}, {'title': 'Renamed'}, '')),
+    ('lesson-detail', 'DELETE', 'instructor', lambda fx: ({'pk': fx['lesson'].pk}, None, '')),
+    ('lesson-progress', 'POST', 'student',
+        lambda fx: ({'pk': fx['lesson'].pk}, {'position_seconds': 120, 'completed': True}, '')),
+    ('course-progress', 'GET', 'student', lambda fx: ({'course_id': fx['course'].pk}, None, '')),
+    ('course-materials', 'GET', 'student', lambda fx: ({'course_id': fx['course'].pk}, None, '')),
+    ('material-upload-create', 'POST', 'instructor',
+        lambda fx: ({'course_id': fx['course'].pk}, {'title': 'Video', 'file_name': 'a.mp4', 'size': 100}, '')),
+    ('material-upload', 'GET', 'instructor', lambda fx: ({'pk': fx['upload'].pk}, None, '')),
+    ('material-upload', 'PUT', 'instructor',
+        lambda fx: ({'pk': fx['upload'].pk}, b'0123456789', '', {'HTTP_CONTENT_RANGE': 'bytes 0-9/10'})),
+    ('material-upload', 'DELETE', 'instructor', lambda fx: ({'pk': fx['upload'].pk}, None, '')),
+    ('material-download', 'GET', 'student', lambda fx: ({'pk': fx['material'].pk}, None, '')),
+    ('material-download', 'GET', 'student',
+        lambda fx: ({'pk': fx['material'].pk}, None, '', {'HTTP_RANGE': 'bytes=100-199'}), 'range'),
+    ('material-detail', 'DELETE', 'instructor', lambda fx: ({'pk': fx['material'].pk}, None, '')),
+    ('course-quizzes', 'GET', 'student', lambda fx: ({'course_id': fx['course'].pk}, None, '')),
+    ('course-quizzes', 'POST', 'instructor', lambda fx: ({'course_id': fx['course'].pk}, {'title': 'Midterm'}, '')),
+    ('quiz-detail', 'GET', 'student', lambda fx: ({'pk': fx['quiz'].pk}, None, '')),
+    ('quiz-detail', 'GET', 'instructor', lambda fx: ({'pk': fx['quiz'].pk}, None, '')),
+    ('quiz-detail', 'PUT', 'instructor', lambda fx: ({'pk': fx['quiz'].pk}, {'title': 'Renamed'}, '')),
+    ('quiz-questions', 'POST', 'instructor',
+        lambda fx: ({'quiz_id': fx['quiz'].pk}, {'text': 'New', 'options': ['a', 'b'], 'correct': [1]}, '')),
+    ('quiz-submissions', 'POST', 'student',
+        lambda fx: ({'quiz_id': fx['quiz'].pk}, {'answers': {str(fx['question'].pk): [0, 2]}}, '')),
+    ('quiz-submissions', 'GET', 'instructor', lambda fx: ({'quiz_id': fx['quiz'].pk}, None, 'limit=50')),
+    ('quiz-submissions', 'GET', 'student', lambda fx: ({'quiz_id': fx['quiz'].pk}, None, '')),
+    ('question-detail', 'PUT', 'instructor', lambda fx: ({'pk': fx['question'].pk}, {'correct': [0]}, '')),
+    ('quiz-regrade', 'POST', 'instructor', lambda fx: ({'quiz_id': fx['quiz'].pk}, None, '')),
+    ('question-detail', 'DELETE', 'instructor', lambda fx: ({'pk': fx['question'].pk}, None, '')),
+    ('quiz-detail', 'DELETE', 'instructor', lambda fx: ({'pk': fx['empty_quiz'].pk}, None, '')),
+    ('course-gradebook', 'GET', 'instructor', lambda fx: ({'course_id': fx['course'].pk}, None, '')),
+    ('course-gradebook', 'GET', 'instructor', lambda fx: ({'course_id': fx['course'].pk}, None, 'export=csv'), 'csv'),
+    ('course-gradebook', 'GET', 'instructor',
+        lambda fx: ({'course_id': fx['course'].pk}, None, 'export=ndjson'), 'ndjson'),
+    ('course-announcements', 'GET', 'student', lambda fx: ({'course_id': fx['course'].pk}, None, 'limit=50')),
+    ('course-announcements', 'POST', 'instructor',
+        lambda fx: ({'course_id': fx['course'].pk}, {'subject': 'Exam moved', 'body': 'To Friday.'}, '')),
+    ('announcement-deliveries', 'GET', 'instructor',
+        lambda fx: ({'pk': fx['announcement'].pk}, None, 'status=sent&limit=50')),
+]
+
+
+# Specs whose request is refused on purpose, with the status it must get; every
+# other spec must succeed, so a budget is never measured on an early rejection
+EXPECTED_ERRORS = {
+    'profile-download GET admin': 404,
+}
+
+
+def route_names():
+    patterns = api.urls.urlpatterns + lms.urls.urlpatterns
+    return {pattern.name for pattern in patterns if isinstance(pattern, URLPattern)}
+
+
+def route_path(name, kwargs):
+    for prefix, module in (('/api/', api.urls), ('/lms/', lms.urls)):
+        for pattern in module.urlpatterns:
+            if pattern.name == name:
+                route = str(pattern.pattern)
+                for key, value in kwargs.items():
+                    for converter in ('int', 'str', 'uuid'):
+                        route = route.replace(f'<{converter}:{key}>', str(value))
+                return prefix + route
+    raise LookupError(name)
+
+
+@override_settings(
+    RATE_LIMIT_STORE='',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class QueryBudgetTests(TestCase):
+    """
+    Every endpoint must run the same number of queries whatever the table
+    sizes, and no more than the budget checked in to query_budgets.json.
+    Run with UPDATE_QUERY_BUDGETS=1 to rewrite the baseline after an
+    intentional change.
+    """
+    SIZES = (10, 1000)
+
+    def setUp(self):
+        local_buckets.clear()
+        files_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(files_dir.cleanup)
+        override = override_settings(
+            MATERIALS_DIR=Path(files_dir.name) / 'materials', MEDIA_ROOT=Path(files_dir.name) / 'media',
+            COVER_ORIGINALS_DIR=Path(files_dir.name) / 'originals', COVER_WORKERS=0,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def measure(self, size):
+        """Query count of every spec against a fixture of ``size`` rows"""
+        counts = {}
+        with transaction.atomic():
+            fx = seed(size)
+            for name, method, role, build, *label in SPECS:
+                kwargs, data, query, *headers = build(fx)
+                extra = headers[0] if headers else {}
+                if isinstance(data, bytes):
+                    extra = {**extra, 'content_type': 'application/octet-stream'}
+                elif isinstance(data, dict) and any(hasattr(value, 'read') for value in data.values()):
+                    extra = {**extra, 'format': 'multipart'}
+                else:
+                    extra = {**extra, 'format': 'json'}
+                client = APIClient()
+                if role:
+                    client.force_authenticate(fx[role])
+                path = route_path(name, kwargs) + (f'?{query}' if query else '')
+                local_buckets.clear()
+                progress_buffer.clear()
+                revocation.reset()
+                cache.clear()
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as queries:
+                        response = getattr(client, method.lower())(path, data, **extra)
+                        if response.streaming:
+                            # Exhausting the stream closes the response and its file
+                            b''.join(response.streaming_content)
+                    transaction.set_rollback(True)
+                key = ' '.join([name, method, role or 'anonymous', *label])
+                if key in EXPECTED_ERRORS:
+                    self.assertEqual(response.status_code, EXPECTED_ERRORS[key], f'{key}: {response.status_code}')
+                else:
+                    self.assertLess(response.status_code, 300, f'{key} failed: {response.status_code}')
+                counts[key] = len(queries)
+            transaction.set_rollback(True)
+        return counts
+
+    def test_every_route_is_covered(self):
+        covered = {name for name, *_ in SPECS} | set(SKIPPED)
+        self.assertEqual(route_names() - covered, set(), 'Add a query budget spec for the new routes')
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small, large = (self.measure(size) for size in self.SIZES)
+        for key in small:
+            with self.subTest(key):
+                self.assertEqual(
+                    small[key], large[key],
+                    f'{key}: {small[key]} queries at {self.SIZES[0]} rows, {large[key]} at {self.SIZES[1]}'
+                )
+
+        if os.environ.get('UPDATE_QUERY_BUDGETS'):
+            BUDGETS_FILE.write_text(json.dumps(large, indent=2, sort_keys=True) + '\n')
+            return
+
+        budgets = json.loads(BUDGETS_FILE.read_text())
+        for key, count in large.items():
+            with self.subTest(key):
+                self.assertIn(key, budgets, f'No budget for {key}, run with UPDATE_QUERY_BUDGETS=1')
+                self.assertLessEqual(count, budgets[key], f'{key} ran {count} queries, budget is {budgets[key]}')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], RATE_LIMIT_STORE='')
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        revocation.reset()
+        self.addCleanup(revocation.reset)
+        local_buckets.clear()
+        User.objects.create_user(email='student@example.com', password='pass12345', role='student')
+        tokens = APIClient().post('/api/login/', {'email': 'student@example.com', 'password': 'pass12345'}).data
+        self.access, self.refresh = tokens['access'], tokens['refresh']
+
+    def post(self, path, data, token=None):
+        client = APIClient()
+        if token:
+            client.credentials(**bearer(token))
+        return client.post(path, data, format='json')
+
+    def protected(self, token):
+        client = APIClient()
+        client.credentials(**bearer(token))
+        return client.get('/api/protected/')
+
+    def test_refresh_and_rotation(self):
+        access = self.post('/api/token/refresh/', {'refresh': self.refresh}).data['access']
+        self.assertEqual(self.protected(access).status_code, 200)
+
+        rotated = self.post('/api/token/rotate/', {'refresh': self.refresh})
+        self.assertEqual(rotated.status_code, 200)
+        self.assertNotEqual(rotated.data['refresh'], self.refresh)
+        # A refresh token is spent by rotation
+        self.assertEqual(self.post('/api/token/rotate/', {'refresh': self.refresh}).status_code, 401)
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': self.refresh}).status_code, 401)
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': rotated.data['refresh']}).status_code, 200)
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': self.access}).status_code, 401)
+
+    def test_logout_revokes_both_tokens(self):
+        self.assertEqual(self.post('/api/logout/', {'refresh': self.refresh}, self.access).status_code, 200)
+        self.assertEqual(self.protected(self.access).status_code, 401)
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': self.refresh}).status_code, 401)
+        # Both tokens and their session
+        self.assertEqual(RevokedToken.objects.count(), 3)
+
+    def test_logout_ends_the_whole_session(self):
+        refreshed = self.post('/api/token/refresh/', {'refresh': self.refresh}).data['access']
+        rotated = self.post('/api/token/rotate/', {'refresh': self.refresh}).data
+        other_login = APIClient().post('/api/login/', {'email': 'student@example.com', 'password': 'pass12345'}).data
+
+        # Logging out with any token of the session, here an access token alone
+        self.assertEqual(self.post('/api/logout/', {}, rotated['access']).status_code, 200)
+        for token in (self.access, refreshed, rotated['access']):
+            self.assertEqual(self.protected(token).status_code, 401)
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': rotated['refresh']}).status_code, 401)
+        # Another login is another session
+        self.assertEqual(self.protected(other_login['access']).status_code, 200)
+
+    def test_checks_only_query_on_filter_hits(self):
+        self.assertEqual(self.protected(self.access).status_code, 200)
+        # The filter is loaded; a token that is not revoked costs no query
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation.is_revoked({'jti': 'not-revoked'}))
+
+    @override_settings(TOKEN_REVOCATION={'SYNC_INTERVAL': 3600})
+    def test_workers_pick_up_each_others_revocations(self):
+        worker, other_worker = revocation.RevocationList('default'), revocation.RevocationList('default')
+        other_worker.sync()
+        worker.revoke('stolen', 'access', timezone.now() + timedelta(minutes=5))
+        self.assertTrue(worker.is_revoked('stolen'))
+        # Until its next sync the other worker has not seen it
+        self.assertFalse(other_worker.is_revoked('stolen'))
+        other_worker.synced = 0
+        self.assertTrue(other_worker.is_revoked('stolen'))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = revocation.BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'valid-{i}' in bloom for i in range(10_000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(TENANTS=['acme', 'globex'], TENANT_DOMAIN='lms.test', ALLOWED_HOSTS=['.lms.test', 'testserver'])
+class TenantResolutionTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(email='someone@example.com', password='pass12345', role='student')
+
+    def test_tenant_comes_from_header_subdomain_or_token(self):
+        self.assertIsNone(tenant_from_request(self.factory.get('/')))
+        self.assertEqual(tenant_from_request(self.factory.get('/', HTTP_X_TENANT='acme')), 'acme')
+        self.assertEqual(tenant_from_request(self.factory.get('/', HTTP_HOST='globex.lms.test')), 'globex')
+        with use_tenant('acme'):
+            token = str(tokens_for(self.user).access_token)
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(tenant_from_request(request), 'acme')
+        with self.assertRaises(UnknownTenant):
+            tenant_from_request(self.factory.get('/', HTTP_X_TENANT='initech'))
+
+    def test_unknown_tenant_is_not_found(self):
+        response = APIClient().post('/api/login/', {}, HTTP_X_TENANT='initech')
+        self.assertEqual(response.status_code, 404)
+
+    def test_tokens_only_work_for_their_tenant(self):
+        with use_tenant('acme'):
+            token = str(tokens_for(self.user).access_token)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_X_TENANT='globex')
+        self.assertEqual(client.get('/api/profile/').status_code, 401)
+        # A default-database token is not accepted by a tenant either
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for(self.user).access_token}', HTTP_X_TENANT='acme')
+        self.assertEqual(client.get('/api/profile/').status_code, 401)
+
+    def test_router_follows_the_tenant_and_threads_can_carry_it(self):
+        router = TenantRouter()
+        self.assertEqual(router.db_for_write(User), 'default')
+        seen = []
+        with use_tenant('acme'):
+            self.assertEqual(router.db_for_read(User), 'tenant_acme')
+            # Loaded objects stay on the database they came from
+            self.assertEqual(router.db_for_write(User, instance=self.user), 'default')
+            thread = threading.Thread(target=bind(lambda: seen.append(tenant_db())))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, ['tenant_acme'])
+
+
+TENANT_PAIR = settings.TENANTS[:2]
+
+
+@unittest.skipUnless(len(TENANT_PAIR) == 2, "needs two tenants; the test runner adds them when TENANTS is empty")
+@override_settings(RATE_LIMIT_STORE='')
+class TenantIsolationTests(TestCase):
+    databases = {'default', *(tenant_alias(slug) for slug in TENANT_PAIR)}
+
+    def setUp(self):
+        local_buckets.clear()
+
+    def register(self, tenant, email):
+        return APIClient().post('/api/register/', {
+            'email': email, 'full_name': 'Same Name', 'password': 'pass12345'
+        }, HTTP_X_TENANT=tenant)
+
+    def login(self, tenant, email):
+        return APIClient().post('/api/login/', {'email': email, 'password': 'pass12345'}, HTTP_X_TENANT=tenant)
+
+    def test_each_tenant_has_its_own_users(self):
+        first, second = TENANT_PAIR
+        self.assertEqual(self.register(first, 'shared@example.com').status_code, 201)
+        self.assertEqual(self.login(second, 'shared@example.com').status_code, 401)
+        # The same address registers independently in another tenant
+        self.assertEqual(self.register(second, 'shared@example.com').status_code, 201)
+        self.assertFalse(User.objects.filter(email='shared@example.com').exists())
+        self.assertEqual(User.objects.using(tenant_alias(first)).filter(email='shared@example.com').count(), 1)
+
+        # The token's claim alone routes later requests to the right database
+        token = self.login(first, 'shared@example.com').data['access']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get('/api/profile/').status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_X_TENANT=second)
+        self.assertEqual(client.get('/api/profile/').status_code, 401)
+
+    def test_profiles_are_kept_per_tenant(self):
+        first, second = TENANT_PAIR
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Same id in both databases, so only the token's tenant tells them apart
+        admins = {
+            slug: User.objects.db_manager(tenant_alias(slug)).create_user(
+                id=500, email=f'admin@{slug}.example.com', password='pass12345', role='admin'
+            )
+            for slug in TENANT_PAIR
+        }
+        clients = {slug: APIClient() for slug in TENANT_PAIR}
+        for slug, client in clients.items():
+            client.force_authenticate(admins[slug])
+            client.credentials(HTTP_X_TENANT=slug)
+
+        with self.settings(PROFILE_DIR=Path(directory.name)):
+            token = clients[first].post('/api/profiles/token/').data['token']
+            self.assertNotIn('X-Profile-Name', clients[second].get('/api/profile/', HTTP_X_PROFILE_TOKEN=token))
+            name = clients[first].get('/api/profile/', HTTP_X_PROFILE_TOKEN=token)['X-Profile-Name']
+
+            self.assertEqual([profile['name'] for profile in clients[first].get('/api/profiles/').data], [name])
+            self.assertEqual(clients[second].get('/api/profiles/').data, [])
+            self.assertEqual(clients[second].get(f'/api/profiles/{name}/').status_code, 404)
+
+    def test_save_keeps_search_tokens_with_the_user(self):
+        alias = tenant_alias(TENANT_PAIR[0])
+        user = User.objects.db_manager(alias).create_user(email='tokens@example.com', password='pass12345')
+        self.assertTrue(UserSearchToken.objects.using(alias).filter(user_id=user.pk).exists())
+        self.assertFalse(UserSearchToken.objects.filter(token='tokens@example.com').exists())
+
+    def test_refresh_tokens_carry_their_tenant(self):
+        first, second = TENANT_PAIR
+        self.register(first, 'refresher@example.com')
+        refresh = self.login(first, 'refresher@example.com').data['refresh']
+
+        # No X-Tenant: the token's claim picks the database
+        client = APIClient()
+        access = client.post('/api/token/refresh/', {'refresh': refresh}, format='json').data['access']
+        client.credentials(**bearer(access))
+        self.assertEqual(client.get('/api/profile/').data['email'], 'refresher@example.com')
+        rotated = APIClient().post('/api/token/rotate/', {'refresh': refresh}, format='json')
+        self.assertEqual(rotated.status_code, 200)
+        self.assertEqual(User.objects.using(tenant_alias(first)).get().email, 'refresher@example.com')
+        self.assertTrue(RevokedToken.objects.using(tenant_alias(first)).exists())
+        self.assertEqual(APIClient().post('/api/token/rotate/', {'refresh': refresh}, format='json').status_code, 401)
+
+        response = APIClient().post('/api/token/refresh/', {'refresh': rotated.data['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = APIClient().post(
+            '/api/token/refresh/', {'refresh': rotated.data['refresh']}, format='json', HTTP_X_TENANT=second
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_reset_link_names_the_tenant(self):
+        first, _ = TENANT_PAIR
+        self.register(first, 'forgetful@example.com')
+        response = APIClient().post(
+            '/api/password/forgot/', {'email': 'forgetful@example.com'}, HTTP_X_TENANT=first
+        )
+        self.assertEqual(response.status_code, 200)
+        link = re.search(r'href="([^"]+)"', mail.outbox[-1].alternatives[0][0]).group(1)
+        query = parse_qs(urlsplit(link).query)
+        self.assertEqual(query['tenant'], [first])
+
+        # What the reset page sends back
+        response = APIClient().post('/api/password/reset/', {
+            'token': query['token'][0], 'new_password': 'newpass12345'
+        }, HTTP_X_TENANT=query['tenant'][0])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.using(tenant_alias(first)).get(email='forgetful@example.com')
+                        .check_password('newpass12345'))
+
+    def test_writes_stay_in_the_tenant(self):
+        first, second = TENANT_PAIR
+        with use_tenant(first):
+            instructor = User.objects.create_user(email='teacher@example.com', password='!', role='instructor')
+            course = Course.objects.create(
+                title='Tenant course', description='', instructor=instructor,
+                category=Category.objects.create(name='Tenant'),
+            )
+        client = APIClient()
+        client.force_authenticate(instructor)
+        self.assertEqual(len(client.get('/lms/courses/', HTTP_X_TENANT=first).data), 1)
+        self.assertEqual(len(client.get('/lms/courses/', HTTP_X_TENANT=second).data), 0)
+        self.assertEqual(course._state.db, tenant_alias(first))
+        self.assertFalse(Course.objects.exists())
+
+
+class LiveDashboardTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password='pass12345', role='admin')
+        self.student = User.objects.create_user(
+            email='student@example.com', password='pass12345', full_name='Student', role='student'
+        )
+        self.course = Course.objects.create(
+            title='Python', description='Intro', category=Category.objects.create(name='Programming'),
+            instructor=User.objects.create_user(email='teacher@example.com', password='pass12345', role='instructor'),
+        )
+        self.addCleanup(live.feeds.clear)
+
+    def ticket(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post('/api/dashboard/stream/ticket/')
+
+    def enroll(self):
+        with transaction.atomic():
+            enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+            record_event('enrollment.created', enrollment.pk)
+        return enrollment
+
+    # The feed itself is covered below; these only open the stream
+    @mock.patch.object(live.LiveFeed, 'subscribe', lambda feed: asyncio.Queue())
+    def test_stream_opens_once_per_ticket(self):
+        self.assertEqual(self.ticket(self.student).status_code, 403)
+        ticket = self.ticket(self.admin).data['ticket']
+        response = self.client.get(f'/api/dashboard/stream/?ticket={ticket}')
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/event-stream'))
+        self.assertEqual(self.client.get(f'/api/dashboard/stream/?ticket={ticket}').status_code, 401)
+
+        # Access tokens only work in the header, where they stay out of logs
+        access = str(tokens_for(self.admin).access_token)
+        self.assertEqual(self.client.get(f'/api/dashboard/stream/?token={access}').status_code, 401)
+        self.assertEqual(self.client.get(f'/api/dashboard/stream/?ticket={access}').status_code, 401)
+        self.assertEqual(self.client.get('/api/dashboard/stream/', **bearer(access)).status_code, 200)
+
+    async def test_one_poll_fans_out_to_every_subscriber(self):
+        feed = live.LiveFeed(interval=0.01)
+        queues = [feed.subscribe(), feed.subscribe()]
+        snapshots = [await asyncio.wait_for(queue.get(), 5) for queue in queues]
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertEqual(snapshots[0][1]['enrollments'], 0)
+
+        enrollment = await sync_to_async(self.enroll)()
+        received = [[await asyncio.wait_for(queue.get(), 5) for _ in range(2)] for queue in queues]
+        counters, enrolled = received[0]
+        self.assertEqual(counters[0], 'counters')
+        self.assertEqual((counters[1]['deltas'], counters[1]['totals']['enrollments']), ({'enrollments': 1}, 1))
+        self.assertEqual(enrolled, ('enrollment', {
+            'id': enrollment.pk, 'student': 'Student', 'course': 'Python', 'enrolled_at': enrollment.enrolled_at,
+        }))
+        # Computed once for everyone
+        self.assertIs(received[1][0][1], counters[1])
+        self.assertEqual(snapshots[0][1]['enrollments'], 0)
+
+        # Late subscribers start from the current totals
+        late = feed.subscribe()
+        self.assertEqual(late.get_nowait()[1]['enrollments'], 1)
+        for queue in [*queues, late]:
+            feed.unsubscribe(queue)
+        await asyncio.wait_for(feed.task, 5)
+        self.assertIsNone(feed.totals)
+
+    def test_slow_subscribers_lose_their_oldest_messages(self):
+        feed = live.LiveFeed()
+        queue = asyncio.Queue(maxsize=live.QUEUE_SIZE)
+        feed.subscribers.add(queue)
+        for i in range(live.QUEUE_SIZE + 5):
+            feed.publish('tick', i)
+        self.assertEqual((queue.qsize(), queue.get_nowait()), (live.QUEUE_SIZE, ('tick', 5)))
+
+    def test_each_tenant_has_its_own_feed(self):
+        self.assertIs(live.feed_for(None), live.feed_for(None))
+        self.assertIsNot(live.feed_for(None), live.feed_for('acme'))
+
+
+@override_settings(RATE_LIMIT_STORE='')
+class ThrottleTests(TestCase):
+    def setUp(self):
+        local_buckets.clear()
+        self.addCleanup(local_buckets.clear)
+        User.objects.create_user(email='student@example.com', password='pass12345', role='student')
+
+    def login(self, password='wrong'):
+        return APIClient().post('/api/login/', {'email': 'Student@example.com', 'password': password}, format='json')
+
+    def test_rejected_logins_get_retry_after_and_skip_hashing(self):
+        # login_email allows 5 attempts a minute per address
+        for _ in range(5):
+            self.assertEqual(self.login().status_code, 401)
+        with mock.patch('api.views.authenticate') as authenticate:
+            response = self.login(password='pass12345')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        authenticate.assert_not_called()
+
+    def test_shared_store_limits_across_workers(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(RATE_LIMIT_STORE=f'{directory}/buckets.db'):
+            for _ in range(5):
+                self.login()
+            # Another worker: nothing in its own buckets yet
+            local_buckets.clear()
+            self.assertEqual(self.login().status_code, 429)
+
+    def test_local_buckets_stay_bounded(self):
+        buckets = LocalBuckets(max_size=8)
+        for i in range(20):
+            buckets.take('hot', 100, 0.01, now=i)
+            buckets.take(f'ip:{i}', 5, 1, now=i)
+        self.assertLessEqual(len(buckets.buckets), 8)
+        # Recently used buckets keep their state
+        self.assertIn('hot', buckets.buckets)
+        self.assertEqual(buckets.take('hot', 100, 0.01, now=20)[0], True)
+        self.assertLess(buckets.buckets['hot'][0], 80)
+
+        # Refilled buckets go first
+        buckets.take('late', 5, 1, now=1000.5)
+        buckets.buckets.update({f'idle:{i}': (5, 1000, 1000) for i in range(8)})
+        buckets.take('later', 5, 1, now=1001)
+        self.assertEqual(set(buckets.buckets), {'hot', 'late', 'later'})
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = self.settings(PROFILE_DIR=Path(directory.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.admin = User.objects.create_user(email='admin@example.com', password='pass12345', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def capture(self):
+        token = self.client.post('/api/profiles/token/').data['token']
+        response = self.client.get('/api/profile/', HTTP_X_PROFILE_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Profile-Name']
+
+    def test_profile_is_written_and_downloadable(self):
+        name = self.capture()
+        self.assertEqual([profile['name'] for profile in self.client.get('/api/profiles/').data], [name])
+        download = self.client.get(f'/api/profiles/{name}/')
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('attachment', download['Content-Disposition'])
+        meta = json.loads(b''.join(self.client.get(f'/api/profiles/{name}/?output=json').streaming_content))
+        self.assertEqual((meta['path'], meta['status']), ('/api/profile/', 200))
+        self.assertIn('function calls', self.client.get(f'/api/profiles/{name}/?output=text').content.decode())
+
+    def test_only_the_newest_profiles_are_kept(self):
+        with self.settings(PROFILE_KEEP=2):
+            names = [self.capture() for _ in range(3)]
+        directory = settings.PROFILE_DIR / 'default'
+        self.assertEqual(sorted(path.stem for path in directory.glob('*.json')), sorted(names)[1:])
+        self.assertEqual(len(list(directory.glob('*.prof'))), 2)
+
+
+class MiddlewareTests(TestCase):
+    def n_plus_one(self, request):
+        for user in User.objects.all():
+            User.objects.filter(pk=user.pk).exists()
+        return JsonResponse({})
+
+    def test_n_plus_one_raises_in_raise_mode(self):
+        for i in range(5):
+            User.objects.create_user(email=f'user{i}@example.com', password='pass12345')
+        middleware = QueryInspectorMiddleware(self.n_plus_one)
+        request = RequestFactory().get('/api/users/')
+        with self.assertRaises(NPlusOneError):
+            middleware(request)
+        with self.settings(QUERY_INSPECTOR={**settings.QUERY_INSPECTOR, 'MODE': 'warn'}):
+            with self.assertLogs('lms.queries', 'WARNING'):
+                self.assertEqual(middleware(request).status_code, 200)
+
+    def test_middleware_stays_async_for_async_views(self):
+        async def view(request):
+            return JsonResponse({"tenant": current_tenant()})
+
+        handler = view
+        for middleware in (QueryInspectorMiddleware, ProfilingMiddleware, TenantMiddleware):
+            handler = middleware(handler)
+            self.assertTrue(iscoroutinefunction(handler))
+        response = asyncio.run(handler(RequestFactory().get('/', HTTP_X_TENANT='acme')))
+        self.assertEqual(json.loads(response.content), {"tenant": 'acme'})
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(email='student@example.com', password='pass12345', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def batch(self, *requests):
+        return self.client.post('/api/batch/', {'requests': list(requests)}, format='json')
+
+    def test_only_api_routes_can_be_batched(self):
+        for request in [{'path': '/admin/'}, {'path': '/media/x'}, {'method': 'PATCH', 'path': '/api/profile/'}, {}]:
+            self.assertEqual(self.batch(request).status_code, 400, request)
+        responses = self.batch(
+            {'path': '/api/batch/'}, {'path': '/api/dashboard/stream/'}, {'path': '/api/missing/'},
+        ).data['responses']
+        self.assertEqual([response['status'] for response in responses], [400, 400, 404])
+
+    def test_streaming_responses_are_closed(self):
+        instructor = User.objects.create_user(email='instructor@example.com', password='pass12345', role='instructor')
+        course = Course.objects.create(
+            title='Python', description='Intro', category=Category.objects.create(name='Programming'),
+            instructor=instructor,
+        )
+        Enrollment.objects.create(student=self.student, course=course)
+        material = CourseMaterial.objects.create(
+            course=course, title='Slides', file_name='slides.pdf', content_type='application/pdf', size=4,
+            storage_name=f'{course.pk}/slides.pdf',
+        )
+        opened = []
+
+        def tracking_open(*args, **kwargs):
+            opened.append(open(*args, **kwargs))
+            return opened[-1]
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(MATERIALS_DIR=Path(directory)):
+            material_path(material).parent.mkdir(parents=True)
+            material_path(material).write_bytes(b'%PDF')
+            with mock.patch('lms.materials.open', tracking_open, create=True):
+                responses = self.batch({'path': f'/lms/materials/{material.pk}/download/'}).data['responses']
+        self.assertEqual(responses[0]['status'], 400)
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+
+    def test_batch_size_is_capped(self):
+        response = self.batch(*[{'path': '/api/profile/'}] * MAX_SUBREQUESTS)
+        self.assertEqual(len(response.data['responses']), MAX_SUBREQUESTS)
+        self.assertEqual(self.batch(*[{'path': '/api/profile/'}] * (MAX_SUBREQUESTS + 1)).status_code, 400)
+        self.assertEqual(self.client.post('/api/batch/', {'requests': []}, format='json').status_code, 400)
+
+    def test_each_subrequest_checks_its_own_permissions(self):
+        responses = self.batch(
+            {'path': '/api/users/'}, {'path': '/api/profile/'}, {'method': 'POST', 'path': '/lms/categories/',
+                                                              'body': {'name': 'Sneaky'}},
+        ).data['responses']
+        self.assertEqual([response['status'] for response in responses], [403, 200, 403])
+        self.assertEqual(responses[1]['body']['email'], 'student@example.com')
+        self.assertFalse(Category.objects.filter(name='Sneaky').exists())
+
+    # Six identical logins would also trip the N+1 check
+    @override_settings(RATE_LIMIT_STORE='', QUERY_INSPECTOR={'MODE': 'off'})
+    def test_each_subrequest_takes_its_own_throttle_token(self):
+        local_buckets.clear()
+        self.addCleanup(local_buckets.clear)
+        login = {'method': 'POST', 'path': '/api/login/', 'body': {'email': 'student@example.com', 'password': 'x'}}
+        # login_email allows 5 a minute
+        responses = self.batch(*[login] * 6).data['responses']
+        self.assertEqual([response['status'] for response in responses], [401] * 5 + [429])
+
+
+class BatchOrderingTests(TransactionTestCase):
+    """Parallel GETs run on other connections, which only see committed rows"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email='admin@example.com', password='pass12345', role='admin')
+        )
+
+    def names(self, response):
+        return [category['name'] for category in response['body']]
+
+    def test_reads_see_the_writes_before_them_only(self):
+        create = lambda name: {'method': 'POST', 'path': '/lms/categories/', 'body': {'name': name}}
+        responses = self.client.post('/api/batch/', {'requests': [
+            create('First'),
+            {'path': '/lms/categories/'}, {'path': '/api/profile/'}, {'path': '/lms/categories/?fields=name'},
+            create('Second'),
+            {'path': '/lms/categories/'},
+        ]}, format='json').data['responses']
+        self.assertEqual([response['status'] for response in responses], [201, 200, 200, 200, 201, 200])
+        self.assertEqual(self.names(responses[1]), ['First'])
+        self.assertEqual(responses[2]['body']['email'], 'admin@example.com')
+        self.assertEqual(self.names(responses[3]), ['First'])
+        self.assertEqual(self.names(responses[5]), ['First', 'Second'])
@@ -0,0 +1,193 @@
+"""
+Token-bucket throttles for the unauthenticated, CPU-heavy endpoints
+(login, register and password reset).
+
+DRF runs throttles in APIView.initial(), before the handler, so rejected
+requests never reach password hashing or email sending, and a Throttled
+response carries Retry-After. Each request takes a token from a bucket per
+client IP and one per submitted email address. Buckets are checked in
+process first, so a hot client is turned away without any I/O, and then in
+a small SQLite file shared by all workers on the host, which is the
+authoritative limit. The in-process buckets are bounded: past
+RATE_LIMIT_LOCAL_BUCKETS keys, refilled buckets (which hold no state) and
+then the least recently used ones are forgotten, so a flood of distinct
+email addresses cannot grow a worker's memory.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from itertools import islice
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from lms_project.tenancy import current_tenant
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity, tokens refilled per second)"""
+    num, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(num), int(num) / seconds
+
+
+class LocalBuckets:
+    """In-process buckets, the fast path in front of the shared store"""
+
+    def __init__(self, max_size=10_000):
+        self.lock = threading.Lock()
+        self.max_size = max_size
+        # key -> (tokens, updated, time the bucket is full again), least recently used first
+        self.buckets = {}
+
+    def take(self, key, capacity, refill, now):
+        with self.lock:
+            tokens, updated, _ = self.buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / refill)
+            if len(self.buckets) > self.max_size:
+                self._evict(now)
+            return allowed, 0 if allowed else (1 - tokens) / refill
+
+    def _evict(self, now):
+        # Down to three quarters, so the scan runs once per max_size / 4 new keys
+        for key in [key for key, (_, _, full_at) in self.buckets.items() if full_at <= now]:
+            del self.buckets[key]
+        # Forgetting a bucket only resets the per-process limit; the shared store still applies
+        for key in list(islice(self.buckets, max(0, len(self.buckets) - self.max_size * 3 // 4))):
+            del self.buckets[key]
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class SQLiteBuckets:
+    """Buckets shared across worker processes through a local SQLite file"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self.local.conn = conn
+        return conn
+
+    def take(self, key, capacity, refill, now):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now),
+            )
+            if random.random() < 0.01:
+                # Full buckets older than a day carry no state worth keeping
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 86400,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, 0 if allowed else (1 - tokens) / refill
+
+
+local_buckets = LocalBuckets(getattr(settings, 'RATE_LIMIT_LOCAL_BUCKETS', 10_000))
+_shared_buckets = None
+
+
+def get_shared_buckets():
+    global _shared_buckets
+    path = getattr(settings, 'RATE_LIMIT_STORE', None)
+    if not path:
+        return None
+    if _shared_buckets is None or _shared_buckets.path != str(path):
+        _shared_buckets = SQLiteBuckets(path)
+    return _shared_buckets
+
+
+def take_token(key, rate):
+    """Returns (allowed, seconds until a token is available)"""
+    capacity, refill = parse_rate(rate)
+    now = time.time()
+    allowed, wait = local_buckets.take(key, capacity, refill, now)
+    if not allowed:
+        return False, wait
+
+    shared = get_shared_buckets()
+    if shared is None:
+        return True, 0
+    try:
+        return shared.take(key, capacity, refill, now)
+    except sqlite3.Error:
+        # Fail open to the per-process limit rather than rejecting everyone
+        logger.warning("Shared rate limit store unavailable", exc_info=True)
+        return True, 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Rates come from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']: ``<scope>`` is
+    applied per client IP and ``<scope>_email`` per submitted email address
+    (per tenant, where the same address is a different account).
+    """
+    scope = None
+
+    def get_buckets(self, request):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        buckets = []
+        if rates.get(self.scope):
+            buckets.append((f"{self.scope}:ip:{self.get_ident(request)}", rates[self.scope]))
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if email and rates.get(f"{self.scope}_email"):
+            email = str(email).strip().lower()
+            if current_tenant():
+                email = f"{current_tenant()}:{email}"
+            buckets.append((f"{self.scope}:email:{email}", rates[f"{self.scope}_email"]))
+        return buckets
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        for key, rate in self.get_buckets(request):
+            allowed, wait = take_token(key, rate)
+            if not allowed:
+                self.retry_after = wait
+                return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class LoginRateThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class RegisterRateThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+
+class PasswordResetRateThrottle(TokenBucketThrottle):
+    scope = 'password_reset'
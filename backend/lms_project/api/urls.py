@@ -2,24 +2,38 @@ from django.urls import path
 from .views import (
     RegisterAPIView, 
     LoginAPIView, 
+    TokenRefreshAPIView,
+    TokenRotateAPIView,
+    LogoutAPIView,
     ProtectedAPIView, 
     ProfileAPIView,
     ForgotPasswordAPIView,
     ResetPasswordAPIView,
     DashboardSummaryAPIView,
+    DashboardStreamTicketAPIView,
     UserStatisticsAPIView,
     CourseStatisticsAPIView,
     EnrollmentStatisticsAPIView,
+    CohortRetentionAPIView,
     ReportsAPIView,
     UserListAPIView,
+    UserDeleteAPIView,
     CreateInstructorAPIView,
+    BatchAPIView,
+    ProfileTokenAPIView,
+    ProfileListAPIView,
+    ProfileDownloadAPIView,
 )
+from .live import dashboard_stream
 
 
 urlpatterns = [
     # Authentication endpoints
     path('register/', RegisterAPIView.as_view(), name='register'),
     path('login/', LoginAPIView.as_view(), name='login'),
+    path('token/refresh/', TokenRefreshAPIView.as_view(), name='token-refresh'),
+    path('token/rotate/', TokenRotateAPIView.as_view(), name='token-rotate'),
+    path('logout/', LogoutAPIView.as_view(), name='logout'),
     path('protected/', ProtectedAPIView.as_view(), name='protected'),
     path('profile/', ProfileAPIView.as_view(), name='profile'),
     path('password/forgot/', ForgotPasswordAPIView.as_view(), name='forgot-password'),
@@ -27,12 +41,24 @@ urlpatterns = [
     
     # Dashboard & Reports endpoints
     path('dashboard/', DashboardSummaryAPIView.as_view(), name='dashboard-summary'),
+    path('dashboard/stream/', dashboard_stream, name='dashboard-stream'),
+    path('dashboard/stream/ticket/', DashboardStreamTicketAPIView.as_view(), name='dashboard-stream-ticket'),
     path('statistics/users/', UserStatisticsAPIView.as_view(), name='user-statistics'),
     path('statistics/courses/', CourseStatisticsAPIView.as_view(), name='course-statistics'),
     path('statistics/enrollments/', EnrollmentStatisticsAPIView.as_view(), name='enrollment-statistics'),
+    path('statistics/retention/', CohortRetentionAPIView.as_view(), name='cohort-retention'),
     path('reports/', ReportsAPIView.as_view(), name='reports'),
     
     # User management
     path('users/', UserListAPIView.as_view(), name='user-list'),
+    path('users/<int:pk>/delete/', UserDeleteAPIView.as_view(), name='user-delete'),
     path('admin/create-instructor/', CreateInstructorAPIView.as_view(), name='create-instructor'),
+    
+    # Request batching
+    path('batch/', BatchAPIView.as_view(), name='batch'),
+    
+    # Request profiling (admin only)
+    path('profiles/', ProfileListAPIView.as_view(), name='profile-list'),
+    path('profiles/token/', ProfileTokenAPIView.as_view(), name='profile-token'),
+    path('profiles/<str:name>/', ProfileDownloadAPIView.as_view(), name='profile-download'),
 ]
\ No newline at end of file
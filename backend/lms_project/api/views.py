@@ -5,18 +5,35 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.core.mail import send_mail
 from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.db import transaction
 from django.db.models import Count, Q
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import RegisterSerializer, ProfileSerializer, LoginSerializer
+from .serializers import RegisterSerializer, ProfileSerializer, LoginSerializer, RefreshTokenSerializer
 from accounts.models import User
-from lms.models import Course, Category, Enrollment
+from accounts.search import keyset_page, search_users
+from lms.models import Course, Category, Enrollment, ArchivedEnrollment, EnrollmentPeriod
+from lms.archive import include_archived, merge_counts
+from lms.deletion import schedule_deletion
+from lms.history import MAX_WEEKS, cached_cohort_retention
+from lms.outbox import record_event
+from lms.serializers import DeletionJobSerializer
+from lms_project.tenancy import CLAIM as TENANT_CLAIM, current_tenant, tenant_db, use_tenant
 
 from rest_framework.permissions import AllowAny, IsAuthenticated
+
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .authentication import SESSION_CLAIM, end_session, stream_ticket_for, tokens_for, validated_refresh
 from .permissions import IsAdmin, IsInstructor, IsStudent
+from .revocation import revoke
+from .throttling import LoginRateThrottle, PasswordResetRateThrottle, RegisterRateThrottle
+from . import profiling
+from .batch import MAX_SUBREQUESTS, SubRequestError, execute_all, validate_subrequest
 
 # Create your views here.
 
@@ -26,11 +43,14 @@ class RegisterAPIView(APIView):
     Instructor and admin accounts must be created by administrators.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterRateThrottle]
     
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=tenant_db()):
+                user = serializer.save()
+                record_event('user.created', user.pk, role=user.role)
             return Response(
                 {"message": "Student account registered successfully"}, 
                 status=status.HTTP_201_CREATED
@@ -87,7 +107,9 @@ class CreateInstructorAPIView(APIView):
                 role=role
             )
             user.set_password(data['password'])
-            user.save()
+            with transaction.atomic(using=tenant_db()):
+                user.save()
+                record_event('user.created', user.pk, role=user.role)
             
             return Response(
                 {
@@ -110,6 +132,7 @@ class CreateInstructorAPIView(APIView):
 
 class LoginAPIView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [LoginRateThrottle]
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
@@ -133,7 +156,7 @@ class LoginAPIView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for(user)
         return Response(
             {
                 "message": "Login successful",
@@ -148,6 +171,92 @@ class LoginAPIView(APIView):
             status=status.HTTP_200_OK
         )
 
+
+class TokenRefreshAPIView(APIView):
+    """
+    New access token for a refresh token; the refresh token stays valid
+    POST /api/token/refresh/ {"refresh": "..."}
+    """
+    permission_classes = [AllowAny]
+    # An expired access token in the Authorization header must not block a refresh
+    authentication_classes = []
+
+    def post(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            refresh = validated_refresh(serializer.validated_data['refresh'])
+        except InvalidToken as e:
+            return Response({"error": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({"access": str(refresh.access_token)}, status=status.HTTP_200_OK)
+
+
+class TokenRotateAPIView(APIView):
+    """
+    Exchange a refresh token for a new access and refresh token pair.
+    The old refresh token is revoked, so each one can be used only once.
+    POST /api/token/rotate/ {"refresh": "..."}
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            refresh = validated_refresh(serializer.validated_data['refresh'])
+        except InvalidToken as e:
+            return Response({"error": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        with use_tenant(refresh.get(TENANT_CLAIM)):
+            revoked = revoke(refresh)
+        if not revoked:
+            # Another request rotated the same token first
+            return Response({"error": "Token has been revoked"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # Same claims (user, tenant) under a new id and lifetime
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        return Response(
+            {"access": str(refresh.access_token), "refresh": str(refresh)},
+            status=status.HTTP_200_OK
+        )
+
+
+class LogoutAPIView(APIView):
+    """
+    Revoke the access token of the request and, if given, a refresh token,
+    and end their session: access tokens refreshed earlier stop working too
+    POST /api/logout/ {"refresh": "..."}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        raw_refresh = request.data.get('refresh') if hasattr(request.data, 'get') else None
+        tokens = []
+        if raw_refresh:
+            try:
+                refresh = RefreshToken(raw_refresh)
+            except TokenError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            owner = refresh.get(jwt_settings.USER_ID_CLAIM)
+            if str(owner) != str(request.user.pk) or refresh.get(TENANT_CLAIM) != current_tenant():
+                return Response(
+                    {"error": "Refresh token belongs to another user"}, status=status.HTTP_400_BAD_REQUEST
+                )
+            tokens.append(refresh)
+        if request.auth is not None and jwt_settings.JTI_CLAIM in request.auth:
+            tokens.append(request.auth)
+        for token in tokens:
+            revoke(token)
+        # Usually one session for both tokens
+        for token in {token.get(SESSION_CLAIM): token for token in tokens}.values():
+            end_session(token)
+        return Response({"message": "Logged out"}, status=status.HTTP_200_OK)
+
+
 class ProtectedAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -177,7 +286,9 @@ class ProfileAPIView(APIView):
     def put(self, request):
         serializer = ProfileSerializer(request.user, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=tenant_db()):
+                serializer.save()
+                record_event('user.updated', request.user.pk, fields=sorted(serializer.validated_data))
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -188,6 +299,7 @@ class ForgotPasswordAPIView(APIView):
     Security: Always returns success message to prevent email enumeration.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [PasswordResetRateThrottle]
 
     def post(self, request):
         email = request.data.get('email')
@@ -210,6 +322,9 @@ class ForgotPasswordAPIView(APIView):
             
             # Create reset link (matches frontend route /reset-password?token=...)
             reset_link = f"{settings.FRONTEND_URL}/reset-password?token={combined_token}"
+            if current_tenant():
+                # The frontend sends it back as X-Tenant so the reset finds the right account
+                reset_link += f"&tenant={current_tenant()}"
             
             # Send email with HTML template
             try:
@@ -418,6 +533,7 @@ class ResetPasswordAPIView(APIView):
     Accepts combined token (uid:token format) or separate uid and token.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [PasswordResetRateThrottle]
 
     def post(self, request):
         token_param = request.data.get('token')
@@ -459,7 +575,9 @@ class ResetPasswordAPIView(APIView):
             
             # Reset password
             user.set_password(new_password)
-            user.save()
+            with transaction.atomic(using=tenant_db()):
+                user.save()
+                record_event('user.password_reset', user.pk)
             
             print(f"Password reset successful for user: {user.email}")
             
@@ -511,9 +629,7 @@ class DashboardSummaryAPIView(APIView):
             } for e in recent_enrollments]
             
             # Courses with most enrollments
-            popular_courses = Course.objects.annotate(
-                enrollment_count=Count('enrollments')
-            ).order_by('-enrollment_count')[:5]
+            popular_courses = Course.objects.order_by('-enrollment_count', '-id')[:5]
             
             popular_courses_data = [{
                 'id': c.id,
@@ -541,9 +657,7 @@ class DashboardSummaryAPIView(APIView):
             total_my_students = Enrollment.objects.filter(course__instructor=user).count()
             
             # My courses with enrollment counts
-            my_courses_data = my_courses.annotate(
-                enrollment_count=Count('enrollments')
-            ).values('id', 'title', 'enrollment_count')
+            my_courses_data = my_courses.values('id', 'title', 'enrollment_count')
             
             return Response({
                 'role': user.role,
@@ -585,6 +699,22 @@ class DashboardSummaryAPIView(APIView):
         return Response({'error': 'Invalid role'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class DashboardStreamTicketAPIView(APIView):
+    """
+    Issue a single-use ticket for opening the live dashboard stream (Admin only)
+    POST /api/dashboard/stream/ticket/
+    Open GET /api/dashboard/stream/?ticket=<ticket> within expires_in seconds.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def post(self, request):
+        ticket = stream_ticket_for(request.user)
+        return Response({
+            "ticket": str(ticket),
+            "expires_in": int(ticket.lifetime.total_seconds()),
+        }, status=status.HTTP_200_OK)
+
+
 class UserStatisticsAPIView(APIView):
     """
     Get user statistics (Admin only)
@@ -652,9 +782,9 @@ class CourseStatisticsAPIView(APIView):
         avg_enrollments = total_enrollments / total_courses if total_courses > 0 else 0
         
         # Courses with enrollment counts
-        courses_with_enrollments = courses.annotate(
-            enrollment_count=Count('enrollments')
-        ).values('id', 'title', 'category__name', 'instructor__full_name', 'enrollment_count').order_by('-enrollment_count')
+        courses_with_enrollments = courses.values(
+            'id', 'title', 'category__name', 'instructor__full_name', 'enrollment_count'
+        ).order_by('-enrollment_count')
         
         return Response({
             'total_courses': total_courses,
@@ -668,6 +798,7 @@ class CourseStatisticsAPIView(APIView):
 class EnrollmentStatisticsAPIView(APIView):
     """
     Get enrollment statistics (Admin and Instructors)
+    Pass ?include_archived=true to include enrollments of ended courses
     """
     permission_classes = [IsAuthenticated]
     
@@ -676,8 +807,10 @@ class EnrollmentStatisticsAPIView(APIView):
         
         if user.role == 'admin':
             enrollments = Enrollment.objects.all()
+            archived = ArchivedEnrollment.objects.all()
         elif user.role == 'instructor':
             enrollments = Enrollment.objects.filter(course__instructor=user)
+            archived = ArchivedEnrollment.objects.filter(course__instructor=user)
         else:
             return Response(
                 {'error': 'Only admins and instructors can access enrollment statistics'},
@@ -702,6 +835,16 @@ class EnrollmentStatisticsAPIView(APIView):
         # Unique students enrolled
         unique_students = enrollments.values('student').distinct().count()
         
+        if include_archived(request):
+            # Archived rows are aggregated separately and merged, the hot table is never widened
+            total_enrollments += archived.count()
+            enrollments_by_course = merge_counts(
+                'course__title',
+                enrollments_by_course,
+                archived.values('course__title').annotate(count=Count('id')),
+            )
+            unique_students = enrollments.values('student').union(archived.values('student')).count()
+        
         return Response({
             'total_enrollments': total_enrollments,
             'unique_students': unique_students,
@@ -710,6 +853,44 @@ class EnrollmentStatisticsAPIView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class CohortRetentionAPIView(APIView):
+    """
+    Cohort retention matrix (Admin and Instructors)
+    GET /api/statistics/retention/?weeks=12
+    Rows are enrollment months, cell w is the share of that month's
+    enrollments still active w weeks later. Recomputed at most once a day.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        user = request.user
+        
+        if user.role == 'admin':
+            periods, scope = EnrollmentPeriod.objects.all(), 'all'
+        elif user.role == 'instructor':
+            periods, scope = EnrollmentPeriod.objects.filter(course__instructor=user), f'instructor:{user.pk}'
+        else:
+            return Response(
+                {'error': 'Only admins and instructors can access retention statistics'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            weeks = int(request.query_params.get('weeks', 12))
+        except ValueError:
+            weeks = 0
+        if not 1 <= weeks <= MAX_WEEKS:
+            return Response(
+                {'error': f'weeks must be between 1 and {MAX_WEEKS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            'weeks': weeks,
+            'cohorts': cached_cohort_retention(periods, scope, weeks),
+        }, status=status.HTTP_200_OK)
+
+
 class ReportsAPIView(APIView):
     """
     Comprehensive reports endpoint (Admin only)
@@ -737,9 +918,7 @@ class ReportsAPIView(APIView):
         avg_enrollments_per_student = total_enrollments / users_by_role.get('student', 1)
         
         # Most popular courses
-        popular_courses = Course.objects.annotate(
-            enrollment_count=Count('enrollments')
-        ).order_by('-enrollment_count')[:10].values(
+        popular_courses = Course.objects.order_by('-enrollment_count', '-id')[:10].values(
             'id', 'title', 'instructor__full_name', 'enrollment_count'
         )
         
@@ -773,13 +952,154 @@ class ReportsAPIView(APIView):
 
 class UserListAPIView(APIView):
     """
-    Get list of all users (Admin only)
-    GET /api/users/
+    Search and page through users, newest first (Admin only)
+    GET /api/users/?q=jane&role=student&is_active=true&limit=50
+    q matches the start of the email or of any word of the email or name;
+    every term must match. Follow "next" with ?cursor= for the next page.
     """
     permission_classes = [IsAuthenticated, IsAdmin]
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 200
     
     def get(self, request):
-        users = User.objects.all().values(
-            'id', 'email', 'full_name', 'role', 'date_joined'
-        ).order_by('-date_joined')
-        return Response(list(users), status=status.HTTP_200_OK)
\ No newline at end of file
+        params = request.query_params
+        users = User.objects.all()
+        
+        role = params.get('role')
+        if role:
+            if role not in dict(User.ROLE_CHOICES):
+                return Response({"error": "Invalid role"}, status=status.HTTP_400_BAD_REQUEST)
+            users = users.filter(role=role)
+        is_active = params.get('is_active', '').lower()
+        if is_active:
+            if is_active not in ('true', 'false', '1', '0'):
+                return Response({"error": "is_active must be true or false"}, status=status.HTTP_400_BAD_REQUEST)
+            users = users.filter(is_active=is_active in ('true', '1'))
+        if params.get('q', '').strip():
+            users = search_users(users, params['q'])
+        
+        try:
+            limit = int(params.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.MAX_LIMIT:
+            return Response(
+                {"error": f"limit must be between 1 and {self.MAX_LIMIT}"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            rows, next_cursor = keyset_page(
+                users.values('id', 'email', 'full_name', 'role', 'is_active', 'date_joined'),
+                limit, params.get('cursor'),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': rows, 'next': next_cursor}, status=status.HTTP_200_OK)
+
+
+class UserDeleteAPIView(APIView):
+    """
+    Delete a user (Admin only)
+    DELETE /api/users/<id>/delete/
+    The account is deactivated immediately; enrollments and owned courses
+    are removed in background batches.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def delete(self, request, pk):
+        user = User.objects.filter(pk=pk).first()
+        if user is None:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        if user.pk == request.user.pk:
+            return Response(
+                {"error": "You cannot delete your own account"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        job = schedule_deletion('user', user, requested_by=request.user)
+        return Response(
+            {"message": "User scheduled for deletion", "job": DeletionJobSerializer(job).data},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class BatchAPIView(APIView):
+    """
+    Execute several API calls in one round trip
+    POST /api/batch/
+    {"requests": [{"method": "GET", "path": "/api/profile/"}, {"path": "/lms/categories/"}]}
+    Authenticates once; independent GETs run concurrently. Responses come
+    back in request order as {"status": ..., "body": ...}.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "'requests' must be a non-empty list"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > MAX_SUBREQUESTS:
+            return Response(
+                {"error": f"At most {MAX_SUBREQUESTS} requests can be batched"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            subrequests = [validate_subrequest(item) for item in items]
+        except SubRequestError as e:
+            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({'responses': execute_all(request, subrequests)}, status=status.HTTP_200_OK)
+
+
+class ProfileTokenAPIView(APIView):
+    """
+    Issue a short-lived signed token for request profiling (Admin only)
+    POST /api/profiles/token/
+    Send it as the X-Profile-Token header on the request to profile.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def post(self, request):
+        return Response({
+            "header": "X-Profile-Token",
+            "token": profiling.make_token(request.user),
+            "expires_in": profiling.TOKEN_MAX_AGE,
+        }, status=status.HTTP_200_OK)
+
+
+class ProfileListAPIView(APIView):
+    """
+    List captured request profiles (Admin only)
+    GET /api/profiles/
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def get(self, request):
+        return Response(profiling.list_profiles(), status=status.HTTP_200_OK)
+
+
+class ProfileDownloadAPIView(APIView):
+    """
+    Download a captured profile (Admin only)
+    GET /api/profiles/<name>/?output=prof|json|text
+    prof is the raw pstats file, json the SQL timings, text a cumulative-time summary.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def get(self, request, name):
+        # Not ?format=, which DRF reserves for renderer selection
+        output = request.query_params.get('output', 'prof')
+        if output not in ('prof', 'json', 'text'):
+            return Response({"error": "output must be prof, json or text"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        path = profiling.profile_path(name, '.json' if output == 'json' else '.prof')
+        if path is None:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        if output == 'text':
+            return HttpResponse(profiling.stats_text(path), content_type='text/plain; charset=utf-8')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
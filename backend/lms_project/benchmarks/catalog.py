@@ -0,0 +1,103 @@
+"""
+Catalog benchmark: filtered, sorted pages of /lms/courses/ at scale.
+
+Builds a throwaway test database, seeds it with --courses courses (100k by
+default) spread over categories and instructors, then requests every
+documented filter and sort combination from lms.catalog.PLAN_CASES through
+the test client and reports the median time per page.
+
+Usage (from backend/lms_project):
+    python benchmarks/catalog.py [--courses 100000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(count):
+    from django.utils import timezone
+
+    from accounts.models import User
+    from lms.models import Category, Course
+
+    rng = random.Random(42)
+    instructors = User.objects.bulk_create([
+        User(email=f'bench{i}@example.com', full_name=f'Instructor {i}', role='instructor', password='!')
+        for i in range(200)
+    ])
+    categories = Category.objects.bulk_create([Category(name=f'Bench {i}', path='') for i in range(100)])
+    Category.objects.filter(pk__in=[c.pk for c in categories]).update(path='/')
+    now = timezone.now()
+    batch = []
+    for i in range(count):
+        batch.append(Course(
+            title=f'Course {rng.randrange(10 ** 6):06d}',
+            description='Benchmark',
+            category=rng.choice(categories),
+            instructor=rng.choice(instructors),
+            enrollment_count=int(rng.paretovariate(1.5)) - 1,
+        ))
+        if len(batch) == 5000:
+            Course.objects.bulk_create(batch)
+            batch = []
+    Course.objects.bulk_create(batch)
+    # auto_now_add ignores given values, so spread creation dates afterwards
+    for offset in range(0, 730):
+        Course.all_objects.filter(pk__gt=offset * count // 730, pk__lte=(offset + 1) * count // 730).update(
+            created_at=now - timedelta(days=offset)
+        )
+    return categories[0].pk, instructors[0].pk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--courses', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms_project.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    from lms.catalog import PLAN_CASES
+
+    settings.QUERY_INSPECTOR = {**getattr(settings, 'QUERY_INSPECTOR', {}), 'MODE': 'off'}
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.perf_counter()
+        category, instructor = seed(args.courses)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        print(f"Seeded {args.courses} courses in {time.perf_counter() - started:.1f}s\n")
+
+        client = Client()
+        print(f"{'query':<75} {'median':>9} {'p95':>9}")
+        for query in PLAN_CASES:
+            query = query.replace('category=1', f'category={category}').replace('instructor=1', f'instructor={instructor}')
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                response = client.get(f'/lms/courses/?{query}')
+                timings.append((time.perf_counter() - t0) * 1000)
+                assert response.status_code == 200, response.content
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{query:<75} {statistics.median(timings):>7.2f}ms {p95:>7.2f}ms")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
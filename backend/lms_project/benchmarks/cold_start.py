@@ -0,0 +1,83 @@
+"""
+Cold-start benchmark: time to first fast response with and without warm-up.
+
+Each mode runs in a fresh interpreter, the way a newly forked worker would
+start, and serves requests through the WSGI handler in-process so only
+application cost is measured (no network, no server).
+
+Usage (from backend/lms_project, after `python manage.py migrate`):
+    python benchmarks/cold_start.py [--requests 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/lms/courses/', '/lms/categories/', '/lms/courses/1/']
+
+
+def measure(mode, requests):
+    started = time.perf_counter()
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms_project.settings')
+    from django.core.wsgi import get_wsgi_application
+    from django.test import Client
+
+    get_wsgi_application()
+    loaded = time.perf_counter()
+    if mode == 'warm':
+        from lms_project import warmup
+        warmup.run()
+    ready = time.perf_counter()
+
+    client = Client(SERVER_NAME='localhost')
+    timings = []
+    for i in range(requests):
+        t0 = time.perf_counter()
+        client.get(PATHS[i % len(PATHS)])
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    steady = statistics.median(timings[len(PATHS):]) if len(timings) > len(PATHS) else timings[-1]
+    # First request that is within 1.5x of steady state
+    first_fast = next(i for i, t in enumerate(timings) if t <= steady * 1.5)
+    return {
+        'mode': mode,
+        'load_ms': (loaded - started) * 1000,
+        'warmup_ms': (ready - loaded) * 1000,
+        'first_request_ms': timings[0],
+        'steady_median_ms': steady,
+        'first_fast_request': first_fast,
+        'time_to_first_fast_ms': (ready - started) * 1000 + sum(timings[:first_fast + 1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--mode', choices=['cold', 'warm'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.requests)))
+        return
+
+    results = []
+    for mode in ('cold', 'warm'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--requests', str(args.requests)],
+            capture_output=True, text=True, check=True, cwd=PROJECT_DIR,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':<6} {'load':>9} {'warm-up':>9} {'1st req':>9} {'steady':>9} {'1st fast':>9} {'ttff':>10}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['load_ms']:>7.1f}ms {r['warmup_ms']:>7.1f}ms {r['first_request_ms']:>7.1f}ms "
+              f"{r['steady_median_ms']:>7.2f}ms {r['first_fast_request']:>9} {r['time_to_first_fast_ms']:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Quiz grading benchmark: vectorized grading of large submission batches.
+
+Times lms.grading.AnswerKey.grade on --submissions random answer sheets
+against a per-answer Python loop doing the same arithmetic, then seeds a
+throwaway test database with the same sheets and times a full
+regrade_quiz() (load answers, grade, upsert scores) through the ORM.
+
+Usage (from backend/lms_project):
+    python benchmarks/quiz_grading.py [--submissions 100000] [--questions 20] [--skip-db]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPTIONS = 4
+
+
+def random_quiz(questions, submissions, rng):
+    """(key rows, S x Q answer masks): every other question multiple choice with partial credit"""
+    rows = []
+    for i in range(questions):
+        partial = bool(i % 2)
+        correct = int(rng.integers(1, 1 << OPTIONS)) if partial else 1 << int(rng.integers(OPTIONS))
+        rows.append((i + 1, correct, float(rng.integers(1, 4)), partial))
+    masks = rng.integers(0, 1 << OPTIONS, size=(submissions, questions), dtype=np.int64)
+    return rows, masks
+
+
+def grade_loop(rows, masks):
+    """The same scoring, one answer at a time"""
+    scores = []
+    for sheet in masks.tolist():
+        score = 0.0
+        for (_, correct, points, partial), selected in zip(rows, sheet):
+            if partial:
+                hits = bin(selected & correct).count('1')
+                misses = bin(selected & ~correct).count('1')
+                score += points * min(max((hits - misses) / bin(correct).count('1'), 0), 1)
+            elif selected == correct:
+                score += points
+        scores.append(score)
+    return scores
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"{label:<42} {time.perf_counter() - started:>8.3f}s")
+    return result
+
+
+def seed(rows, masks):
+    from accounts.models import User
+    from lms.models import Category, Course, Question, Quiz, QuizAnswer, QuizSubmission
+
+    instructor = User.objects.create_user(email='bench-instructor@example.com', password='!', role='instructor')
+    course = Course.objects.create(
+        title='Benchmark', description='', category=Category.objects.create(name='Benchmark'), instructor=instructor
+    )
+    quiz = Quiz.objects.create(course=course, title='Benchmark')
+    questions = Question.objects.bulk_create([
+        Question(quiz=quiz, text=f'Question {pk}', options=[str(i) for i in range(OPTIONS)], correct=correct,
+                 points=points, partial_credit=partial, position=pk)
+        for pk, correct, points, partial in rows
+    ])
+    for start in range(0, len(masks), 5000):
+        chunk = masks[start:start + 5000]
+        students = User.objects.bulk_create([
+            User(email=f'student{start + i}@example.com', role='student', password='!') for i in range(len(chunk))
+        ])
+        submissions = QuizSubmission.objects.bulk_create([
+            QuizSubmission(quiz=quiz, student=student) for student in students
+        ])
+        QuizAnswer.objects.bulk_create([
+            QuizAnswer(submission=submission, question=question, selected=selected)
+            for submission, sheet in zip(submissions, chunk.tolist())
+            for question, selected in zip(questions, sheet)
+        ], batch_size=5000)
+    return quiz
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--submissions', type=int, default=100_000)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--skip-db', action='store_true', help="only time the in-memory grading")
+    args = parser.parse_args()
+
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms_project.settings')
+    import django
+    django.setup()
+    from lms.grading import AnswerKey, regrade_quiz
+
+    rows, masks = random_quiz(args.questions, args.submissions, np.random.default_rng(42))
+    key = AnswerKey(rows)
+    print(f"{args.submissions} submissions x {args.questions} questions\n")
+    vectorized = timed('grade (NumPy)', lambda: key.grade(masks))
+    looped = timed('grade (Python loop per answer)', lambda: grade_loop(rows, masks))
+    assert np.allclose(vectorized, looped)
+    if args.skip_db:
+        return
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from lms.models import QuizSubmission
+
+    settings.QUERY_INSPECTOR = {**getattr(settings, 'QUERY_INSPECTOR', {}), 'MODE': 'off'}
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        quiz = timed('seed database', lambda: seed(rows, masks))
+        graded = timed('regrade_quiz (load, grade, save)', lambda: regrade_quiz(quiz.pk))
+        assert graded == args.submissions
+        saved = np.array(QuizSubmission.objects.filter(quiz=quiz).order_by('pk').values_list('score', flat=True))
+        assert np.allclose(saved, vectorized)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
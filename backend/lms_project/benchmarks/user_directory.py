@@ -0,0 +1,106 @@
+"""
+User directory benchmark: searches and pages of /api/users/ at scale.
+
+Builds a throwaway test database, seeds it with --users users (500k by
+default) and their search tokens, then times searches, filters and deep
+cursor pages through the test client and reports the median per request.
+
+Usage (from backend/lms_project):
+    python benchmarks/user_directory.py [--users 500000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = ['ada', 'alan', 'grace', 'linus', 'margaret', 'dennis', 'barbara', 'ken', 'frances', 'john']
+LAST_NAMES = ['lovelace', 'turing', 'hopper', 'torvalds', 'hamilton', 'ritchie', 'liskov', 'thompson', 'allen']
+
+CASES = [
+    'limit=50',
+    'role=instructor&limit=50',
+    'is_active=false&limit=50',
+    'q=grace&limit=50',
+    'q=hop&limit=50',
+    'q=grace+hop&limit=50',
+    'q=user12345&limit=50',
+    'q=ada&role=student&is_active=true&limit=50',
+]
+
+
+def seed(count):
+    from django.utils import timezone
+
+    from accounts.models import User, UserSearchToken
+
+    rng = random.Random(42)
+    now = timezone.now()
+    for start in range(0, count, 5000):
+        users = User.objects.bulk_create([
+            User(
+                email=f'user{i}@example.com',
+                full_name=f'{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()}',
+                role=rng.choice(['student'] * 18 + ['instructor'] * 2),
+                is_active=rng.random() > 0.05,
+                date_joined=now - timedelta(minutes=count - i),
+                password='!',
+            )
+            for i in range(start, min(count, start + 5000))
+        ])
+        UserSearchToken.objects.reindex(users, replace=False)
+    return User.objects.create_user(email='bench-admin@example.com', password='pass12345', role='admin')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=500_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms_project.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+
+    settings.QUERY_INSPECTOR = {**getattr(settings, 'QUERY_INSPECTOR', {}), 'MODE': 'off'}
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.perf_counter()
+        admin = seed(args.users)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        print(f"Seeded {args.users} users in {time.perf_counter() - started:.1f}s\n")
+
+        client = APIClient()
+        client.force_authenticate(admin)
+        # A cursor about halfway down the directory, to show deep pages cost the same
+        cursor = None
+        for _ in range(10):
+            cursor = client.get(f"/api/users/?limit=200{f'&cursor={cursor}' if cursor else ''}").data['next']
+        print(f"{'query':<55} {'median':>9} {'p95':>9}")
+        for query in CASES + [f'limit=50&cursor={cursor}']:
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                response = client.get(f'/api/users/?{query}')
+                timings.append((time.perf_counter() - t0) * 1000)
+                assert response.status_code == 200, response.content
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{query[:55]:<55} {statistics.median(timings):>7.2f}ms {p95:>7.2f}ms")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
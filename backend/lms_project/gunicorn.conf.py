@@ -0,0 +1,53 @@
+"""
+Production server configuration.
+
+Run from backend/lms_project/ (gunicorn picks this file up automatically):
+
+    gunicorn lms_project.asgi:application    # uvicorn workers, needed for the live dashboard
+    SERVER_MODE=wsgi gunicorn lms_project.wsgi:application
+
+The app is loaded once in the master (preload_app) and warmed up before
+forking, so every worker starts with resolvers and serializers already
+built; each worker then opens its own database connections in post_fork.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('THREADS', '1'))
+worker_class = 'sync' if os.getenv('SERVER_MODE', 'asgi') == 'wsgi' else 'uvicorn_worker.UvicornWorker'
+preload_app = True
+timeout = int(os.getenv('TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers periodically to bound memory growth, staggered to avoid a thundering herd
+max_requests = int(os.getenv('MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # The application is imported by now because of preload_app
+    from lms_project import warmup
+
+    warmup.run(('urls', 'serializers'))
+    warmup.close_database()
+    server.log.info("Application preloaded and warmed up")
+
+
+def post_fork(server, worker):
+    from lms_project import warmup
+
+    warmup.run(('database',))
+    # Lesson progress pings are buffered per worker (lms/progress.py)
+    from lms.progress import progress_buffer
+
+    progress_buffer.start()
+
+
+def worker_exit(server, worker):
+    from lms.progress import progress_buffer
+
+    progress_buffer.stop()
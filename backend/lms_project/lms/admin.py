@@ -1,8 +1,37 @@
 from django.contrib import admin
-from .models import Category, Course, Enrollment
+from .models import (
+    ArchivedEnrollment, Category, ConsumerCheckpoint, Course, DeletionJob, Enrollment, EnrollmentPeriod, OutboxEvent,
+    StatCounter, Tag,
+)
 
 # Register your models here.
 
 admin.site.register(Category)
 admin.site.register(Course)
-admin.site.register(Enrollment)
\ No newline at end of file
+admin.site.register(Tag)
+admin.site.register(ArchivedEnrollment)
+admin.site.register(EnrollmentPeriod)
+admin.site.register(DeletionJob)
+admin.site.register(OutboxEvent)
+admin.site.register(ConsumerCheckpoint)
+admin.site.register(StatCounter)
+
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(admin.ModelAdmin):
+    """Recounts Course.enrollment_count, which only enroll/unenroll keep in step"""
+
+    def save_model(self, request, obj, form, change):
+        # The course may have changed, so both the old and the new one are recounted
+        course_ids = {obj.course_id, *Enrollment.objects.filter(pk=obj.pk).values_list('course_id', flat=True)}
+        super().save_model(request, obj, form, change)
+        Course.refresh_enrollment_counts(course_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Course.refresh_enrollment_counts([obj.course_id])
+
+    def delete_queryset(self, request, queryset):
+        course_ids = set(queryset.values_list('course_id', flat=True))
+        super().delete_queryset(request, queryset)
+        Course.refresh_enrollment_counts(course_ids)
@@ -0,0 +1,235 @@
+"""
+Announcement fan-out to enrolled students.
+
+Posting an announcement only stores it. Once the transaction commits, a
+background thread (or ``manage.py send_announcements`` after a restart)
+walks the course roster by student id in BATCH_SIZE chunks. Each chunk
+gets its delivery rows from one bulk insert. Its emails are then split
+across CONNECTIONS threads, each keeping one SMTP connection open from
+batch to batch, so a 20k roster costs a few logins instead of 20k.
+
+A connection error (dropped connection, timeout, ...) reopens the
+connection and retries the rest of the batch, up to RETRIES times with a
+growing delay. Any other SMTP error (a refused recipient, a rejected
+message) is about one email: that recipient is marked failed right away.
+Statuses are written per chunk and ``cursor`` then moves past it, so a
+resumed send starts at the first unfinished chunk; only a crash in the
+middle of a chunk can email part of it twice. Students who enrol while an
+announcement is being sent may miss it.
+
+A sender first claims the announcement with a conditional UPDATE, so the
+thread started on posting and ``send_announcements`` never both send it.
+A send that stopped updating the row for STALE_AFTER seconds is taken to
+have died with its worker and can be claimed again.
+"""
+import logging
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Announcement, AnnouncementDelivery, Enrollment
+from lms_project.tenancy import bind, tenant_db
+
+logger = logging.getLogger(__name__)
+
+
+def delivery_option(name):
+    defaults = {'BATCH_SIZE': 500, 'CONNECTIONS': 4, 'RETRIES': 3, 'RETRY_DELAY': 2.0, 'STALE_AFTER': 900}
+    return getattr(settings, 'ANNOUNCEMENT_DELIVERY', {}).get(name, defaults[name])
+
+
+# Errors after which the connection is unusable; other SMTP errors concern one message.
+# Socket errors and timeouts are caught as OSError around the whole batch.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+
+
+def build_message(announcement, email):
+    return EmailMessage(
+        subject=f"[{announcement.course.title}] {announcement.subject}",
+        body=announcement.body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+    )
+
+
+class MailerPool:
+    """Threads that each keep their own SMTP connection open across batches"""
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='announcements')
+
+    def send(self, messages):
+        """Send (delivery id, message) pairs; returns {delivery id: None if sent, else the error}"""
+        results = {}
+        batches = [messages[i::self.size] for i in range(self.size) if messages[i::self.size]]
+        for batch_results in self.executor.map(self._send_batch, batches):
+            results.update(batch_results)
+        return results
+
+    def close(self):
+        self.executor.shutdown()
+        for mail_connection in self.connections:
+            self._close(mail_connection)
+
+    def _connection(self):
+        mail_connection = getattr(self.local, 'connection', None)
+        if mail_connection is None:
+            mail_connection = self.local.connection = get_connection(fail_silently=False)
+            with self.lock:
+                self.connections.append(mail_connection)
+        # Opens once; after that send_messages() leaves the connection open
+        mail_connection.open()
+        return mail_connection
+
+    def _reset(self):
+        self._close(self.local.connection)
+        with self.lock:
+            self.connections.remove(self.local.connection)
+        self.local.connection = None
+
+    @staticmethod
+    def _close(mail_connection):
+        try:
+            mail_connection.close()
+        except Exception:
+            pass
+
+    def _send_batch(self, batch):
+        results, done, attempt = {}, 0, 0
+        while done < len(batch):
+            try:
+                mail_connection = self._connection()
+                for delivery_id, message in batch[done:]:
+                    try:
+                        mail_connection.send_messages([message])
+                        results[delivery_id] = None
+                    except CONNECTION_ERRORS:
+                        raise
+                    except smtplib.SMTPRecipientsRefused as e:
+                        results[delivery_id] = f"Refused: {e.recipients}"[:255]
+                    except smtplib.SMTPException as e:
+                        results[delivery_id] = str(e)[:255] or type(e).__name__
+                    done += 1
+            except OSError as e:
+                # SMTPException is an OSError too: this is CONNECTION_ERRORS, or opening failed
+                if getattr(self.local, 'connection', None) is not None:
+                    self._reset()
+                attempt += 1
+                if attempt > delivery_option('RETRIES'):
+                    results.update((delivery_id, str(e)[:255] or type(e).__name__) for delivery_id, _ in batch[done:])
+                    break
+                logger.warning("Announcement batch: %s, retrying (%d)", e, attempt)
+                time.sleep(delivery_option('RETRY_DELAY') * attempt)
+        return results
+
+
+def send_chunk(announcement, roster, pool):
+    """Create and send the deliveries of one roster chunk of (student id, email) rows"""
+    AnnouncementDelivery.objects.bulk_create(
+        [AnnouncementDelivery(announcement=announcement, student_id=student_id) for student_id, _ in roster],
+        ignore_conflicts=True,
+    )
+    emails = dict(roster)
+    pending = AnnouncementDelivery.objects.filter(
+        announcement=announcement, status='pending', student_id__gte=roster[0][0], student_id__lte=roster[-1][0],
+    ).values_list('id', 'student_id')
+    results = pool.send([(pk, build_message(announcement, emails[student_id])) for pk, student_id in pending])
+
+    sent = [pk for pk, error in results.items() if error is None]
+    failed = sorted(((error, pk) for pk, error in results.items() if error is not None))
+    now = timezone.now()
+    with transaction.atomic(using=tenant_db()):
+        AnnouncementDelivery.objects.filter(pk__in=sent).update(status='sent', sent_at=now)
+        # One UPDATE per distinct error, not per recipient
+        for error, rows in groupby(failed, key=lambda row: row[0]):
+            AnnouncementDelivery.objects.filter(pk__in=[pk for _, pk in rows]).update(status='failed', error=error)
+        Announcement.objects.filter(pk=announcement.pk).update(
+            cursor=roster[-1][0], sent=F('sent') + len(sent), failed=F('failed') + len(failed), updated_at=now,
+        )
+    announcement.cursor = roster[-1][0]
+
+
+def claim(announcement):
+    """
+    Mark an announcement as being sent by this worker. False if it is done,
+    another worker is sending it, or another worker claimed it first.
+    """
+    now = timezone.now()
+    if announcement.status == 'done':
+        return False
+    if announcement.status == 'sending' and announcement.updated_at > now - timedelta(
+        seconds=delivery_option('STALE_AFTER')
+    ):
+        return False
+    changes = {'status': 'sending', 'updated_at': now}
+    if announcement.status == 'pending':
+        changes['recipients'] = Enrollment.objects.filter(course_id=announcement.course_id).count()
+    # Only if nobody changed the row since it was read
+    claimed = Announcement.objects.filter(
+        pk=announcement.pk, status=announcement.status, updated_at=announcement.updated_at
+    ).update(**changes)
+    if claimed:
+        for field, value in changes.items():
+            setattr(announcement, field, value)
+    return bool(claimed)
+
+
+def run_announcement(announcement_id):
+    """Send (or resume sending) an announcement to the course roster, unless another worker is sending it"""
+    announcement = Announcement.objects.select_related('course').get(pk=announcement_id)
+    if not claim(announcement):
+        announcement.refresh_from_db()
+        return announcement
+
+    pool = MailerPool(delivery_option('CONNECTIONS'))
+    try:
+        while True:
+            roster = list(
+                Enrollment.objects.filter(course_id=announcement.course_id, student_id__gt=announcement.cursor)
+                .order_by('student_id').values_list('student_id', 'student__email')[:delivery_option('BATCH_SIZE')]
+            )
+            if not roster:
+                break
+            send_chunk(announcement, roster, pool)
+    except Exception as e:
+        logger.exception("Announcement %s failed", announcement.pk)
+        announcement.status = 'failed'
+        announcement.error = str(e)
+        announcement.save(update_fields=['status', 'error', 'updated_at'])
+        return announcement
+    finally:
+        pool.close()
+
+    announcement.refresh_from_db(fields=['sent', 'failed'])
+    announcement.status = 'done'
+    announcement.finished_at = timezone.now()
+    announcement.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return announcement
+
+
+def _run_in_thread(announcement_id):
+    try:
+        run_announcement(announcement_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_announcement(announcement):
+    """Start sending once the surrounding transaction commits"""
+    transaction.on_commit(
+        lambda: threading.Thread(target=bind(_run_in_thread), args=(announcement.pk,), daemon=True).start(),
+        using=tenant_db(),
+    )
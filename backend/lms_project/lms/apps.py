@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class LmsConfig(AppConfig):
     name = 'lms'
+
+    def ready(self):
+        # Register outbox consumers
+        from . import projections  # noqa: F401
@@ -0,0 +1,100 @@
+"""
+Enrollment archival.
+
+Enrollments of courses that have ended are moved from the hot Enrollment
+table into ArchivedEnrollment in chunked batches, so rosters, enrollment
+and statistics queries only scan live data. Historical queries opt in to
+the archive with ``?include_archived=true``. Archiving also closes the
+enrollments' open EnrollmentPeriods at the course's end, so cohort
+retention stops counting those students as enrolled.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedEnrollment, Course, Enrollment, EnrollmentPeriod
+from .outbox import record_event
+from lms_project.tenancy import tenant_db
+
+BATCH_SIZE = getattr(settings, 'ARCHIVE_BATCH_SIZE', 1000)
+GRACE_DAYS = getattr(settings, 'ARCHIVE_GRACE_DAYS', 30)
+
+
+def include_archived(request):
+    """True when the client opted in to archived enrollments"""
+    return request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+
+def archivable_enrollments(grace_days=GRACE_DAYS, max_age_days=None):
+    """
+    Enrollments of courses that ended more than ``grace_days`` ago. When
+    ``max_age_days`` is given, courses without an end date that were created
+    longer ago than that are treated as ended too.
+    """
+    now = timezone.now()
+    ended = Course.all_objects.filter(ends_at__lte=now - timedelta(days=grace_days))
+    if max_age_days is not None:
+        ended = ended | Course.all_objects.filter(
+            ends_at__isnull=True, created_at__lte=now - timedelta(days=max_age_days)
+        )
+    return Enrollment.objects.filter(course__in=ended.values('pk'))
+
+
+def archive_enrollments(queryset=None, batch_size=BATCH_SIZE):
+    """
+    Move enrollments into the archive one bounded batch at a time. Each batch
+    is copied and deleted in its own short transaction, so a crash can only
+    leave already-archived rows behind, which the next run skips. Yields the
+    number of rows moved per batch.
+    """
+    if queryset is None:
+        queryset = archivable_enrollments()
+
+    while True:
+        batch = list(queryset.order_by('pk').values('pk', 'student_id', 'course_id', 'enrolled_at')[:batch_size])
+        if not batch:
+            return
+        with transaction.atomic(using=tenant_db()):
+            ArchivedEnrollment.objects.bulk_create(
+                [
+                    ArchivedEnrollment(
+                        id=row['pk'],
+                        student_id=row['student_id'],
+                        course_id=row['course_id'],
+                        enrolled_at=row['enrolled_at'],
+                        year=row['enrolled_at'].year,
+                    )
+                    for row in batch
+                ],
+                ignore_conflicts=True,
+            )
+            Enrollment.objects.filter(pk__in=[row['pk'] for row in batch]).delete()
+            close_periods(batch)
+            Course.refresh_enrollment_counts({row['course_id'] for row in batch})
+            record_event('enrollment.archived', count=len(batch))
+        yield len(batch)
+
+
+def close_periods(batch):
+    """End the open periods of archived enrollments when their course ended (now if it has no end)"""
+    students = defaultdict(list)
+    for row in batch:
+        students[row['course_id']].append(row['student_id'])
+    ends = dict(Course.all_objects.filter(pk__in=students).values_list('pk', 'ends_at'))
+    now = timezone.now()
+    for course_id, student_ids in students.items():
+        EnrollmentPeriod.objects.filter(
+            course_id=course_id, student_id__in=student_ids, ended_at__isnull=True
+        ).update(ended_at=min(ends[course_id] or now, now))
+
+
+def merge_counts(key, *groups):
+    """Add up grouped ``values(key).annotate(count=...)`` rows from the hot and archive tables"""
+    totals = {}
+    for group in groups:
+        for item in group:
+            totals[item[key]] = totals.get(item[key], 0) + item['count']
+    return [{key: k, 'count': v} for k, v in sorted(totals.items(), key=lambda kv: -kv[1])]
@@ -0,0 +1,168 @@
+"""
+Course cover images.
+
+An uploaded cover is stored once, keyed by the SHA-256 of its bytes, and
+every size in COVER_SIZES is rendered in every format in COVER_FORMATS
+into ``covers/<hh>/<hash>/`` under MEDIA_ROOT. Renditions carry no EXIF
+metadata. The original keeps it (camera, GPS position), so it goes to
+COVER_ORIGINALS_DIR, which is not served, under an HMAC of the hash that
+cannot be worked out from the public rendition URLs. Rendering runs in a
+process pool, so resizing never holds a request thread or the GIL of a
+web worker. Renditions are content-addressed: the same image uploaded
+again, to any course, is a cache hit and nothing is rendered.
+
+Course.cover_original is the hash of the latest upload and cover_hash is
+set to it once its renditions exist. Serializers only format URLs from
+cover_hash, so listing courses never opens an image or touches the disk.
+Renders lost to a restart are redone by ``manage.py process_covers``.
+"""
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import Image
+
+from .models import Course
+from .rendering import COVER_FORMATS, COVER_SIZES, render
+from lms_project.tenancy import bind, tenant_db
+
+logger = logging.getLogger(__name__)
+
+ACCEPTED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def covers_dir():
+    return Path(settings.MEDIA_ROOT) / 'covers'
+
+
+def originals_dir():
+    return Path(settings.COVER_ORIGINALS_DIR)
+
+
+def original_path(digest):
+    # Only pending renders need the original, so rotating SECRET_KEY loses nothing published
+    name = hmac.new(settings.SECRET_KEY.encode(), digest.encode(), hashlib.sha256).hexdigest()
+    return originals_dir() / name
+
+
+def rendition_dir(digest):
+    return covers_dir() / digest[:2] / digest
+
+
+def cover_urls(digest):
+    """{size: {format: url}} of a ready cover, or None; string formatting only"""
+    if not digest:
+        return None
+    base = f"{settings.MEDIA_URL}covers/{digest[:2]}/{digest}/"
+    return {size: {ext: f"{base}{size}.{ext}" for ext in COVER_FORMATS} for size in COVER_SIZES}
+
+
+def is_rendered(digest):
+    directory = rendition_dir(digest)
+    return all((directory / f"{size}.{ext}").exists() for size in COVER_SIZES for ext in COVER_FORMATS)
+
+
+def check_image(uploaded):
+    """Raise ValueError unless the upload is an image in an accepted format; reads the header only"""
+    try:
+        with Image.open(uploaded) as image:
+            image_format = image.format
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError("Not a readable image")
+    finally:
+        uploaded.seek(0)
+    if image_format not in ACCEPTED_FORMATS:
+        raise ValueError(f"Images must be one of {', '.join(sorted(ACCEPTED_FORMATS))}")
+
+
+def store_original(uploaded):
+    """Hash an uploaded file while copying it into place; returns the hash"""
+    digest = hashlib.sha256()
+    target_dir = originals_dir()
+    target_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=target_dir, delete=False) as tmp:
+        for chunk in uploaded.chunks():
+            digest.update(chunk)
+            tmp.write(chunk)
+    digest = digest.hexdigest()
+    os.replace(tmp.name, original_path(digest))
+    return digest
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: web workers run threads, and the children only need PIL
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.COVER_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def mark_ready(course_id, digest):
+    """Publish a rendered cover unless the course got a newer one meanwhile"""
+    return Course.all_objects.filter(pk=course_id, cover_original=digest).update(cover_hash=digest)
+
+
+def _rendered(future, course_id, digest, submitter):
+    # Normally runs on the executor's management thread, which owns its own connection
+    try:
+        future.result()
+        mark_ready(course_id, digest)
+    except Exception:
+        logger.exception("Rendering cover %s of course %s failed", digest, course_id)
+    finally:
+        if threading.get_ident() != submitter:
+            connections.close_all()
+
+
+def submit(course_id, digest):
+    try:
+        future = get_executor().submit(render, str(original_path(digest)), str(rendition_dir(digest)))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool once
+        _reset_executor()
+        future = get_executor().submit(render, str(original_path(digest)), str(rendition_dir(digest)))
+    submitter = threading.get_ident()
+    rendered = bind(_rendered)
+    future.add_done_callback(lambda f: rendered(f, course_id, digest, submitter))
+
+
+def set_cover(course, digest):
+    """
+    Point a course at a stored original. Returns True when the cover is
+    ready right away (cache hit, or rendering inline with COVER_WORKERS=0),
+    False when it is being rendered in the pool.
+    """
+    Course.all_objects.filter(pk=course.pk).update(cover_original=digest)
+    if not is_rendered(digest):
+        if settings.COVER_WORKERS:
+            transaction.on_commit(lambda: submit(course.pk, digest), using=tenant_db())
+            return False
+        render(original_path(digest), rendition_dir(digest))
+    mark_ready(course.pk, digest)
+    return True
+
+
+def clear_cover(course):
+    """Renditions stay, other courses may share them"""
+    Course.all_objects.filter(pk=course.pk).update(cover_original='', cover_hash='')
@@ -0,0 +1,194 @@
+"""
+Background deletion of categories, courses and users.
+
+Django's CASCADE collector loads every dependent row into memory and deletes
+them inside one long write transaction, which blocks the SQLite writer for
+everyone. Instead the target is hidden immediately and its dependents are
+removed leaf-first in short, bounded batches, each committed on its own.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from accounts.models import User
+from .models import (
+    Announcement, AnnouncementDelivery, ArchivedEnrollment, Category, Course, CourseMaterial, DeletionJob, Enrollment,
+    EnrollmentPeriod, Lesson, LessonProgress, MaterialUpload, Module, Question, Quiz, QuizAnswer, QuizSubmission,
+)
+from .materials import remove_files, stored_files
+from .outbox import record_event
+from lms_project.tenancy import bind, tenant_db
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'DELETION_BATCH_SIZE', 500)
+
+# Outbox events recorded per batch so projections can follow bulk removals
+PURGE_EVENTS = {
+    Enrollment: 'enrollment.purged',
+    ArchivedEnrollment: 'archived_enrollment.purged',
+}
+
+
+def _plan(job):
+    """Querysets to empty for a job, ordered leaves first"""
+    pk = job.target_id
+    if job.target_type == 'category':
+        # The whole subtree goes; the root row is deleted last, so if it is gone so is everything
+        path = Category.all_objects.filter(pk=pk).values_list('path', flat=True).first()
+        if path is None:
+            return []
+        under = Category.subtree_filter(path, 'course__category__path')
+        return [
+            Enrollment.objects.filter(under),
+            ArchivedEnrollment.objects.filter(under),
+            EnrollmentPeriod.objects.filter(under),
+            LessonProgress.objects.filter(Category.subtree_filter(path, 'lesson__module__course__category__path')),
+            Lesson.objects.filter(Category.subtree_filter(path, 'module__course__category__path')),
+            Module.objects.filter(under),
+            CourseMaterial.objects.filter(under),
+            MaterialUpload.objects.filter(under),
+            QuizAnswer.objects.filter(Category.subtree_filter(path, 'question__quiz__course__category__path')),
+            QuizSubmission.objects.filter(Category.subtree_filter(path, 'quiz__course__category__path')),
+            Question.objects.filter(Category.subtree_filter(path, 'quiz__course__category__path')),
+            Quiz.objects.filter(under),
+            AnnouncementDelivery.objects.filter(
+                Category.subtree_filter(path, 'announcement__course__category__path')
+            ),
+            Announcement.objects.filter(under),
+            Course.all_objects.filter(Category.subtree_filter(path, 'category__path')),
+            Category.all_objects.filter(Category.subtree_filter(path)).order_by('-path'),
+        ]
+    if job.target_type == 'course':
+        return [
+            Enrollment.objects.filter(course_id=pk),
+            ArchivedEnrollment.objects.filter(course_id=pk),
+            EnrollmentPeriod.objects.filter(course_id=pk),
+            LessonProgress.objects.filter(lesson__module__course_id=pk),
+            Lesson.objects.filter(module__course_id=pk),
+            Module.objects.filter(course_id=pk),
+            CourseMaterial.objects.filter(course_id=pk),
+            MaterialUpload.objects.filter(course_id=pk),
+            QuizAnswer.objects.filter(question__quiz__course_id=pk),
+            QuizSubmission.objects.filter(quiz__course_id=pk),
+            Question.objects.filter(quiz__course_id=pk),
+            Quiz.objects.filter(course_id=pk),
+            AnnouncementDelivery.objects.filter(announcement__course_id=pk),
+            Announcement.objects.filter(course_id=pk),
+            Course.all_objects.filter(pk=pk),
+        ]
+    if job.target_type == 'user':
+        return [
+            Enrollment.objects.filter(student_id=pk),
+            Enrollment.objects.filter(course__instructor_id=pk),
+            ArchivedEnrollment.objects.filter(student_id=pk),
+            ArchivedEnrollment.objects.filter(course__instructor_id=pk),
+            EnrollmentPeriod.objects.filter(student_id=pk),
+            EnrollmentPeriod.objects.filter(course__instructor_id=pk),
+            LessonProgress.objects.filter(student_id=pk),
+            LessonProgress.objects.filter(lesson__module__course__instructor_id=pk),
+            Lesson.objects.filter(module__course__instructor_id=pk),
+            Module.objects.filter(course__instructor_id=pk),
+            CourseMaterial.objects.filter(course__instructor_id=pk),
+            MaterialUpload.objects.filter(course__instructor_id=pk),
+            MaterialUpload.objects.filter(uploaded_by_id=pk),
+            QuizAnswer.objects.filter(submission__student_id=pk),
+            QuizAnswer.objects.filter(question__quiz__course__instructor_id=pk),
+            QuizSubmission.objects.filter(student_id=pk),
+            QuizSubmission.objects.filter(quiz__course__instructor_id=pk),
+            Question.objects.filter(quiz__course__instructor_id=pk),
+            Quiz.objects.filter(course__instructor_id=pk),
+            AnnouncementDelivery.objects.filter(student_id=pk),
+            AnnouncementDelivery.objects.filter(announcement__course__instructor_id=pk),
+            Announcement.objects.filter(course__instructor_id=pk),
+            Course.all_objects.filter(instructor_id=pk),
+            User.objects.filter(pk=pk),
+        ]
+    raise ValueError(f"Unknown deletion target: {job.target_type}")
+
+
+def _delete_in_batches(queryset, job):
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        with transaction.atomic(using=tenant_db()):
+            if queryset.model is Enrollment:
+                course_ids = set(Enrollment.objects.filter(pk__in=ids).values_list('course_id', flat=True))
+            if queryset.model in (CourseMaterial, MaterialUpload):
+                # Files go once the rows are gone for good
+                paths = stored_files(queryset.model, ids)
+                transaction.on_commit(lambda: remove_files(paths), using=tenant_db())
+            queryset.model._base_manager.filter(pk__in=ids).delete()
+            if queryset.model is Enrollment:
+                Course.refresh_enrollment_counts(course_ids)
+            if queryset.model in PURGE_EVENTS:
+                record_event(PURGE_EVENTS[queryset.model], count=len(ids), deletion_job=job.pk)
+        job.deleted += len(ids)
+        DeletionJob.objects.filter(pk=job.pk).update(deleted=job.deleted, updated_at=timezone.now())
+
+
+def run_deletion_job(job_id):
+    """Run (or resume) a deletion job until its target is gone"""
+    job = DeletionJob.objects.get(pk=job_id)
+    if job.status == 'done':
+        return job
+
+    plan = _plan(job)
+    job.status = 'running'
+    job.total = job.deleted + sum(queryset.count() for queryset in plan)
+    job.save(update_fields=['status', 'total', 'updated_at'])
+
+    try:
+        for queryset in plan:
+            _delete_in_batches(queryset, job)
+    except Exception as e:
+        logger.exception("Deletion job %s failed", job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        return job
+
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_deletion_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_deletion(target_type, target, requested_by=None):
+    """
+    Hide the target right away and delete it in a background thread once the
+    surrounding transaction commits. Jobs interrupted by a restart are picked
+    up again by the ``run_deletions`` management command.
+    """
+    with transaction.atomic(using=tenant_db()):
+        if target_type == 'user':
+            courses = Course.objects.filter(instructor_id=target.pk).count()
+            User.objects.filter(pk=target.pk).update(is_active=False)
+            record_event('user.deleted', target.pk, role=target.role, courses=courses)
+        elif target_type == 'category':
+            courses = Course.objects.filter(target.subtree('category__path')).count()
+            categories = Category.objects.filter(target.subtree()).update(is_deleted=True)
+            record_event('category.deleted', target.pk, courses=courses, categories=categories)
+        else:
+            Course.all_objects.filter(pk=target.pk).update(is_deleted=True)
+            record_event('course.deleted', target.pk, category=target.category_id)
+        job = DeletionJob.objects.create(
+            target_type=target_type, target_id=target.pk, requested_by=requested_by
+        )
+
+    transaction.on_commit(
+        lambda: threading.Thread(target=bind(_run_in_thread), args=(job.pk,), daemon=True).start(),
+        using=tenant_db(),
+    )
+    return job
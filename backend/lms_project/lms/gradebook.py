@@ -0,0 +1,162 @@
+"""
+Course gradebook: an enrolled students x quizzes matrix of scores.
+
+The matrix is a NumPy array (NaN where a student has not submitted) built
+from three queries, whatever the roster size. Weighted totals, per-quiz
+statistics and percentile ranks are array operations over it. A missing
+submission counts as zero in the total but is left out of the quiz's
+statistics.
+
+Exports stream in chunks of EXPORT_CHUNK rows. Each chunk's numbers are
+formatted by np.savetxt in one call, so no Python object is created per
+cell; only the student columns are formatted row by row. Text cells that
+a spreadsheet would read as a formula (quiz titles, names, emails starting
+with = + - @ or a tab or carriage return) are prefixed with a quote.
+"""
+import csv
+import io
+import json
+import warnings
+
+import numpy as np
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from .models import Enrollment, Quiz, QuizSubmission
+
+EXPORT_CHUNK = 1000
+NUMBER_FORMAT = '%.2f'
+STAT_PERCENTILES = [25, 50, 75, 90]
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Gradebook:
+    def __init__(self, students, quizzes, submissions):
+        # students: (id, email, full_name) rows in display order
+        # quizzes: (id, title, weight, max_score) rows in column order
+        # submissions: (student id, quiz id, score) rows; students or quizzes not listed are dropped
+        self.student_ids = np.array([row[0] for row in students], dtype=np.int64)
+        self.student_labels = [(row[1], row[2]) for row in students]
+        self.quiz_ids = np.array([row[0] for row in quizzes], dtype=np.int64)
+        self.quiz_titles = [row[1] for row in quizzes]
+        self.weights = np.array([row[2] for row in quizzes], dtype=np.float64)
+        self.max_scores = np.array([row[3] for row in quizzes], dtype=np.float64)
+
+        self.scores = np.full((len(self.student_ids), len(self.quiz_ids)), np.nan)
+        submissions = np.array(submissions, dtype=np.float64).reshape(-1, 3)
+        rows, known_rows = _positions(self.student_ids, submissions[:, 0])
+        columns, known_columns = _positions(self.quiz_ids, submissions[:, 1])
+        known = known_rows & known_columns
+        self.scores[rows[known], columns[known]] = submissions[known, 2]
+
+        self.totals = self._weighted_totals()
+        ordered = np.sort(self.totals)
+        self.percentiles = (
+            100 * np.searchsorted(ordered, self.totals, side='right') / len(ordered) if len(ordered) else ordered
+        )
+
+    @classmethod
+    def for_course(cls, course_id):
+        students = Enrollment.objects.filter(course_id=course_id).order_by(
+            'student__full_name', 'student__email'
+        ).values_list('student_id', 'student__email', 'student__full_name')
+        quizzes = Quiz.objects.filter(course_id=course_id).order_by('id').annotate(
+            max_score=Coalesce(Sum('questions__points'), 0.0)
+        ).values_list('id', 'title', 'weight', 'max_score')
+        submissions = QuizSubmission.objects.filter(quiz__course_id=course_id).values_list(
+            'student_id', 'quiz_id', 'score'
+        )
+        return cls(list(students), list(quizzes), list(submissions))
+
+    def _weighted_totals(self):
+        """Percent of the weighted maximum; quizzes without points carry no weight"""
+        weights = np.where(self.max_scores > 0, self.weights, 0)
+        if not weights.sum():
+            return np.zeros(len(self.student_ids))
+        fractions = np.nan_to_num(self.scores) / np.where(self.max_scores > 0, self.max_scores, 1)
+        return 100 * (fractions @ weights) / weights.sum()
+
+    def summary(self):
+        """Per-quiz and total statistics, as JSON-ready dicts"""
+        return {
+            'students': len(self.student_ids),
+            'assessments': [
+                {'id': int(quiz_id), 'title': title, 'weight': float(weight), 'max_score': float(max_score), **stats}
+                for quiz_id, title, weight, max_score, stats in zip(
+                    self.quiz_ids, self.quiz_titles, self.weights, self.max_scores, _column_stats(self.scores)
+                )
+            ],
+            'total': _column_stats(self.totals[:, None])[0],
+        }
+
+    def csv_chunks(self):
+        header = io.StringIO()
+        csv.writer(header).writerow(
+            ['student_id', 'email', 'name', *map(_csv_text, self.quiz_titles), 'total', 'percentile']
+        )
+        yield header.getvalue()
+        for start, numbers in self._number_lines(''):
+            out = io.StringIO()
+            # Only the student columns go through csv (for quoting); the numbers follow as preformatted
+            writer = csv.writer(out, lineterminator=',')
+            for student_id, (email, name), line in zip(self.student_ids[start:], self.student_labels[start:], numbers):
+                writer.writerow([student_id, _csv_text(email), _csv_text(name)])
+                out.write(f"{line}\r\n")
+            yield out.getvalue()
+
+    def ndjson_chunks(self):
+        for start, numbers in self._number_lines('null'):
+            lines = []
+            for student_id, (email, name), line in zip(self.student_ids[start:], self.student_labels[start:], numbers):
+                scores, total, percentile = line.rsplit(',', 2) if self.quiz_titles else ('', *line.split(','))
+                lines.append(
+                    f'{{"student": {student_id}, "email": {json.dumps(email)}, "name": {json.dumps(name)}, '
+                    f'"scores": [{scores}], "total": {total}, "percentile": {percentile}}}\n'
+                )
+            yield ''.join(lines)
+
+    def _number_lines(self, missing):
+        """(first row, formatted score/total/percentile lines) per chunk, with ``missing`` for NaN"""
+        for start in range(0, len(self.student_ids), EXPORT_CHUNK):
+            stop = start + EXPORT_CHUNK
+            block = np.column_stack([self.scores[start:stop], self.totals[start:stop], self.percentiles[start:stop]])
+            out = io.StringIO()
+            np.savetxt(out, block, fmt=NUMBER_FORMAT, delimiter=',')
+            yield start, out.getvalue().replace('nan', missing).splitlines()
+
+
+def _csv_text(value):
+    """``value`` made inert for spreadsheets that evaluate formulas in CSV cells"""
+    return f"'{value}" if value.startswith(FORMULA_PREFIXES) else value
+
+
+def _positions(ids, values):
+    """Index of each value in ``ids`` (any order) and whether it was found"""
+    if not len(ids):
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+    order = np.argsort(ids)
+    found = np.minimum(np.searchsorted(ids[order], values), len(ids) - 1)
+    return order[found], ids[order[found]] == values
+
+
+def _column_stats(matrix):
+    """Count, mean, std, min, max and percentiles of each column, ignoring NaN"""
+    names = ['mean', 'std', 'min', 'max', *(f'p{p}' for p in STAT_PERCENTILES)]
+    if not len(matrix):
+        values = dict.fromkeys(names, np.full(matrix.shape[1], np.nan))
+    else:
+        with warnings.catch_warnings():
+            # Columns nobody submitted give NaN (reported as null) and a warning
+            warnings.simplefilter('ignore', RuntimeWarning)
+            values = dict(zip(names, [
+                np.nanmean(matrix, axis=0), np.nanstd(matrix, axis=0),
+                np.nanmin(matrix, axis=0), np.nanmax(matrix, axis=0),
+                *np.nanpercentile(matrix, STAT_PERCENTILES, axis=0),
+            ]))
+    submitted = (~np.isnan(matrix)).sum(axis=0)
+    return [
+        {'submitted': int(submitted[j]), **{
+            name: None if np.isnan(column[j]) else round(float(column[j]), 2) for name, column in values.items()
+        }}
+        for j in range(matrix.shape[1])
+    ]
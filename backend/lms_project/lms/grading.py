@@ -0,0 +1,189 @@
+"""
+Vectorized quiz grading.
+
+Answer keys and answers are both bitmasks over a question's options. A
+batch of submissions is loaded as an S x Q matrix of answer masks (one row
+per submission, one column per question) and graded against the key,
+points and partial-credit vectors of the quiz with a handful of NumPy
+operations, so there is no Python loop per answer:
+
+    exact    = masks == keys
+    partial  = clip((popcount(masks & keys) - popcount(masks & ~keys)) / popcount(keys), 0, 1)
+    scores   = where(partial_credit, partial, exact) @ points
+
+A partly right answer therefore earns the share of right options picked,
+less one share per wrong option, never below zero. Unanswered questions
+are mask 0 and earn nothing.
+
+Regrading a quiz walks its submissions in GRADING_BATCH_SIZE chunks: one
+query for the submission ids, one for their answers, and one executemany
+of a single UPDATE for the scores per chunk, each committed on its own.
+Requests that change a key only schedule the regrade, which runs in a
+background thread once their transaction commits.
+"""
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Question, QuizAnswer, QuizSubmission
+from lms_project.tenancy import bind, tenant_db
+
+logger = logging.getLogger(__name__)
+
+
+def batch_size():
+    return getattr(settings, 'GRADING_BATCH_SIZE', 10_000)
+
+
+def options_mask(indices):
+    """Bitmask of a list of option indices"""
+    mask = 0
+    for index in indices:
+        mask |= 1 << index
+    return mask
+
+
+def mask_options(mask):
+    """Option indices set in a bitmask"""
+    return [index for index in range(Question.MAX_OPTIONS) if mask >> index & 1]
+
+
+class AnswerKey:
+    """Keys, points and partial-credit flags of a quiz's questions, in question id order"""
+
+    def __init__(self, rows):
+        # rows: (question id, correct mask, points, partial_credit)
+        rows = sorted(rows)
+        self.question_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.keys = np.array([row[1] for row in rows], dtype=np.int64)
+        self.points = np.array([row[2] for row in rows], dtype=np.float64)
+        self.partial = np.array([row[3] for row in rows], dtype=bool)
+
+    @classmethod
+    def for_quiz(cls, quiz_id):
+        return cls(Question.objects.filter(quiz_id=quiz_id).values_list('id', 'correct', 'points', 'partial_credit'))
+
+    @property
+    def max_score(self):
+        return float(self.points.sum())
+
+    def matrix(self, submission_ids, answers):
+        """
+        S x Q answer masks from sorted ``submission_ids`` and an N x 3 array
+        of (submission id, question id, selected) rows. Rows of other
+        submissions or of questions not in the key are dropped.
+        """
+        masks = np.zeros((len(submission_ids), len(self.question_ids)), dtype=np.int64)
+        if not len(answers) or not len(self.question_ids) or not len(submission_ids):
+            return masks
+        rows = np.searchsorted(submission_ids, answers[:, 0])
+        columns = np.searchsorted(self.question_ids, answers[:, 1])
+        rows_in, columns_in = np.minimum(rows, len(submission_ids) - 1), np.minimum(columns, len(self.question_ids) - 1)
+        known = (submission_ids[rows_in] == answers[:, 0]) & (self.question_ids[columns_in] == answers[:, 1])
+        masks[rows_in[known], columns_in[known]] = answers[known, 2]
+        return masks
+
+    def grade(self, masks):
+        """Score of each row of an S x Q answer matrix"""
+        if not len(self.question_ids):
+            return np.zeros(len(masks))
+        # bitwise_count gives uint8; widen before subtracting
+        hits = np.bitwise_count(masks & self.keys).astype(np.int16)
+        misses = np.bitwise_count(masks & ~self.keys).astype(np.int16)
+        right = np.maximum(np.bitwise_count(self.keys), 1).astype(np.int16)
+        partial = np.clip((hits - misses) / right, 0, 1)
+        fraction = np.where(self.partial, partial, masks == self.keys)
+        return fraction @ self.points
+
+    def grade_answers(self, answers):
+        """Score of one submission given as {question id: mask}"""
+        masks = np.array([[answers.get(int(question_id), 0) for question_id in self.question_ids]], dtype=np.int64)
+        return float(self.grade(masks)[0])
+
+
+def load_answers(quiz_id, submission_ids):
+    """(submission id, question id, selected) rows of a sorted chunk of a quiz's submissions"""
+    rows = QuizAnswer.objects.filter(
+        submission__quiz_id=quiz_id, submission__pk__range=(int(submission_ids[0]), int(submission_ids[-1]))
+    ).values_list('submission_id', 'question_id', 'selected')
+    return np.array(list(rows), dtype=np.int64).reshape(-1, 3)
+
+
+def save_scores(submission_ids, scores, max_score):
+    """
+    Write the scores of a chunk of submissions. One statement run with
+    executemany: building a model instance per row for bulk_update costs
+    far more than the grading itself.
+    """
+    table = QuizSubmission._meta.db_table
+    connection = connections[tenant_db()]
+    graded_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    # One transaction, not a commit per row in autocommit mode
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {table} SET score = %s, max_score = %s, graded_at = %s WHERE id = %s",
+            [(score, max_score, graded_at, pk) for pk, score in zip(submission_ids.tolist(), scores.tolist())],
+        )
+
+
+def regrade_quiz(quiz_id):
+    """Grade every submission of a quiz against its current key; returns how many were graded"""
+    key = AnswerKey.for_quiz(quiz_id)
+    graded, last = 0, 0
+    while True:
+        submission_ids = np.array(
+            QuizSubmission.objects.filter(quiz_id=quiz_id, pk__gt=last).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size()],
+            dtype=np.int64,
+        )
+        if not len(submission_ids):
+            return graded
+        scores = key.grade(key.matrix(submission_ids, load_answers(quiz_id, submission_ids)))
+        save_scores(submission_ids, scores, key.max_score)
+        graded += len(submission_ids)
+        last = int(submission_ids[-1])
+
+
+# (database alias, quiz id) of regrades running in this process, mapped to
+# whether the key changed again since the run started
+_running = {}
+_running_lock = threading.Lock()
+
+
+def _regrade_in_thread(quiz_id):
+    running = (tenant_db(), quiz_id)
+    try:
+        while True:
+            try:
+                regrade_quiz(quiz_id)
+            except Exception:
+                logger.exception("Regrading quiz %s failed", quiz_id)
+            with _running_lock:
+                if not _running[running]:
+                    del _running[running]
+                    return
+                _running[running] = False
+    finally:
+        connections.close_all()
+
+
+def schedule_regrade(quiz_id):
+    """
+    Regrade a quiz in a background thread once the surrounding transaction
+    commits. A quiz already being regraded is regraded once more when that
+    run ends, so scores always end up graded against the latest key.
+    """
+    def start():
+        running = (tenant_db(), quiz_id)
+        with _running_lock:
+            if running in _running:
+                _running[running] = True
+                return
+            _running[running] = False
+        threading.Thread(target=bind(_regrade_in_thread), args=(quiz_id,), daemon=True).start()
+
+    transaction.on_commit(bind(start), using=tenant_db())
@@ -0,0 +1,139 @@
+"""
+Enrollment lifecycle history and cohort retention.
+
+Enrollment only holds current enrollments, so unenrolling still deletes
+its row and active-enrollment queries never wade through churn. Every
+spell is also kept as an EnrollmentPeriod, opened when the student
+enrolls or re-enrolls and closed when they unenroll.
+
+Retention is computed from one ordered scan of the periods, loaded into
+NumPy arrays. Each period adds +1/-1 at the edges of the weeks it covers
+in a months x weeks difference array (np.add.at), and a cumulative sum
+along the weeks turns that into the matrix. Apart from converting the
+timestamps, nothing runs per period in Python, and the work is one pass
+over the history plus months x weeks, not members x weeks.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import EnrollmentPeriod
+from lms_project.tenancy import tenant_db
+
+WEEK = timedelta(weeks=1)
+MAX_WEEKS = 52
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+WEEK_MICROS = WEEK // MICROSECOND
+
+
+def open_period(student, course, started_at=None):
+    """Record an enrollment, flagged as a re-enrollment if the pair has history"""
+    return EnrollmentPeriod.objects.create(
+        student=student,
+        course=course,
+        started_at=started_at or timezone.now(),
+        reenrolled=EnrollmentPeriod.objects.filter(student=student, course=course).exists(),
+    )
+
+
+def close_period(student, course, ended_at=None):
+    """Record an unenrollment; served by the partial index on open periods"""
+    return EnrollmentPeriod.objects.filter(student=student, course=course, ended_at__isnull=True).update(
+        ended_at=ended_at or timezone.now()
+    )
+
+
+def _micros(moment):
+    return (moment - EPOCH) // MICROSECOND
+
+
+def _month_starts(first, last):
+    """Local month starts from the month of ``first`` to the one after ``last``"""
+    month = timezone.localtime(first).date().replace(day=1)
+    last = timezone.localtime(last).date()
+    starts = []
+    while True:
+        starts.append(month)
+        if month > last:
+            return starts
+        month = (month + timedelta(days=31)).replace(day=1)
+
+
+def cohort_retention(periods, weeks=12, now=None):
+    """
+    Enrollment-month x retention-week matrix.
+
+    A cohort is every (student, course) pair whose first period started in
+    that month. Cell w is the share of the cohort enrolled exactly w weeks
+    after its first enrollment, counting only members for whom that moment
+    has passed; it is None when none have.
+    """
+    now = now or timezone.now()
+    rows = periods.order_by('student_id', 'course_id', 'started_at').values_list(
+        'student_id', 'course_id', 'started_at', 'ended_at'
+    )
+    columns = ([], [], [], [])
+    for row in rows.iterator(chunk_size=2000):
+        for column, value in zip(columns, row):
+            column.append(value)
+    if not columns[0]:
+        return []
+    students = np.array(columns[0], dtype=np.int64)
+    courses = np.array(columns[1], dtype=np.int64)
+    # Whole microseconds, so week boundaries fall exactly where timedelta puts them
+    started = np.array([_micros(moment) for moment in columns[2]], dtype=np.int64)
+    ended = np.array([_micros(moment or now) for moment in columns[3]], dtype=np.int64)
+
+    # Rows are grouped by pair; each row is measured from its pair's first start
+    new_pair = np.ones(len(students), dtype=bool)
+    new_pair[1:] = (students[1:] != students[:-1]) | (courses[1:] != courses[:-1])
+    first = started[new_pair]
+    pair_of_row = np.cumsum(new_pair) - 1
+
+    months = _month_starts(min(columns[2]), max(columns[2]))
+    bounds = np.array([
+        _micros(timezone.make_aware(datetime.combine(month, time.min))) for month in months
+    ], dtype=np.int64)
+    cohort = np.searchsorted(bounds, first, side='right') - 1
+    horizon = np.minimum(weeks, (_micros(now) - first) // WEEK_MICROS)
+
+    eligible = np.zeros((len(months), weeks + 2), dtype=np.int64)
+    np.add.at(eligible, (cohort, 0), 1)
+    np.add.at(eligible, (cohort, horizon + 1), -1)
+
+    offset = first[pair_of_row]
+    low = -((offset - started) // WEEK_MICROS)
+    high = np.minimum(horizon[pair_of_row], (ended - offset) // WEEK_MICROS)
+    kept = low <= high
+    retained = np.zeros_like(eligible)
+    np.add.at(retained, (cohort[pair_of_row][kept], low[kept]), 1)
+    np.add.at(retained, (cohort[pair_of_row][kept], high[kept] + 1), -1)
+
+    members = np.cumsum(eligible, axis=1)[:, :weeks + 1]
+    retained = np.cumsum(retained, axis=1)[:, :weeks + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.round(retained / members, 4)
+
+    return [
+        {
+            'month': f"{months[i]:%Y-%m}",
+            'size': int(members[i, 0]),
+            'retention': [float(share) if m else None for share, m in zip(shares[i], members[i])],
+        }
+        for i in np.flatnonzero(members[:, 0])
+    ]
+
+
+def cached_cohort_retention(periods, scope, weeks=12):
+    """cohort_retention() computed at most once a day per scope and width"""
+    today = timezone.localdate()
+    key = f"cohort-retention:{tenant_db()}:{scope}:{weeks}:{today.isoformat()}"
+    result = cache.get(key)
+    if result is None:
+        result = cohort_retention(periods, weeks)
+        midnight = timezone.make_aware(datetime.combine(today + timedelta(days=1), time.min))
+        cache.set(key, result, timeout=max(1, int((midnight - timezone.now()).total_seconds())))
+    return result
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from lms.archive import BATCH_SIZE, GRACE_DAYS, archivable_enrollments, archive_enrollments
+
+
+class Command(BaseCommand):
+    help = "Move enrollments of ended courses into the archive table in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-days', type=int, default=GRACE_DAYS,
+                            help="Only archive courses that ended at least this many days ago")
+        parser.add_argument('--max-age-days', type=int, default=None,
+                            help="Also archive courses without an end date created this many days ago")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = archivable_enrollments(options['grace_days'], options['max_age_days'])
+        moved = 0
+        for count in archive_enrollments(queryset, batch_size=options['batch_size']):
+            moved += count
+            self.stdout.write(f"Archived {moved} enrollments...")
+        self.stdout.write(self.style.SUCCESS(f"Done, {moved} enrollments archived"))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lms.outbox import BATCH_SIZE, consume, get_consumers, reset_consumer
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events to registered consumers in checkpointed batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('consumers', nargs='*', help="Consumer names (default: all)")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--reset', action='store_true',
+                            help="Rebuild the projections from base tables before consuming")
+        parser.add_argument('--follow', action='store_true', help="Keep polling for new events")
+        parser.add_argument('--interval', type=float, default=1.0, help="Polling interval with --follow")
+
+    def handle(self, *args, **options):
+        registry = get_consumers()
+        names = options['consumers'] or list(registry)
+        unknown = set(names) - set(registry)
+        if unknown:
+            raise CommandError(f"Unknown consumers: {', '.join(sorted(unknown))}")
+        consumers = [registry[name] for name in names]
+
+        if options['reset']:
+            for consumer in consumers:
+                reset_consumer(consumer)
+                self.stdout.write(f"Reset {consumer.name}")
+
+        while True:
+            for consumer in consumers:
+                handled = consume(consumer, batch_size=options['batch_size'])
+                if handled:
+                    self.stdout.write(f"{consumer.name}: {handled} events")
+            if not options['follow']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from lms.catalog import explain_catalog
+
+
+class Command(BaseCommand):
+    help = "Print the query plan of every catalog filter and sort combination"
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*',
+                            help="Query strings to explain instead of the documented cases, e.g. 'sort=title'")
+
+    def handle(self, *args, **options):
+        cases = explain_catalog(options['queries']) if options['queries'] else explain_catalog()
+        for query, plan in cases:
+            self.stdout.write(self.style.MIGRATE_HEADING(query))
+            self.stdout.write(plan + "\n")
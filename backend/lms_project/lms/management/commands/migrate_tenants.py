@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from lms_project.tenancy import tenant_alias, tenants, use_tenant
+
+
+class Command(BaseCommand):
+    help = "Create or update the tenant databases (the default one is migrated by migrate)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='?')
+        parser.add_argument('migration_name', nargs='?')
+        parser.add_argument('--tenant', action='append', dest='tenants', metavar='SLUG',
+                            help="Tenant to migrate (repeatable; default: every tenant)")
+
+    def handle(self, *args, **options):
+        slugs = options['tenants'] or tenants()
+        unknown = set(slugs) - set(tenants())
+        if unknown:
+            raise CommandError(f"Unknown tenants: {', '.join(sorted(unknown))}")
+        targets = [label for label in (options['app_label'], options['migration_name']) if label]
+
+        for slug in slugs:
+            alias = tenant_alias(slug)
+            Path(connections[alias].settings_dict['NAME']).parent.mkdir(parents=True, exist_ok=True)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{alias}:"))
+            # Data migrations that query through the ORM land in the tenant too
+            with use_tenant(slug):
+                call_command(
+                    'migrate', *targets, database=alias, interactive=False,
+                    verbosity=options['verbosity'], stdout=self.stdout, stderr=self.stderr,
+                )
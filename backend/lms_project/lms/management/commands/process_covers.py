@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from lms.covers import is_rendered, mark_ready, original_path, render, rendition_dir
+from lms.models import Course
+
+
+class Command(BaseCommand):
+    help = "Render covers whose background rendering was interrupted, e.g. by a restart"
+
+    def handle(self, *args, **options):
+        pending = Course.all_objects.exclude(cover_original='').exclude(cover_hash=F('cover_original'))
+        done = 0
+        for course_id, digest in pending.values_list('pk', 'cover_original').iterator():
+            if not original_path(digest).exists():
+                self.stderr.write(f"Course {course_id}: original {digest} is missing")
+                continue
+            if not is_rendered(digest):
+                render(original_path(digest), rendition_dir(digest))
+            done += mark_ready(course_id, digest)
+        self.stdout.write(self.style.SUCCESS(f"Done, {done} covers published"))
@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from lms.materials import materials_dir, remove_files
+from lms.models import MaterialUpload
+
+
+class Command(BaseCommand):
+    help = "Remove unfinished material uploads idle for longer than MATERIAL_UPLOAD_TTL, and their partial files"
+
+    def handle(self, *args, **options):
+        ttl = getattr(settings, 'MATERIAL_UPLOAD_TTL', 24 * 3600)
+        stale = MaterialUpload.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=ttl))
+        ids = list(stale.values_list('pk', flat=True))
+        MaterialUpload.objects.filter(pk__in=ids).delete()
+        # Partial files whose row is already gone (e.g. removed with its course) are old by mtime too
+        partial = materials_dir() / 'partial'
+        cutoff = time.time() - ttl
+        live = {f"{pk}.part" for pk in MaterialUpload.objects.values_list('pk', flat=True)}
+        paths = [
+            path for path in (partial.iterdir() if partial.exists() else [])
+            if path.name not in live and path.stat().st_mtime < cutoff
+        ]
+        remove_files(paths)
+        self.stdout.write(self.style.SUCCESS(f"Removed {len(ids)} stale uploads and {len(paths)} partial files"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from lms.deletion import run_deletion_job
+from lms.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = "Run pending or interrupted background deletion jobs"
+
+    def handle(self, *args, **options):
+        job_ids = DeletionJob.objects.exclude(status='done').order_by('created_at').values_list('id', flat=True)
+        for job_id in job_ids:
+            job = run_deletion_job(job_id)
+            self.stdout.write(f"{job}: {job.deleted}/{job.total}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from lms.announcements import run_announcement
+from lms.models import Announcement
+
+
+class Command(BaseCommand):
+    help = "Send pending announcements and resume those interrupted, e.g. by a restart"
+
+    def handle(self, *args, **options):
+        ids = Announcement.objects.exclude(status='done').order_by('id').values_list('id', flat=True)
+        for announcement_id in ids:
+            announcement = run_announcement(announcement_id)
+            self.stdout.write(
+                f"{announcement}: {announcement.sent} sent, {announcement.failed} failed "
+                f"of {announcement.recipients}"
+            )
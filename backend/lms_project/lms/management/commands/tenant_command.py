@@ -0,0 +1,30 @@
+import argparse
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from lms_project.tenancy import tenant_alias, tenants, use_tenant
+
+
+class Command(BaseCommand):
+    help = "Run a management command against each tenant database, e.g. tenant_command run_deletions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', dest='tenants', metavar='SLUG',
+                            help="Tenant to run for (repeatable; default: every tenant)")
+        parser.add_argument('--include-default', action='store_true', help="Also run against the default database")
+        parser.add_argument('command_name')
+        parser.add_argument('command_args', nargs=argparse.REMAINDER)
+
+    def handle(self, *args, **options):
+        slugs = options['tenants'] or tenants()
+        unknown = set(slugs) - set(tenants())
+        if unknown:
+            raise CommandError(f"Unknown tenants: {', '.join(sorted(unknown))}")
+        if options['include_default']:
+            slugs = [None, *slugs]
+
+        for slug in slugs:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{tenant_alias(slug)}:"))
+            with use_tenant(slug):
+                call_command(options['command_name'], *options['command_args'], stdout=self.stdout, stderr=self.stderr)
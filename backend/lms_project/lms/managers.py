@@ -0,0 +1,84 @@
+from django.db import connections, models, router
+from django.utils import timezone
+
+
+class CategoryManager(models.Manager):
+    """Hides categories that are queued for background deletion"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
+class TagManager(models.Manager):
+    def for_pairs(self, pairs):
+        """Tags for (facet, value) pairs, creating the missing ones"""
+        if not pairs:
+            return []
+        self.bulk_create([self.model(facet=facet, value=value) for facet, value in pairs], ignore_conflicts=True)
+        query = models.Q()
+        for facet, value in pairs:
+            query |= models.Q(facet=facet, value=value)
+        return list(self.filter(query))
+
+
+class CourseManager(models.Manager):
+    """Hides courses queued for deletion, directly or through their category"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False, category__is_deleted=False)
+
+
+class EnrollmentManager(models.Manager):
+    # Outcomes returned by enroll() alongside the new enrollment (or None)
+    ENROLLED = 'enrolled'
+    ALREADY_ENROLLED = 'already_enrolled'
+    COURSE_FULL = 'course_full'
+    COURSE_ENDED = 'course_ended'
+
+    def enroll(self, student, course):
+        """
+        Enroll a student with a single INSERT ... SELECT statement.
+
+        The seat check, the duplicate check and the insert happen in one
+        statement, so concurrent requests for the same course can neither
+        overbook it nor surface IntegrityErrors. Returns (enrollment, outcome).
+        """
+        enrollment_table = self.model._meta.db_table
+        course_table = course._meta.db_table
+        enrolled_at = timezone.now()
+        connection = connections[router.db_for_write(self.model)]
+        enrolled_at_db = connection.ops.adapt_datetimefield_value(enrolled_at)
+
+        sql = (
+            f"INSERT INTO {enrollment_table} (student_id, course_id, enrolled_at) "
+            f"SELECT %s, c.id, %s FROM {course_table} c "
+            f"WHERE c.id = %s AND (c.ends_at IS NULL OR c.ends_at > %s) "
+            f"AND (c.capacity IS NULL OR c.capacity > "
+            f"(SELECT COUNT(*) FROM {enrollment_table} e WHERE e.course_id = c.id)) "
+            f"ON CONFLICT (student_id, course_id) DO NOTHING"
+        )
+        returning = connection.features.can_return_columns_from_insert
+        if returning:
+            sql += " RETURNING id"
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [student.pk, enrolled_at_db, course.pk, enrolled_at_db])
+            if returning:
+                row = cursor.fetchone()
+            else:
+                row = (cursor.lastrowid,) if cursor.rowcount == 1 else None
+
+        if row:
+            enrollment = self.model(
+                id=row[0], student=student, course=course, enrolled_at=enrolled_at
+            )
+            enrollment._state.adding = False
+            enrollment._state.db = connection.alias
+            return enrollment, self.ENROLLED
+
+        # Slow path: only reached when nothing was inserted
+        if self.filter(student=student, course=course).exists():
+            return None, self.ALREADY_ENROLLED
+        if course.ends_at is not None and course.ends_at <= enrolled_at:
+            return None, self.COURSE_ENDED
+        return None, self.COURSE_FULL
@@ -0,0 +1,238 @@
+"""
+Course material storage: resumable chunked uploads and ranged downloads.
+
+Uploads follow the Content-Range protocol of resumable uploads: the client
+opens an upload with the total size, then PUTs consecutive chunks with
+``Content-Range: bytes <first>-<last>/<total>``. Each chunk is copied from
+the request stream to the partial file in BLOCK_SIZE pieces, so a worker
+never holds more than one block in memory whatever the chunk or file size.
+A chunk must start at the current ``received`` offset; after a dropped
+connection the client asks for the offset and continues from there.
+
+The declared content type is not trusted: finish_upload() sniffs the first
+bytes of the file and stores the detected type, or application/octet-stream
+when it recognises nothing. Only INLINE_TYPES are ever displayed inline;
+everything else (HTML, SVG, ...) is sent as an attachment so an uploaded
+file cannot run script on this origin.
+
+Downloads honour a single ``Range: bytes=`` range (206 Partial Content)
+and stream from disk through FileResponse. With MATERIALS_SENDFILE set to
+``x-sendfile`` (Apache, lighttpd) or ``x-accel-redirect`` (nginx) the
+response only carries a header and the front-end server sends the bytes,
+ranges included, without involving Python at all.
+"""
+import os
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import content_disposition_header
+
+from .models import CourseMaterial, MaterialUpload
+
+BLOCK_SIZE = 64 * 1024
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Types a browser only renders, never scripts; SVG is an image but can carry script
+INLINE_TYPES = ('video/', 'audio/', 'image/', 'application/pdf')
+NEVER_INLINE = {'image/svg+xml'}
+# (offset, magic bytes, content type), checked in order
+SIGNATURES = [
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (8, b'WEBP', 'image/webp'),
+    (8, b'WAVE', 'audio/wav'),
+    (4, b'ftypqt', 'video/quicktime'),
+    (4, b'ftypM4A', 'audio/mp4'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'\x1a\x45\xdf\xa3', 'video/webm'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'ID3', 'audio/mpeg'),
+]
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def materials_dir():
+    return Path(getattr(settings, 'MATERIALS_DIR', settings.BASE_DIR / 'materials'))
+
+
+def max_material_size():
+    return getattr(settings, 'MATERIAL_MAX_SIZE', 2 * 1024 ** 3)
+
+
+def max_chunk_size():
+    return getattr(settings, 'MATERIAL_MAX_CHUNK_SIZE', 16 * 1024 ** 2)
+
+
+def partial_path(upload):
+    return materials_dir() / 'partial' / f"{upload.pk}.part"
+
+
+def material_path(material):
+    return materials_dir() / material.storage_name
+
+
+def parse_content_range(header, size):
+    """(first, last) byte of a chunk; ValueError if the header is malformed or out of bounds"""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise ValueError("Content-Range must look like 'bytes <first>-<last>/<total>'")
+    first, last, total = map(int, match.groups())
+    if total != size or first > last or last >= size:
+        raise ValueError(f"Content-Range does not fit an upload of {size} bytes")
+    return first, last
+
+
+def write_chunk(path, offset, stream, length):
+    """Copy ``length`` bytes from ``stream`` into ``path`` at ``offset``; returns the bytes written"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(path, 'r+b' if path.exists() else 'w+b') as f:
+        f.seek(offset)
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            f.write(block)
+            written += len(block)
+    return written
+
+
+def sniff_content_type(path):
+    """Content type recognised from the first bytes of a file, or None"""
+    with open(path, 'rb') as f:
+        head = f.read(16)
+    for offset, magic, content_type in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type
+    return None
+
+
+def displays_inline(content_type):
+    content_type = content_type.split(';')[0].strip().lower()
+    return content_type not in NEVER_INLINE and content_type.startswith(INLINE_TYPES)
+
+
+def finish_upload(upload):
+    """Move a complete partial file into place; returns its storage name and sniffed content type"""
+    content_type = sniff_content_type(partial_path(upload)) or 'application/octet-stream'
+    storage_name = f"{upload.course_id}/{upload.pk.hex}{Path(upload.file_name).suffix.lower()[:10]}"
+    target = materials_dir() / storage_name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(partial_path(upload), target)
+    return storage_name, content_type
+
+
+def stored_files(model, ids):
+    """Paths on disk of the given CourseMaterial or MaterialUpload rows"""
+    if model is MaterialUpload:
+        return [materials_dir() / 'partial' / f"{pk}.part" for pk in ids]
+    names = CourseMaterial.objects.filter(pk__in=ids).values_list('storage_name', flat=True)
+    return [materials_dir() / name for name in names]
+
+
+def remove_files(paths):
+    for path in paths:
+        Path(path).unlink(missing_ok=True)
+
+
+def parse_range(header, size):
+    """
+    (first, last) byte of a single-range ``Range`` header, or None to send
+    the whole file (no header, or one this server does not handle, such as
+    multiple ranges). Raises RangeNotSatisfiable when it lies past the end.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - int(last)), size - 1
+    first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        raise RangeNotSatisfiable
+    return first, last
+
+
+class FileSlice:
+    """Read-only view of ``length`` bytes of a file from ``offset``, for FileResponse"""
+
+    def __init__(self, f, offset, length):
+        self.f = f
+        self.remaining = length
+        f.seek(offset)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def etag(material):
+    return f'"{material.pk}-{material.size}-{int(material.created_at.timestamp())}"'
+
+
+def download_response(request, material, as_attachment=False):
+    """Serve a material from disk, or hand it to the front-end server"""
+    as_attachment = as_attachment or not displays_inline(material.content_type)
+    disposition = content_disposition_header(as_attachment, material.file_name)
+    mode = getattr(settings, 'MATERIALS_SENDFILE', '')
+    if mode:
+        response = HttpResponse(content_type=material.content_type)
+        if mode == 'x-accel-redirect':
+            prefix = getattr(settings, 'MATERIALS_ACCEL_PREFIX', '/protected-materials/')
+            response['X-Accel-Redirect'] = prefix + quote(material.storage_name)
+        else:
+            response['X-Sendfile'] = str(material_path(material))
+        response['Content-Disposition'] = disposition
+        return response
+
+    size = material.size
+    tag = etag(material)
+    header = request.META.get('HTTP_RANGE')
+    # A Range that comes with a stale If-Range gets the whole, current file
+    if request.META.get('HTTP_IF_RANGE', tag) != tag:
+        header = None
+    try:
+        byte_range = parse_range(header, size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+
+    try:
+        f = open(material_path(material), 'rb')
+    except FileNotFoundError:
+        raise Http404("The file of this material is missing")
+    if byte_range is None:
+        response = FileResponse(f, content_type=material.content_type)
+        response['Content-Length'] = size
+    else:
+        first, last = byte_range
+        response = FileResponse(FileSlice(f, first, last - first + 1), status=206, content_type=material.content_type)
+        response['Content-Length'] = last - first + 1
+        response['Content-Range'] = f"bytes {first}-{last}/{size}"
+    response.block_size = BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = tag
+    response['Content-Disposition'] = disposition
+    return response
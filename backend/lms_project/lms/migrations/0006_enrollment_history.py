@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-19 00:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_periods(apps, schema_editor):
+    """Existing enrollments become open periods starting at enrolled_at"""
+    EnrollmentPeriod = apps.get_model('lms', 'EnrollmentPeriod')
+    for model_name in ('Enrollment', 'ArchivedEnrollment'):
+        rows = apps.get_model('lms', model_name).objects.values_list('student_id', 'course_id', 'enrolled_at')
+        batch = []
+        for student, course, enrolled_at in rows.iterator(chunk_size=2000):
+            batch.append(EnrollmentPeriod(student_id=student, course_id=course, started_at=enrolled_at))
+            if len(batch) == 2000:
+                EnrollmentPeriod.objects.bulk_create(batch)
+                batch = []
+        EnrollmentPeriod.objects.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0005_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('reenrolled', models.BooleanField(default=False)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_periods', to='lms.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'course', 'started_at'], name='enr_period_pair_idx'), models.Index(condition=models.Q(('ended_at__isnull', True)), fields=['course'], name='enr_period_active_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('ended_at__isnull', True)), fields=('student', 'course'), name='enr_period_one_open')],
+            },
+        ),
+        migrations.RunPython(backfill_periods, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 00:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_root_paths(apps, schema_editor):
+    """Existing categories are all roots"""
+    Category = apps.get_model('lms', 'Category')
+    for pk in Category.objects.values_list('pk', flat=True):
+        Category.objects.filter(pk=pk).update(path=f"/{pk:08d}/")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0006_enrollment_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='lms.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(set_root_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 00:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0011_course_materials'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='cover_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='cover_original',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0013_quizzes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='weight',
+            field=models.FloatField(default=1),
+        ),
+    ]
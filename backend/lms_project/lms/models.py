@@ -1,33 +1,513 @@
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.conf import settings
+from .managers import CategoryManager, CourseManager, EnrollmentManager, TagManager
 
 # Create your models here.
 
 class Category(models.Model):
+    """
+    Categories nest through ``parent``. ``path`` is the materialized path of
+    zero-padded ids from the root, e.g. ``/00000001/00000004/``, so a whole
+    subtree is one index range scan and ordering by path lists the tree
+    depth-first, each parent before its children.
+    """
+    PATH_STEP = 8
+
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
+    parent = models.ForeignKey('self', related_name='children', null=True, blank=True, on_delete=models.CASCADE)
+    path = models.CharField(max_length=255, db_index=True, default='', editable=False)
+    is_deleted = models.BooleanField(default=False, db_index=True)  # hidden while DeletionJob runs
+
+    objects = CategoryManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.name
+
+    @staticmethod
+    def subtree_filter(path, field='path'):
+        """Q for every category path under ``path``, itself included, as a range ('0' sorts right after '/')"""
+        return models.Q(**{f'{field}__gte': path, f'{field}__lt': path[:-1] + '0'})
+
+    def subtree(self, field='path'):
+        return self.subtree_filter(self.path, field)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Category, instance=self)):
+            super().save(*args, **kwargs)
+            old_path = self.path
+            parent_path = self.parent.path if self.parent_id else '/'
+            self.path = f"{parent_path}{self.pk:0{self.PATH_STEP}d}/"
+            if self.path != old_path:
+                # Moving a node rewrites the prefix of its whole subtree in one statement
+                moved = self.subtree_filter(old_path) if old_path else models.Q(pk=self.pk)
+                Category.all_objects.filter(moved).update(
+                    path=Concat(models.Value(self.path), Substr('path', len(old_path) + 1))
+                )
     
 
+class Tag(models.Model):
+    """Course attribute for faceted filtering, written as ``facet:value`` (e.g. ``level:beginner``)"""
+    FACET_CHOICES = (
+        ('topic', 'Topic'),
+        ('level', 'Level'),
+        ('language', 'Language'),
+    )
+    FACETS = [facet for facet, _ in FACET_CHOICES]
+
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=50)
+
+    objects = TagManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='tag_facet_value_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}:{self.value}"
+
+
 class Course(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     category = models.ForeignKey(Category, related_name='courses', on_delete=models.CASCADE)
     instructor = models.ForeignKey('accounts.User', related_name='courses', on_delete=models.CASCADE)
+    capacity = models.PositiveIntegerField(null=True, blank=True)  # None means unlimited seats
+    ends_at = models.DateTimeField(null=True, blank=True, db_index=True)  # enrollments are archived after this
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    is_deleted = models.BooleanField(default=False, db_index=True)  # hidden while DeletionJob runs
+    tags = models.ManyToManyField(Tag, through='CourseTag', related_name='courses', blank=True)
+    # Live enrollments, kept in step by enroll/unenroll so catalog filters and sorts can use an index.
+    # Any other Enrollment write (admin, scripts, bulk jobs) must call refresh_enrollment_counts().
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+    # SHA-256 of the latest cover upload, and of the one whose renditions are ready (see lms.covers)
+    cover_original = models.CharField(max_length=64, blank=True, default='', editable=False)
+    cover_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+
+    objects = CourseManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        # One index per catalog sort, alone and behind each equality filter (see lms.catalog)
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='course_newest_idx'),
+            models.Index(fields=['title', 'id'], name='course_title_idx'),
+            models.Index(fields=['enrollment_count', 'id'], name='course_popular_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='course_cat_newest_idx'),
+            models.Index(fields=['category', 'title', 'id'], name='course_cat_title_idx'),
+            models.Index(fields=['category', 'enrollment_count', 'id'], name='course_cat_popular_idx'),
+            models.Index(fields=['instructor', 'created_at', 'id'], name='course_inst_newest_idx'),
+            models.Index(fields=['instructor', 'title', 'id'], name='course_inst_title_idx'),
+            models.Index(fields=['instructor', 'enrollment_count', 'id'], name='course_inst_popular_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def refresh_enrollment_counts(cls, course_ids=None):
+        """Recount enrollment_count after bulk changes that bypass enroll/unenroll"""
+        courses = cls.all_objects.all() if course_ids is None else cls.all_objects.filter(pk__in=course_ids)
+        return courses.update(enrollment_count=Coalesce(models.Subquery(
+            Enrollment.objects.filter(course=models.OuterRef('pk')).order_by().values('course').annotate(
+                count=models.Count('pk')
+            ).values('count')
+        ), 0))
+
+
+class CourseTag(models.Model):
+    # The composite (tag, course) index serves both filtering and facet counts,
+    # and the unique (course, tag) one lookups by course, so no per-column indexes
+    course = models.ForeignKey(Course, related_name='course_tags', on_delete=models.CASCADE, db_index=False)
+    tag = models.ForeignKey(Tag, related_name='course_tags', on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tag', 'course'], name='course_tag_tag_course_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'tag'], name='course_tag_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} {self.tag}"
     
 class Enrollment(models.Model):
     student = models.ForeignKey('accounts.User', related_name='enrollments', on_delete=models.CASCADE)
     course = models.ForeignKey(Course, related_name='enrollments', on_delete=models.CASCADE)
     enrolled_at = models.DateTimeField(auto_now_add=True)
 
+    objects = EnrollmentManager()
+
     class Meta:
         unique_together = ('student', 'course')
 
     def __str__(self):
-        return f"{self.student.email} enrolled in {self.course.title}"
\ No newline at end of file
+        return f"{self.student.email} enrolled in {self.course.title}"
+
+
+class ArchivedEnrollment(models.Model):
+    """
+    Enrollment moved out of the hot table by lms.archive. Rows keep their
+    original Enrollment id and are partitioned logically by enrollment year.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey('accounts.User', related_name='archived_enrollments', on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, related_name='archived_enrollments', on_delete=models.CASCADE)
+    enrolled_at = models.DateTimeField()
+    year = models.PositiveSmallIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['year', 'course'], name='archived_enr_year_course_idx'),
+            models.Index(fields=['student', 'year'], name='archived_enr_student_year_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.email} enrolled in {self.course.title} ({self.year}, archived)"
+
+
+class EnrollmentPeriod(models.Model):
+    """
+    One spell of a student being enrolled in a course, kept after they
+    unenroll so churn stays visible. The first period of a pair is the
+    enrollment, later ones are re-enrollments and ended_at marks the
+    unenrollment. Enrollment itself only holds current enrollments.
+    """
+    student = models.ForeignKey('accounts.User', related_name='enrollment_periods', on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, related_name='enrollment_periods', on_delete=models.CASCADE)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)  # None while still enrolled
+    reenrolled = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'course', 'started_at'], name='enr_period_pair_idx'),
+            # Partial: only open periods, so active lookups stay small as history grows
+            models.Index(
+                fields=['course'], condition=models.Q(ended_at__isnull=True), name='enr_period_active_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'course'], condition=models.Q(ended_at__isnull=True),
+                name='enr_period_one_open',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.student.email} in {self.course.title} from {self.started_at:%Y-%m-%d}"
+
+
+class Module(models.Model):
+    """Ordered section of a course"""
+    course = models.ForeignKey(Course, related_name='modules', on_delete=models.CASCADE, db_index=False)
+    title = models.CharField(max_length=200)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['course', 'position', 'id'], name='module_course_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.course.title}: {self.title}"
+
+
+class Lesson(models.Model):
+    """Ordered item of a module; duration_seconds is the length of its video, if any"""
+    module = models.ForeignKey(Module, related_name='lessons', on_delete=models.CASCADE, db_index=False)
+    title = models.CharField(max_length=200)
+    content = models.TextField(blank=True)
+    video_url = models.URLField(blank=True)
+    duration_seconds = models.PositiveIntegerField(default=0)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['module', 'position', 'id'], name='lesson_module_order_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class LessonProgress(models.Model):
+    """
+    Where a student is in a lesson. Written in batches by lms.progress, so
+    updated_at is the time of the last ping, not of the flush.
+    """
+    student = models.ForeignKey('accounts.User', related_name='lesson_progress', on_delete=models.CASCADE,
+                                db_index=False)
+    lesson = models.ForeignKey(Lesson, related_name='progress', on_delete=models.CASCADE)
+    position_seconds = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Upsert target, and serves lookups by student
+            models.UniqueConstraint(fields=['student', 'lesson'], name='lesson_progress_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} at {self.position_seconds}s of {self.lesson_id}"
+
+
+class CourseMaterial(models.Model):
+    """
+    File attached to a course (video, PDF, ...). The bytes live under
+    MATERIALS_DIR at ``storage_name`` and are written by lms.materials.
+    """
+    course = models.ForeignKey(Course, related_name='materials', on_delete=models.CASCADE)
+    title = models.CharField(max_length=200)
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    storage_name = models.CharField(max_length=255, unique=True, editable=False)
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name='uploaded_materials', null=True, blank=True, on_delete=models.SET_NULL
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
+
+
+class MaterialUpload(models.Model):
+    """
+    Resumable upload in progress. ``received`` is how many bytes of the
+    partial file are on disk; the client sends the rest in chunks and the
+    upload becomes a CourseMaterial once all ``size`` bytes have arrived.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    course = models.ForeignKey(Course, related_name='material_uploads', on_delete=models.CASCADE)
+    title = models.CharField(max_length=200)
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name='material_uploads', on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # stale uploads are purged by age
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received}/{self.size})"
+
+
+class Quiz(models.Model):
+    """Assessment attached to a course, graded by lms.grading"""
+    course = models.ForeignKey(Course, related_name='quizzes', on_delete=models.CASCADE)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    weight = models.FloatField(default=1)  # share of the course total in the gradebook
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
+
+
+class Question(models.Model):
+    """
+    Multiple-choice question. ``correct`` is a bitmask over ``options``
+    (bit i set when option i is right), the same encoding as a student's
+    QuizAnswer.selected, so keys and answers grade as integer arrays.
+    With ``partial_credit`` a partly right answer earns a share of ``points``.
+    """
+    MAX_OPTIONS = 16
+
+    quiz = models.ForeignKey(Quiz, related_name='questions', on_delete=models.CASCADE, db_index=False)
+    text = models.TextField()
+    options = models.JSONField(default=list)
+    correct = models.PositiveIntegerField()
+    points = models.FloatField(default=1)
+    partial_credit = models.BooleanField(default=False)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['quiz', 'position', 'id'], name='question_quiz_order_idx'),
+        ]
+
+    def __str__(self):
+        return self.text[:50]
+
+
+class QuizSubmission(models.Model):
+    """A student's one attempt at a quiz; score is kept up to date with the answer key"""
+    quiz = models.ForeignKey(Quiz, related_name='submissions', on_delete=models.CASCADE, db_index=False)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='quiz_submissions', on_delete=models.CASCADE)
+    score = models.FloatField(default=0)
+    max_score = models.FloatField(default=0)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    graded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Upsert target when regrading, and serves lookups by quiz
+            models.UniqueConstraint(fields=['quiz', 'student'], name='quiz_submission_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} on {self.quiz_id}: {self.score}/{self.max_score}"
+
+
+class QuizAnswer(models.Model):
+    """Options a student picked for one question, as a bitmask like Question.correct"""
+    submission = models.ForeignKey(QuizSubmission, related_name='answers', on_delete=models.CASCADE,
+                                   db_index=False)
+    question = models.ForeignKey(Question, related_name='answers', on_delete=models.CASCADE)
+    selected = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['submission', 'question'], name='quiz_answer_uniq'),
+        ]
+
+
+class Announcement(models.Model):
+    """
+    Message from a course's instructor to its enrolled students. Emails go
+    out in the background (lms.announcements); ``cursor`` is the last
+    student id of the roster handled so far, so an interrupted send resumes.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    course = models.ForeignKey(Course, related_name='announcements', on_delete=models.CASCADE)
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name='announcements', null=True, blank=True, on_delete=models.SET_NULL
+    )
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    recipients = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    cursor = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+class AnnouncementDelivery(models.Model):
+    """Email of an announcement to one student"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    announcement = models.ForeignKey(Announcement, related_name='deliveries', on_delete=models.CASCADE,
+                                     db_index=False)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='announcement_deliveries',
+                                on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.CharField(max_length=255, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['announcement', 'student'], name='announcement_delivery_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['announcement', 'status', 'id'], name='delivery_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.announcement_id} to {self.student_id}: {self.status}"
+
+
+class DeletionJob(models.Model):
+    """
+    Tracks a background deletion. The target is hidden as soon as the job is
+    created and its dependents are removed in bounded batches by lms.deletion.
+    """
+    TARGET_CHOICES = (
+        ('category', 'Category'),
+        ('course', 'Course'),
+        ('user', 'User'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    target_type = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    target_id = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name='deletion_jobs', null=True, blank=True, on_delete=models.SET_NULL
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100.0
+        return round(100 * self.deleted / self.total, 1) if self.total else 0.0
+
+    def __str__(self):
+        return f"Delete {self.target_type} #{self.target_id} ({self.status})"
+
+
+class OutboxEvent(models.Model):
+    """
+    Domain event written in the same transaction as the change it describes.
+    Consumers in lms.outbox read events in id order from their checkpoint.
+    """
+    event_type = models.CharField(max_length=50, db_index=True)
+    aggregate_id = models.PositiveBigIntegerField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.event_type}"
+
+
+class ConsumerCheckpoint(models.Model):
+    """Id of the last OutboxEvent a consumer has processed"""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class StatCounter(models.Model):
+    """Counter projection maintained incrementally from outbox events"""
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
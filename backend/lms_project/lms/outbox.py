@@ -0,0 +1,90 @@
+"""
+Transactional outbox for domain events.
+
+Views call record_event() inside the transaction that performs the write,
+so an event exists if and only if the change committed. Consumers read the
+outbox in id order and store a checkpoint in the same transaction as their
+own writes, which makes database projections exactly-once.
+
+Consumers never skip an event only because SQLite serializes writers: ids
+become visible in commit order. On a backend with concurrent writers a
+transaction can commit a lower id after a consumer has moved past it, and
+that event would be skipped for good; such backends need the consumer to
+stay behind the oldest running transaction (e.g. only read events older
+than the longest transaction allowed) before this can be used there.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .models import ConsumerCheckpoint, OutboxEvent
+from lms_project.tenancy import tenant_db
+
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 500)
+
+_consumers = {}
+
+
+def record_event(event_type, aggregate_id=None, **payload):
+    """Append an event; must be called inside the transaction of the write"""
+    return OutboxEvent.objects.create(event_type=event_type, aggregate_id=aggregate_id, payload=payload)
+
+
+class Consumer:
+    """
+    Base class for outbox consumers. Subclasses set ``name`` (the checkpoint
+    key), optionally restrict ``event_types`` and implement handle(), which
+    receives a whole batch of events at once.
+    """
+    name = None
+    event_types = None
+
+    def handle(self, events):
+        raise NotImplementedError
+
+    def reset(self):
+        """Rebuild the projection from the base tables; called before rewinding the checkpoint"""
+
+
+def register(consumer_class):
+    """Class decorator adding a consumer to the registry used by consume_events"""
+    _consumers[consumer_class.name] = consumer_class()
+    return consumer_class
+
+
+def get_consumers():
+    return dict(_consumers)
+
+
+def consume_batch(consumer, batch_size=BATCH_SIZE):
+    """Deliver the next batch to a consumer. Returns the number of events handled."""
+    with transaction.atomic(using=tenant_db()):
+        checkpoint, _ = ConsumerCheckpoint.objects.select_for_update().get_or_create(name=consumer.name)
+        events = OutboxEvent.objects.filter(pk__gt=checkpoint.position).order_by('pk')
+        if consumer.event_types is not None:
+            events = events.filter(event_type__in=consumer.event_types)
+        events = list(events[:batch_size])
+        if not events:
+            return 0
+
+        consumer.handle(events)
+        checkpoint.position = events[-1].pk
+        checkpoint.save(update_fields=['position', 'updated_at'])
+    return len(events)
+
+
+def consume(consumer, batch_size=BATCH_SIZE):
+    """Drain everything currently in the outbox for a consumer"""
+    total = 0
+    while True:
+        handled = consume_batch(consumer, batch_size)
+        if not handled:
+            return total
+        total += handled
+
+
+def reset_consumer(consumer):
+    """Rebuild a projection from scratch and move its checkpoint to the outbox head"""
+    with transaction.atomic(using=tenant_db()):
+        head = OutboxEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        consumer.reset()
+        ConsumerCheckpoint.objects.update_or_create(name=consumer.name, defaults={'position': head})
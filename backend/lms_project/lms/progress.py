@@ -0,0 +1,179 @@
+"""
+Write-behind buffer for lesson progress pings.
+
+Video players report the playback position every few seconds. Each ping
+only overwrites the pending entry for its (student, lesson) pair in
+process memory; flush() then writes all pending pairs with at most two
+batched upserts (INSERT ... ON CONFLICT DO UPDATE), however many pings
+were coalesced. ``completed`` is sticky: once a lesson is completed a
+later ping with completed=false only moves the position.
+
+A flush happens when MAX_PENDING pairs are waiting, when a ping finds the
+oldest pending entry older than FLUSH_INTERVAL seconds, from a background
+thread every FLUSH_INTERVAL seconds once start() has been called (the
+gunicorn hooks do this per worker) and at interpreter exit. A worker that
+dies without exiting cleanly therefore loses at most FLUSH_INTERVAL
+seconds of pings, and a reader in the same process sees pending entries
+through pending_for(). Entries are kept per tenant database and each
+tenant's entries are written to its own database.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from accounts.models import User
+from .models import Lesson, LessonProgress
+from lms_project.tenancy import tenant_db
+
+logger = logging.getLogger(__name__)
+
+
+def buffer_settings():
+    options = getattr(settings, 'PROGRESS_BUFFER', {})
+    return options.get('FLUSH_INTERVAL', 5.0), options.get('MAX_PENDING', 1000)
+
+
+class ProgressBuffer:
+    """Pending progress per (database, student id, lesson id), newest ping wins"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending = {}
+        self.oldest = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def record(self, student_id, lesson_id, position_seconds, completed=False, at=None):
+        """Buffer one ping, then flush if the buffer is full or too old"""
+        interval, max_pending = buffer_settings()
+        now = time.monotonic()
+        key = (tenant_db(), student_id, lesson_id)
+        with self.lock:
+            previous = self.pending.get(key)
+            completed = completed or (previous is not None and previous[1])
+            self.pending[key] = (position_seconds, completed, at or timezone.now())
+            if self.oldest is None:
+                self.oldest = now
+            due = len(self.pending) >= max_pending or now - self.oldest >= interval
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                # The ping is safe in the buffer; the next flush retries it
+                logger.exception("Flushing lesson progress failed")
+
+    def pending_for(self, student_id):
+        """{lesson id: (position, completed, at)} not yet written for a student of the current tenant"""
+        alias = tenant_db()
+        with self.lock:
+            return {
+                lesson: entry for (db, student, lesson), entry in self.pending.items()
+                if student == student_id and db == alias
+            }
+
+    def flush(self):
+        """Write everything pending; returns the number of pairs written"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending, self.oldest = self.pending, {}, None
+            if not batch:
+                return 0
+            databases = defaultdict(dict)
+            for (alias, student_id, lesson_id), entry in batch.items():
+                databases[alias][(student_id, lesson_id)] = entry
+            written, error = 0, None
+            for alias, entries in databases.items():
+                try:
+                    written += write_progress(entries, using=alias)
+                except IntegrityError:
+                    # A row that can never be written (e.g. its student was deleted meanwhile);
+                    # retrying it would block every later flush of this database
+                    logger.exception("Dropping %d lesson progress entries for %s", len(entries), alias)
+                except Exception as e:
+                    # Put this database's entries back under any newer pings, keeping completion
+                    self._requeue(alias, entries)
+                    error = e
+            if error is not None:
+                raise error
+            return written
+
+    def _requeue(self, alias, entries):
+        with self.lock:
+            for (student_id, lesson_id), (position, completed, at) in entries.items():
+                key = (alias, student_id, lesson_id)
+                newer = self.pending.get(key)
+                self.pending[key] = (newer[0], newer[1] or completed, newer[2]) if newer else (
+                    position, completed, at
+                )
+            self.oldest = self.oldest or time.monotonic()
+
+    def clear(self):
+        with self.lock:
+            self.pending, self.oldest = {}, None
+
+    def start(self):
+        """Flush from a daemon thread every FLUSH_INTERVAL seconds, and at exit"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name='progress-flusher', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.flush()
+
+    def _run(self):
+        interval, _ = buffer_settings()
+        while not self.stopped.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing lesson progress failed")
+            finally:
+                # This thread's connections would otherwise outlive CONN_MAX_AGE checks
+                connections.close_all()
+
+
+def write_progress(batch, using):
+    """
+    Upsert {(student id, lesson id): (position, completed, at)}, skipping
+    students and lessons deleted meanwhile; returns the number of rows written.
+    """
+    lessons = set(
+        Lesson.objects.using(using).filter(pk__in={lesson for _, lesson in batch}).values_list('pk', flat=True)
+    )
+    students = set(
+        User.objects.using(using).filter(pk__in={student for student, _ in batch}).values_list('pk', flat=True)
+    )
+    rows = {True: [], False: []}
+    for (student_id, lesson_id), (position, completed, at) in batch.items():
+        if lesson_id not in lessons or student_id not in students:
+            continue
+        rows[completed].append(LessonProgress(
+            student_id=student_id, lesson_id=lesson_id, position_seconds=position,
+            completed=completed, updated_at=at,
+        ))
+    with transaction.atomic(using=using):
+        for completed, objs in rows.items():
+            if objs:
+                # Incomplete pings leave ``completed`` alone so it never goes back to false
+                LessonProgress.objects.using(using).bulk_create(
+                    objs, update_conflicts=True, unique_fields=['student', 'lesson'],
+                    update_fields=['position_seconds', 'updated_at'] + (['completed'] if completed else []),
+                )
+    return len(rows[True]) + len(rows[False])
+
+
+progress_buffer = ProgressBuffer()
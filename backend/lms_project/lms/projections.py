@@ -0,0 +1,96 @@
+"""
+Projections kept up to date from the outbox instead of rescanning base tables.
+"""
+from collections import Counter
+
+from django.db.models import Count, F
+
+from accounts.models import User
+from .models import ArchivedEnrollment, Category, Course, DeletionJob, Enrollment, StatCounter
+from .outbox import Consumer, register
+
+
+def get_counters(*keys):
+    """Current counter values, missing keys read as 0"""
+    values = dict(StatCounter.objects.filter(key__in=keys).values_list('key', 'value'))
+    return {key: values.get(key, 0) for key in keys}
+
+
+def counter_deltas(events):
+    """Fold a batch of outbox events into one delta per counter key"""
+    deltas = Counter()
+    for event in events:
+        payload = event.payload
+        if event.event_type == 'user.created':
+            deltas['users'] += 1
+            deltas[f"users:{payload.get('role')}"] += 1
+        elif event.event_type == 'user.deleted':
+            deltas['users'] -= 1
+            deltas[f"users:{payload.get('role')}"] -= 1
+            deltas['courses'] -= payload.get('courses', 0)
+        elif event.event_type == 'category.created':
+            deltas['categories'] += 1
+        elif event.event_type == 'category.deleted':
+            deltas['categories'] -= payload.get('categories', 1)
+            deltas['courses'] -= payload.get('courses', 0)
+        elif event.event_type == 'course.created':
+            deltas['courses'] += 1
+        elif event.event_type == 'course.deleted':
+            deltas['courses'] -= 1
+        elif event.event_type == 'enrollment.created':
+            deltas['enrollments'] += 1
+        elif event.event_type == 'enrollment.deleted':
+            deltas['enrollments'] -= 1
+        elif event.event_type == 'enrollment.purged':
+            deltas['enrollments'] -= payload.get('count', 0)
+        elif event.event_type == 'enrollment.archived':
+            deltas['enrollments'] -= payload.get('count', 0)
+            deltas['archived_enrollments'] += payload.get('count', 0)
+        elif event.event_type == 'archived_enrollment.purged':
+            deltas['archived_enrollments'] -= payload.get('count', 0)
+    return deltas
+
+
+def current_counters():
+    """
+    Counter values computed from the base tables. Users queued for deletion,
+    and the courses they teach, already left the counters with user.deleted,
+    the way hidden categories and courses are left out by their managers.
+    """
+    deleting = DeletionJob.objects.filter(target_type='user').exclude(status='done').values('target_id')
+    users = User.objects.exclude(pk__in=deleting)
+    counters = {
+        'users': users.count(),
+        'categories': Category.objects.count(),
+        'courses': Course.objects.exclude(instructor_id__in=deleting).count(),
+        'enrollments': Enrollment.objects.count(),
+        'archived_enrollments': ArchivedEnrollment.objects.count(),
+    }
+    for row in users.values('role').annotate(count=Count('id')):
+        counters[f"users:{row['role']}"] = row['count']
+    return counters
+
+
+@register
+class StatsConsumer(Consumer):
+    """Site-wide totals used by dashboards (users, courses, categories, enrollments)"""
+    name = 'stats'
+    event_types = [
+        'user.created', 'user.deleted',
+        'category.created', 'category.deleted',
+        'course.created', 'course.deleted',
+        'enrollment.created', 'enrollment.deleted', 'enrollment.purged', 'enrollment.archived',
+        'archived_enrollment.purged',
+    ]
+
+    def handle(self, events):
+        deltas = counter_deltas(events)
+        for key, delta in deltas.items():
+            if delta:
+                StatCounter.objects.get_or_create(key=key)
+                StatCounter.objects.filter(key=key).update(value=F('value') + delta)
+
+    def reset(self):
+        counters = current_counters()
+        StatCounter.objects.all().delete()
+        StatCounter.objects.bulk_create([StatCounter(key=key, value=value) for key, value in counters.items()])
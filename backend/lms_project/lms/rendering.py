@@ -0,0 +1,36 @@
+"""
+Cover renditions. Pool workers are spawned fresh and unpickle ``render``
+by importing this module, so it must not import Django models or anything
+else that needs the app registry.
+"""
+import os
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+COVER_SIZES = {
+    'thumb': (160, 90),
+    'card': (480, 270),
+    'hero': (1280, 720),
+}
+COVER_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+QUALITY = 82
+
+
+def render(source, target_dir):
+    """Write every rendition of ``source`` into ``target_dir``"""
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    largest = max(COVER_SIZES.values())
+    with Image.open(source) as image:
+        # Let JPEG decode at a reduced scale when the original is much larger
+        image.draft('RGB', (largest[0] * 2, largest[1] * 2))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for size, box in COVER_SIZES.items():
+            fitted = ImageOps.fit(image, box, Image.Resampling.LANCZOS)
+            for ext, image_format in COVER_FORMATS.items():
+                # Written aside and renamed, so a rendition is either complete or absent
+                tmp = target_dir / f".{size}.{ext}.{os.getpid()}"
+                fitted.save(tmp, image_format, quality=QUALITY)
+                os.replace(tmp, target_dir / f"{size}.{ext}")
+    return str(target_dir)
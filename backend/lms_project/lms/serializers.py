@@ -1,15 +1,29 @@
 from rest_framework import serializers
-from .models import Category, Course, Enrollment
+from .models import (
+    Announcement, AnnouncementDelivery, ArchivedEnrollment, Category, Course, CourseMaterial, DeletionJob, Enrollment,
+    Lesson, MaterialUpload, Module, Question, Quiz, QuizSubmission, Tag,
+)
 from accounts.models import User
+from .covers import cover_urls
+from .grading import mask_options, options_mask
+from .materials import max_material_size
 
 class CategorySerializer(serializers.ModelSerializer):
     courses_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'courses_count']
+        fields = ['id', 'name', 'description', 'parent', 'courses_count']
+    
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category cannot be moved under itself or its descendants.")
+        return value
     
     def get_courses_count(self, obj):
+        # Batch views pre-compute the count to avoid one query per category
+        if hasattr(obj, 'num_courses'):
+            return obj.num_courses
         return obj.courses.count()
 
 
@@ -19,52 +33,102 @@ class InstructorBasicSerializer(serializers.ModelSerializer):
         fields = ['id', 'full_name', 'email']
 
 
+class TagsField(serializers.Field):
+    """Course tags as a list of "facet:value" strings"""
+    
+    def to_representation(self, value):
+        # List views prefetch tags, so .all() does not query per course
+        return sorted(str(tag) for tag in value.all())
+    
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError('Expected a list of "facet:value" strings.')
+        pairs = []
+        for item in data:
+            facet, _, value = str(item).partition(':')
+            facet, value = facet.strip().lower(), value.strip().lower()
+            if facet not in Tag.FACETS or not value or len(value) > 50:
+                raise serializers.ValidationError(
+                    f'Invalid tag "{item}". Use "facet:value" with a facet from {", ".join(Tag.FACETS)}.'
+                )
+            pairs.append((facet, value))
+        return list(dict.fromkeys(pairs))
+
+
+class CoverField(serializers.Field):
+    """URLs of every cover rendition by size and format, or None while there is none ready"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(source='cover_hash', read_only=True, **kwargs)
+    
+    def to_representation(self, value):
+        return cover_urls(value)
+
+
 class CourseListSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     instructor_name = serializers.CharField(source='instructor.full_name', read_only=True)
-    enrollments_count = serializers.SerializerMethodField()
+    enrollments_count = serializers.IntegerField(source='enrollment_count', read_only=True)
+    tags = TagsField(read_only=True)
+    cover = CoverField()
     
     class Meta:
         model = Course
         fields = ['id', 'title', 'description', 'category', 'category_name', 
-                  'instructor', 'instructor_name', 'enrollments_count', 
+                  'instructor', 'instructor_name', 'capacity', 'ends_at', 'tags', 'cover', 'enrollments_count', 
                   'created_at', 'updated_at']
-    
-    def get_enrollments_count(self, obj):
-        return obj.enrollments.count()
 
 
 class CourseDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     instructor = InstructorBasicSerializer(read_only=True)
-    enrollments_count = serializers.SerializerMethodField()
+    enrollments_count = serializers.IntegerField(source='enrollment_count', read_only=True)
     is_enrolled = serializers.SerializerMethodField()
+    tags = TagsField(read_only=True)
+    cover = CoverField()
     
     class Meta:
         model = Course
         fields = ['id', 'title', 'description', 'category', 'instructor', 
-                  'enrollments_count', 'is_enrolled', 'created_at', 'updated_at']
-    
-    def get_enrollments_count(self, obj):
-        return obj.enrollments.count()
+                  'capacity', 'ends_at', 'tags', 'cover', 'enrollments_count', 'is_enrolled', 'created_at', 'updated_at']
     
     def get_is_enrolled(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated and request.user.role == 'student':
+            # Batch views pass the student's enrolled course ids up front
+            if 'enrolled_course_ids' in self.context:
+                return obj.id in self.context['enrolled_course_ids']
             return obj.enrollments.filter(student=request.user).exists()
         return False
 
 
 class CourseCreateUpdateSerializer(serializers.ModelSerializer):
+    tags = TagsField(required=False)
+    
     class Meta:
         model = Course
-        fields = ['id', 'title', 'description', 'category', 'instructor', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'description', 'category', 'instructor', 'capacity', 'ends_at', 'tags',
+                  'created_at', 'updated_at']
         read_only_fields = ['instructor', 'created_at', 'updated_at']
     
     def validate_category(self, value):
         if not Category.objects.filter(id=value.id).exists():
             raise serializers.ValidationError("Invalid category")
         return value
+    
+    def create(self, validated_data):
+        pairs = validated_data.pop('tags', None)
+        course = super().create(validated_data)
+        if pairs is not None:
+            course.tags.set(Tag.objects.for_pairs(pairs))
+        return course
+    
+    def update(self, instance, validated_data):
+        pairs = validated_data.pop('tags', None)
+        course = super().update(instance, validated_data)
+        if pairs is not None:
+            course.tags.set(Tag.objects.for_pairs(pairs))
+        return course
 
 
 class EnrollmentSerializer(serializers.ModelSerializer):
@@ -83,4 +147,160 @@ class StudentEnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ['id', 'course', 'enrolled_at']
-        
\ No newline at end of file
+
+
+class ArchivedEnrollmentSerializer(serializers.ModelSerializer):
+    student_name = serializers.CharField(source='student.full_name', read_only=True)
+    course_title = serializers.CharField(source='course.title', read_only=True)
+    
+    class Meta:
+        model = ArchivedEnrollment
+        fields = ['id', 'student', 'student_name', 'course', 'course_title', 'enrolled_at', 'year', 'archived_at']
+
+
+class StudentArchivedEnrollmentSerializer(serializers.ModelSerializer):
+    course = CourseListSerializer(read_only=True)
+    
+    class Meta:
+        model = ArchivedEnrollment
+        fields = ['id', 'course', 'enrolled_at', 'year', 'archived_at']
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'target_type', 'target_id', 'status', 'total', 'deleted',
+                  'progress', 'error', 'created_at', 'updated_at', 'finished_at']
+
+
+class LessonOutlineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'duration_seconds', 'position']
+
+
+class ModuleSerializer(serializers.ModelSerializer):
+    lessons = LessonOutlineSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Module
+        fields = ['id', 'course', 'title', 'position', 'lessons']
+        read_only_fields = ['course']
+
+
+class LessonSerializer(serializers.ModelSerializer):
+    course = serializers.IntegerField(source='module.course_id', read_only=True)
+    
+    class Meta:
+        model = Lesson
+        fields = ['id', 'module', 'course', 'title', 'content', 'video_url', 'duration_seconds', 'position']
+        read_only_fields = ['module']
+
+
+class ProgressPingSerializer(serializers.Serializer):
+    position_seconds = serializers.IntegerField(min_value=0)
+    completed = serializers.BooleanField(default=False)
+
+
+class CourseMaterialSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CourseMaterial
+        fields = ['id', 'course', 'title', 'file_name', 'content_type', 'size', 'uploaded_by', 'created_at']
+
+
+class MaterialUploadSerializer(serializers.ModelSerializer):
+    content_type = serializers.CharField(max_length=100, default='application/octet-stream')
+    
+    class Meta:
+        model = MaterialUpload
+        fields = ['id', 'course', 'title', 'file_name', 'content_type', 'size', 'received', 'created_at']
+        read_only_fields = ['course', 'received']
+    
+    def validate_size(self, value):
+        if not 1 <= value <= max_material_size():
+            raise serializers.ValidationError(f"Files must be between 1 byte and {max_material_size()} bytes.")
+        return value
+
+
+class OptionIndicesField(serializers.ListField):
+    """Indices of options, stored as a bitmask (see Question.correct)"""
+    child = serializers.IntegerField(min_value=0, max_value=Question.MAX_OPTIONS - 1)
+    
+    def to_representation(self, mask):
+        return mask_options(mask)
+    
+    def run_validation(self, data=serializers.empty):
+        # Converted after the list validators (min_length, ...) have run
+        return options_mask(super().run_validation(data))
+
+
+class QuizSerializer(serializers.ModelSerializer):
+    weight = serializers.FloatField(min_value=0, default=1)
+    
+    class Meta:
+        model = Quiz
+        fields = ['id', 'course', 'title', 'description', 'weight', 'created_at']
+        read_only_fields = ['course']
+
+
+class QuestionSerializer(serializers.ModelSerializer):
+    """A question with its answer key, for the course owner and admins"""
+    options = serializers.ListField(
+        child=serializers.CharField(max_length=500), min_length=2, max_length=Question.MAX_OPTIONS
+    )
+    correct = OptionIndicesField(min_length=1)
+    points = serializers.FloatField(min_value=0, default=1)
+    
+    class Meta:
+        model = Question
+        fields = ['id', 'quiz', 'text', 'options', 'correct', 'points', 'partial_credit', 'position']
+        read_only_fields = ['quiz']
+    
+    def validate(self, attrs):
+        options = attrs.get('options', self.instance.options if self.instance else [])
+        correct = attrs.get('correct', self.instance.correct if self.instance else 0)
+        if correct >> len(options):
+            raise serializers.ValidationError({'correct': "Every correct answer must be one of the options."})
+        return attrs
+
+
+class QuestionPublicSerializer(serializers.ModelSerializer):
+    """A question as students see it, without the answer key"""
+    class Meta:
+        model = Question
+        fields = ['id', 'quiz', 'text', 'options', 'points', 'partial_credit', 'position']
+
+
+class QuizAnswersSerializer(serializers.Serializer):
+    """{"answers": {"<question id>": [option index, ...]}}; questions left out count as unanswered"""
+    answers = serializers.DictField(child=OptionIndicesField(allow_empty=True))
+
+
+class QuizSubmissionSerializer(serializers.ModelSerializer):
+    student_email = serializers.EmailField(source='student.email', read_only=True)
+    student_name = serializers.CharField(source='student.full_name', read_only=True)
+    
+    class Meta:
+        model = QuizSubmission
+        fields = ['id', 'quiz', 'student', 'student_email', 'student_name', 'score', 'max_score',
+                  'submitted_at', 'graded_at']
+
+
+class AnnouncementSerializer(serializers.ModelSerializer):
+    author_name = serializers.CharField(source='author.full_name', read_only=True, default=None)
+    
+    class Meta:
+        model = Announcement
+        fields = ['id', 'course', 'author', 'author_name', 'subject', 'body', 'status', 'recipients', 'sent',
+                  'failed', 'created_at', 'finished_at']
+        read_only_fields = ['course', 'author', 'status', 'recipients', 'sent', 'failed', 'finished_at']
+
+
+class AnnouncementDeliverySerializer(serializers.ModelSerializer):
+    student_email = serializers.EmailField(source='student.email', read_only=True)
+    
+    class Meta:
+        model = AnnouncementDelivery
+        fields = ['id', 'student', 'student_email', 'status', 'error', 'sent_at']
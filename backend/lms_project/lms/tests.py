@@ -1,3 +1,1209 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import smtplib
+import threading
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from .catalog import explain_catalog
+from . import covers, deletion, grading
+from .announcements import claim, run_announcement
+from .archive import archivable_enrollments, archive_enrollments
+from .deletion import _plan, run_deletion_job, schedule_deletion
+from .grading import AnswerKey, regrade_quiz
+from .history import cohort_retention
+from .materials import BLOCK_SIZE, write_chunk
+from .models import (
+    Announcement, AnnouncementDelivery, Category, ConsumerCheckpoint, Course, CourseMaterial, DeletionJob, Enrollment,
+    EnrollmentPeriod, Lesson, LessonProgress, Module, Question, Quiz, QuizAnswer, QuizSubmission,
+)
+from .outbox import consume, consume_batch, record_event, reset_consumer
+from .progress import progress_buffer
+from .projections import StatsConsumer, current_counters, get_counters
+
+
+class EnrollmentTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.student = User.objects.create_user(
+            email='student@example.com', password='pass12345', full_name='Student', role='student'
+        )
+        self.category = Category.objects.create(name='Programming')
+        self.course = Course.objects.create(
+            title='Python', description='Intro', category=self.category, instructor=self.instructor, capacity=1
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_enroll_is_idempotent(self):
+        url = f'/lms/courses/{self.course.id}/enroll/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 1)
+
+    def test_enroll_respects_capacity(self):
+        other = User.objects.create_user(
+            email='other@example.com', password='pass12345', full_name='Other', role='student'
+        )
+        Enrollment.objects.create(student=other, course=self.course)
+        response = self.client.post(f'/lms/courses/{self.course.id}/enroll/')
+        self.assertEqual(response.status_code, 409)
+
+
+class ConcurrentEnrollmentTests(TransactionTestCase):
+    STUDENTS = 2000
+    CAPACITY = 500
+
+    def setUp(self):
+        instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        category = Category.objects.create(name='Programming')
+        self.course = Course.objects.create(
+            title='Popular', description='Opens today', category=category,
+            instructor=instructor, capacity=self.CAPACITY
+        )
+        User.objects.bulk_create([
+            User(email=f'student{i}@example.com', full_name=f'Student {i}', role='student')
+            for i in range(self.STUDENTS)
+        ])
+        self.students = list(User.objects.filter(role='student'))
+
+    def _enroll(self, student):
+        try:
+            # Every student tries twice to also exercise the conflict path
+            outcomes = [Enrollment.objects.enroll(student, self.course)[1] for _ in range(2)]
+        finally:
+            connection.close()
+        return outcomes
+
+    def test_parallel_enrollments_never_overbook(self):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(self._enroll, self.students))
+        elapsed = time.perf_counter() - started
+
+        first_attempts = [outcomes[0] for outcomes in results]
+        self.assertEqual(first_attempts.count(Enrollment.objects.ENROLLED), self.CAPACITY)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), self.CAPACITY)
+        self.assertNotIn(Enrollment.objects.ENROLLED, [outcomes[1] for outcomes in results])
+        # 4000 single-statement attempts should comfortably finish well under this bound
+        self.assertLess(elapsed, 60)
+
+
+class EnrollmentHistoryTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.student = User.objects.create_user(
+            email='student@example.com', password='pass12345', full_name='Student', role='student'
+        )
+        self.course = Course.objects.create(
+            title='Python', description='Intro', category=Category.objects.create(name='Programming'),
+            instructor=self.instructor
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_unenroll_and_reenroll_are_kept(self):
+        base = f'/lms/courses/{self.course.id}/'
+        self.assertEqual(self.client.post(base + 'enroll/').status_code, 201)
+        self.assertEqual(self.client.delete(base + 'unenroll/').status_code, 204)
+        self.assertEqual(self.client.post(base + 'enroll/').status_code, 201)
+
+        first, second = EnrollmentPeriod.objects.filter(student=self.student).order_by('pk')
+        self.assertIsNotNone(first.ended_at)
+        self.assertFalse(first.reenrolled)
+        self.assertIsNone(second.ended_at)
+        self.assertTrue(second.reenrolled)
+        self.assertEqual(Enrollment.objects.filter(student=self.student).count(), 1)
+
+    def test_cohort_retention_matrix(self):
+        start = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        week = timedelta(weeks=1)
+        others = User.objects.bulk_create([
+            User(email=f'student{i}@example.com', full_name=f'Student {i}', role='student') for i in range(3)
+        ])
+        EnrollmentPeriod.objects.bulk_create([
+            # Stays enrolled
+            EnrollmentPeriod(student=self.student, course=self.course, started_at=start),
+            # Leaves during week 1
+            EnrollmentPeriod(student=others[0], course=self.course, started_at=start, ended_at=start + week * 1.5),
+            # Leaves during week 0 and comes back in week 3
+            EnrollmentPeriod(student=others[1], course=self.course, started_at=start, ended_at=start + week / 2),
+            EnrollmentPeriod(
+                student=others[1], course=self.course, started_at=start + week * 2.5, reenrolled=True
+            ),
+            # February cohort, only two weeks old
+            EnrollmentPeriod(student=others[2], course=self.course, started_at=start + week * 4),
+        ])
+
+        matrix = cohort_retention(EnrollmentPeriod.objects.all(), weeks=4, now=start + week * 6.5)
+
+        self.assertEqual(matrix, [
+            {'month': '2026-01', 'size': 3, 'retention': [1.0, 0.6667, 0.3333, 0.6667, 0.6667]},
+            {'month': '2026-02', 'size': 1, 'retention': [1.0, 1.0, 1.0, None, None]},
+        ])
+
+    def test_archived_enrollments_leave_the_retention(self):
+        start = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        week = timedelta(weeks=1)
+        Course.all_objects.filter(pk=self.course.pk).update(ends_at=start + week * 1.5)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        EnrollmentPeriod.objects.create(student=self.student, course=self.course, started_at=start)
+
+        self.assertEqual(sum(archive_enrollments(archivable_enrollments(grace_days=0))), 1)
+        self.assertEqual(EnrollmentPeriod.objects.get().ended_at, start + week * 1.5)
+        matrix = cohort_retention(EnrollmentPeriod.objects.all(), weeks=4, now=start + week * 6.5)
+        self.assertEqual(matrix[0]['retention'], [1.0, 1.0, 0.0, 0.0, 0.0])
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='pass12345', full_name='Admin', role='admin'
+        )
+        self.programming = Category.objects.create(name='Programming')
+        self.python = Category.objects.create(name='Python', parent=self.programming)
+        self.web = Category.objects.create(name='Web', parent=self.python)
+        self.design = Category.objects.create(name='Design')
+        for category in (self.programming, self.python, self.web, self.web):
+            Course.objects.create(title=category.name, description='', category=category, instructor=self.admin)
+        self.client = APIClient()
+
+    def test_tree_counts_roll_up(self):
+        response = self.client.get('/lms/categories/tree/')
+        programming, design = response.data
+        self.assertEqual(design['subtree_courses_count'], 0)
+        self.assertEqual(programming['courses_count'], 1)
+        self.assertEqual(programming['subtree_courses_count'], 4)
+        web = programming['children'][0]['children'][0]
+        self.assertEqual((web['name'], web['subtree_courses_count']), ('Web', 2))
+
+    def test_subtree_courses(self):
+        response = self.client.get(f'/lms/categories/{self.python.pk}/courses/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_move_rewrites_descendant_paths(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.put(f'/lms/categories/{self.python.pk}/', {'parent': self.design.pk})
+        self.assertEqual(response.status_code, 200)
+        self.web.refresh_from_db()
+        self.assertTrue(self.web.path.startswith(self.design.path))
+        response = self.client.put(f'/lms/categories/{self.python.pk}/', {'parent': self.python.pk})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(f'/lms/categories/{self.design.pk}/', {'parent': self.web.pk})
+        self.assertEqual(response.status_code, 400)
+
+    def test_delete_hides_subtree(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.delete(f'/lms/categories/{self.python.pk}/').status_code, 202)
+        self.assertEqual(list(Category.objects.values_list('name', flat=True).order_by('name')), ['Design', 'Programming'])
+        self.assertEqual(Course.objects.count(), 1)
+
+
+class CourseTagTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.category = Category.objects.create(name='Programming')
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+        for title, tags in (
+            ('Python basics', ['topic:python', 'level:beginner', 'language:en']),
+            ('Django', ['topic:python', 'topic:web', 'level:advanced', 'language:en']),
+            ('React', ['topic:web', 'level:beginner', 'language:de']),
+        ):
+            response = self.client.post('/lms/courses/create/', {
+                'title': title, 'description': 'Intro', 'category': self.category.pk, 'tags': tags
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+    def test_filters_or_within_facet_and_across_facets(self):
+        response = self.client.get('/lms/courses/?topic=python,web&level=beginner')
+        self.assertEqual(sorted(course['title'] for course in response.data), ['Python basics', 'React'])
+
+    def test_facet_counts_cover_the_results(self):
+        response = self.client.get('/lms/courses/facets/?language=en')
+        self.assertEqual(response.data['selected'], {'language': ['en']})
+        self.assertEqual(response.data['facets']['topic'], [
+            {'value': 'python', 'count': 2}, {'value': 'web', 'count': 1},
+        ])
+        self.assertEqual(response.data['facets']['language'], [{'value': 'en', 'count': 2}])
+
+    def test_rejects_unknown_facet(self):
+        response = self.client.post('/lms/courses/create/', {
+            'title': 'Bad', 'description': 'Intro', 'category': self.category.pk, 'tags': ['colour:red']
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.other = User.objects.create_user(
+            email='other@example.com', password='pass12345', full_name='Other', role='instructor'
+        )
+        self.category = Category.objects.create(name='Programming')
+        self.courses = [
+            Course.objects.create(title=title, description='Intro', category=self.category, instructor=instructor)
+            for title, instructor in (('B', self.instructor), ('A', self.instructor), ('C', self.other))
+        ]
+        students = User.objects.bulk_create([
+            User(email=f'student{i}@example.com', full_name=f'Student {i}', role='student') for i in range(3)
+        ])
+        Enrollment.objects.bulk_create([Enrollment(student=s, course=self.courses[2]) for s in students])
+        Enrollment.objects.create(student=students[0], course=self.courses[0])
+        Course.refresh_enrollment_counts()
+        self.client = APIClient()
+
+    def titles(self, query):
+        response = self.client.get(f'/lms/courses/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [course['title'] for course in response.data]
+
+    def test_sorts(self):
+        self.assertEqual(self.titles('sort=title'), ['A', 'B', 'C'])
+        self.assertEqual(self.titles('sort=popularity'), ['C', 'B', 'A'])
+        self.assertEqual(self.titles('sort=newest&limit=2&offset=1'), ['A', 'B'])
+
+    def test_filters(self):
+        self.assertEqual(self.titles(f'instructor={self.instructor.pk}&sort=title'), ['A', 'B'])
+        self.assertEqual(self.titles('min_enrollments=1&sort=title'), ['B', 'C'])
+        self.assertEqual(self.titles('created_before=2000-01-01'), [])
+        self.assertEqual(self.client.get('/lms/courses/?sort=price').status_code, 400)
+        self.assertEqual(self.client.get('/lms/courses/?created_after=yesterday').status_code, 400)
+
+    def test_enrollment_count_follows_enroll_and_unenroll(self):
+        student = User.objects.create_user(
+            email='new@example.com', password='pass12345', full_name='New', role='student'
+        )
+        self.client.force_authenticate(student)
+        course = self.courses[1]
+        self.client.post(f'/lms/courses/{course.pk}/enroll/')
+        course.refresh_from_db()
+        self.assertEqual(course.enrollment_count, 1)
+        self.client.delete(f'/lms/courses/{course.pk}/unenroll/')
+        course.refresh_from_db()
+        self.assertEqual(course.enrollment_count, 0)
+
+    def test_enrollment_count_follows_admin_changes(self):
+        admin_user = User.objects.create_superuser(email='root@example.com', password='pass12345')
+        self.client.force_login(admin_user)
+        student = User.objects.get(email='student1@example.com')
+        a, b = self.courses[1], self.courses[0]
+        self.client.post('/admin/lms/enrollment/add/', {'student': student.pk, 'course': a.pk})
+        enrollment = Enrollment.objects.get(student=student, course=a)
+        self.assertEqual(Course.objects.get(pk=a.pk).enrollment_count, 1)
+
+        self.client.post(f'/admin/lms/enrollment/{enrollment.pk}/change/', {'student': student.pk, 'course': b.pk})
+        self.assertEqual([Course.objects.get(pk=c.pk).enrollment_count for c in (a, b)], [0, 2])
+
+        self.client.post('/admin/lms/enrollment/', {
+            'action': 'delete_selected', '_selected_action': [enrollment.pk], 'post': 'yes',
+        })
+        self.assertEqual(Course.objects.get(pk=b.pk).enrollment_count, 1)
+
+    def batch(self, ids):
+        return self.client.get(f'/lms/courses/batch/?ids={",".join(map(str, ids))}')
+
+    def test_batch_detail_keeps_the_requested_order(self):
+        b, a, c = self.courses
+        Course.all_objects.filter(pk=c.pk).update(is_deleted=True)
+        response = self.batch([c.pk, a.pk, 999999, b.pk, a.pk])
+        self.assertEqual(response.status_code, 200)
+        # Duplicates collapse; hidden and unknown courses are reported, not served
+        self.assertEqual([course['title'] for course in response.data['results']], ['A', 'B'])
+        self.assertEqual(response.data['missing'], [c.pk, 999999])
+        self.assertEqual(response.data['results'][0]['category']['courses_count'], 2)
+
+    def test_batch_detail_marks_the_student_enrollments(self):
+        student = User.objects.get(email='student0@example.com')
+        self.client.force_authenticate(student)
+        results = self.batch([course.pk for course in self.courses]).data['results']
+        self.assertEqual([course['is_enrolled'] for course in results], [True, False, True])
+
+    def test_batch_detail_limits(self):
+        self.assertEqual(self.batch(range(1, 101)).status_code, 200)
+        self.assertEqual(self.batch(range(1, 102)).status_code, 400)
+        self.assertEqual(self.client.get('/lms/courses/batch/').status_code, 400)
+        self.assertEqual(self.client.get('/lms/courses/batch/?ids=1,two').status_code, 400)
+
+    def test_batch_detail_queries_do_not_grow_with_ids(self):
+        counts = []
+        for ids in ([self.courses[0].pk], [course.pk for course in self.courses]):
+            with CaptureQueriesContext(connection) as queries:
+                self.batch(ids)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    @skipUnless(connection.vendor == 'sqlite', 'plans are checked against SQLite output')
+    def test_every_documented_combination_uses_an_index(self):
+        for query, plan in explain_catalog():
+            with self.subTest(query):
+                self.assertIn('lms_course USING INDEX course_', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class LessonProgressTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.student = User.objects.create_user(
+            email='student@example.com', password='pass12345', full_name='Student', role='student'
+        )
+        category = Category.objects.create(name='Programming')
+        self.course = Course.objects.create(
+            title='Python', description='Intro', category=category, instructor=self.instructor
+        )
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+        module = self.client.post(f'/lms/courses/{self.course.pk}/modules/', {'title': 'Basics'}).data
+        self.lessons = [
+            self.client.post(f"/lms/modules/{module['id']}/lessons/", {
+                'title': title, 'duration_seconds': 300
+            }).data['id']
+            for title in ('Variables', 'Loops')
+        ]
+        self.client.force_authenticate(self.student)
+        progress_buffer.clear()
+        self.addCleanup(progress_buffer.clear)
+
+    def ping(self, lesson, position, completed=False):
+        return self.client.post(
+            f'/lms/lessons/{lesson}/progress/', {'position_seconds': position, 'completed': completed}, format='json'
+        )
+
+    def test_outline_lists_modules_and_lessons_in_order(self):
+        outline = self.client.get(f'/lms/courses/{self.course.pk}/modules/').data
+        self.assertEqual([module['position'] for module in outline], [1])
+        self.assertEqual([lesson['title'] for lesson in outline[0]['lessons']], ['Variables', 'Loops'])
+
+    def test_only_the_owner_edits_content(self):
+        other = User.objects.create_user(
+            email='other@example.com', password='pass12345', full_name='Other', role='instructor'
+        )
+        self.client.force_authenticate(other)
+        response = self.client.post(f'/lms/courses/{self.course.pk}/modules/', {'title': 'Hijack'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(f'/lms/lessons/{self.lessons[0]}/').status_code, 403)
+
+    def test_pings_are_coalesced_into_one_batched_write(self):
+        for position in range(0, 200, 5):
+            self.assertEqual(self.ping(self.lessons[0], position).status_code, 202)
+        self.ping(self.lessons[1], 30, completed=True)
+        self.assertFalse(LessonProgress.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(progress_buffer.flush(), 2)
+        # One upsert per completion state, however many pings
+        self.assertLessEqual(len([q for q in queries if 'lms_lessonprogress' in q['sql']]), 2)
+        saved = dict(LessonProgress.objects.values_list('lesson', 'position_seconds'))
+        self.assertEqual(saved, {self.lessons[0]: 195, self.lessons[1]: 30})
+
+    def test_completion_is_sticky_and_pending_pings_are_visible(self):
+        self.ping(self.lessons[0], 300, completed=True)
+        progress_buffer.flush()
+        self.ping(self.lessons[0], 10)
+        progress = self.client.get(f'/lms/courses/{self.course.pk}/progress/').data
+        self.assertEqual(progress['lessons_completed'], 1)
+        self.assertEqual(progress['lessons'][0]['position_seconds'], 10)
+
+        progress_buffer.flush()
+        row = LessonProgress.objects.get(lesson=self.lessons[0])
+        self.assertEqual((row.position_seconds, row.completed), (10, True))
+
+    @override_settings(PROGRESS_BUFFER={'FLUSH_INTERVAL': 60, 'MAX_PENDING': 2})
+    def test_full_buffer_flushes_on_its_own(self):
+        self.ping(self.lessons[0], 10)
+        self.assertFalse(LessonProgress.objects.exists())
+        self.ping(self.lessons[1], 20)
+        self.assertEqual(LessonProgress.objects.count(), 2)
+
+    def test_rejects_students_who_are_not_enrolled(self):
+        Enrollment.objects.filter(student=self.student).delete()
+        self.assertEqual(self.ping(self.lessons[0], 10).status_code, 403)
+        self.assertEqual(self.ping(999999, 10).status_code, 404)
+        self.assertEqual(progress_buffer.pending_for(self.student.id), {})
+
+    def test_pings_of_deleted_students_do_not_block_later_flushes(self):
+        other = User.objects.create_user(email='other@example.com', password='pass12345', role='student')
+        Enrollment.objects.create(student=other, course=self.course)
+        self.ping(self.lessons[0], 10)
+        self.client.force_authenticate(other)
+        self.ping(self.lessons[0], 20)
+        # Hard delete, as a user DeletionJob does, while the ping is still buffered
+        User.objects.filter(pk=other.pk).delete()
+
+        self.assertEqual(progress_buffer.flush(), 1)
+        self.assertEqual(progress_buffer.pending_for(other.pk), {})
+        self.assertEqual(list(LessonProgress.objects.values_list('student', flat=True)), [self.student.pk])
+        self.client.force_authenticate(self.student)
+        self.ping(self.lessons[1], 30)
+        self.assertEqual(progress_buffer.flush(), 1)
+
+    def test_deleting_a_module_removes_lessons_and_progress(self):
+        self.ping(self.lessons[0], 10)
+        progress_buffer.flush()
+        self.client.force_authenticate(self.instructor)
+        module = Module.objects.get(course=self.course)
+        self.assertEqual(self.client.delete(f'/lms/modules/{module.pk}/').status_code, 204)
+        self.assertFalse(Lesson.objects.exists())
+        self.assertFalse(LessonProgress.objects.exists())
+
+
+class CourseMaterialTests(TestCase):
+    def setUp(self):
+        materials_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(materials_dir.cleanup)
+        override = override_settings(MATERIALS_DIR=Path(materials_dir.name))
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.student = User.objects.create_user(
+            email='student@example.com', password='pass12345', full_name='Student', role='student'
+        )
+        category = Category.objects.create(name='Programming')
+        self.course = Course.objects.create(
+            title='Python', description='Intro', category=category, instructor=self.instructor
+        )
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.content = bytes(range(256)) * 1000
+        self.client = APIClient()
+
+    def put_chunk(self, upload_id, first, last):
+        return self.client.put(
+            f'/lms/materials/uploads/{upload_id}/', self.content[first:last + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{len(self.content)}',
+        )
+
+    def upload(self):
+        self.client.force_authenticate(self.instructor)
+        upload = self.client.post(f'/lms/courses/{self.course.pk}/materials/uploads/', {
+            'title': 'Lecture', 'file_name': 'lecture.mp4', 'content_type': 'video/mp4', 'size': len(self.content)
+        }).data
+        self.assertEqual(self.put_chunk(upload['id'], 0, 99_999).data['received'], 100_000)
+        response = self.put_chunk(upload['id'], 100_000, len(self.content) - 1)
+        self.assertEqual(response.status_code, 201)
+        return CourseMaterial.objects.get(pk=response.data['id'])
+
+    def test_resumable_upload(self):
+        self.client.force_authenticate(self.instructor)
+        upload = self.client.post(f'/lms/courses/{self.course.pk}/materials/uploads/', {
+            'title': 'Lecture', 'file_name': 'lecture.mp4', 'size': len(self.content)
+        }).data
+        self.put_chunk(upload['id'], 0, 99_999)
+        # A retried chunk or a gap is refused, with the offset to resume from
+        response = self.put_chunk(upload['id'], 50_000, 149_999)
+        self.assertEqual((response.status_code, response.data['received']), (409, 100_000))
+        self.assertEqual(self.client.get(f"/lms/materials/uploads/{upload['id']}/").data['received'], 100_000)
+
+        self.assertEqual(self.put_chunk(upload['id'], 100_000, len(self.content) - 1).status_code, 201)
+        material = CourseMaterial.objects.get()
+        self.client.force_authenticate(self.student)
+        response = self.client.get(f'/lms/materials/{material.pk}/download/')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_chunks_are_copied_block_by_block(self):
+        class Stream(io.BytesIO):
+            largest = 0
+
+            def read(self, size=-1):
+                Stream.largest = max(Stream.largest, size)
+                return super().read(size)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'chunk.part'
+        self.assertEqual(write_chunk(path, 0, Stream(self.content), len(self.content)), len(self.content))
+        self.assertEqual(path.read_bytes(), self.content)
+        self.assertLessEqual(Stream.largest, BLOCK_SIZE)
+
+    def test_range_requests(self):
+        material = self.upload()
+        self.client.force_authenticate(self.student)
+        url = f'/lms/materials/{material.pk}/download/'
+
+        response = self.client.get(url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[1000:2000])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_sendfile_hand_off(self):
+        material = self.upload()
+        self.client.force_authenticate(self.student)
+        with self.settings(MATERIALS_SENDFILE='x-accel-redirect'):
+            response = self.client.get(f'/lms/materials/{material.pk}/download/')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-materials/{material.storage_name}')
+        self.assertEqual(response.content, b'')
+
+    def test_content_type_is_sniffed_and_unsafe_types_download(self):
+        self.content = b'%PDF-1.7\n' + bytes(200_000)
+        material = self.upload()
+        self.assertEqual(material.content_type, 'application/pdf')
+        self.client.force_authenticate(self.student)
+        response = self.client.get(f'/lms/materials/{material.pk}/download/')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+
+        # Declared as video but not recognisable: stored and sent as an opaque attachment
+        self.content = b'<html><script>alert(1)</script></html>' + bytes(200_000)
+        material = self.upload()
+        self.assertEqual(material.content_type, 'application/octet-stream')
+        self.client.force_authenticate(self.student)
+        response = self.client.get(f'/lms/materials/{material.pk}/download/')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+        material.content_type = 'image/svg+xml'
+        material.save()
+        response = self.client.get(f'/lms/materials/{material.pk}/download/')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+    def test_only_enrolled_students_download(self):
+        material = self.upload()
+        outsider = User.objects.create_user(
+            email='outsider@example.com', password='pass12345', full_name='Outsider', role='student'
+        )
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(f'/lms/materials/{material.pk}/download/').status_code, 403)
+
+
+@override_settings(COVER_WORKERS=0)
+class CourseCoverTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(
+            MEDIA_ROOT=Path(media.name) / 'media', COVER_ORIGINALS_DIR=Path(media.name) / 'originals'
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        category = Category.objects.create(name='Programming')
+        self.courses = [
+            Course.objects.create(title=title, description='Intro', category=category, instructor=self.instructor)
+            for title in ('Python', 'Django')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def image(self, size=(1600, 1200)):
+        out = io.BytesIO()
+        Image.new('RGB', size, 'orange').save(out, 'JPEG')
+        return SimpleUploadedFile('cover.jpg', out.getvalue(), content_type='image/jpeg')
+
+    def upload(self, course, image):
+        return self.client.post(f'/lms/courses/{course.pk}/cover/', {'image': image}, format='multipart')
+
+    def test_renders_every_size_and_format(self):
+        response = self.upload(self.courses[0], self.image())
+        self.assertEqual(response.data['status'], 'ready')
+        digest = Course.objects.get(pk=self.courses[0].pk).cover_hash
+        for size, box in covers.COVER_SIZES.items():
+            for ext in covers.COVER_FORMATS:
+                with Image.open(covers.rendition_dir(digest) / f'{size}.{ext}') as rendition:
+                    self.assertEqual(rendition.size, box)
+
+        listed = self.client.get('/lms/courses/').data
+        cover = next(course['cover'] for course in listed if course['id'] == self.courses[0].pk)
+        self.assertEqual(cover['card']['webp'], f'/media/covers/{digest[:2]}/{digest}/card.webp')
+
+    def test_originals_are_not_published(self):
+        image = self.image()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        out = io.BytesIO()
+        Image.open(image).save(out, 'JPEG', exif=exif)
+        self.upload(self.courses[0], SimpleUploadedFile('cover.jpg', out.getvalue(), content_type='image/jpeg'))
+
+        digest = Course.objects.get(pk=self.courses[0].pk).cover_hash
+        original_path = covers.original_path(digest)
+        self.assertTrue(original_path.exists())
+        self.assertNotIn(digest, original_path.name)
+        self.assertFalse(original_path.is_relative_to(covers.covers_dir().parent))
+        published = [path for path in covers.covers_dir().rglob('*') if path.is_file()]
+        self.assertEqual(len(published), len(covers.COVER_SIZES) * len(covers.COVER_FORMATS))
+        for path in published:
+            with Image.open(path) as rendition:
+                self.assertNotIn(0x010F, rendition.getexif())
+
+    def test_same_image_is_rendered_once(self):
+        image = self.image()
+        self.upload(self.courses[0], image)
+        image.seek(0)
+        with mock.patch('lms.covers.render') as render:
+            response = self.upload(self.courses[1], image)
+        render.assert_not_called()
+        self.assertEqual(response.data['status'], 'ready')
+        self.assertEqual(len(set(Course.objects.values_list('cover_hash', flat=True))), 1)
+
+    def test_rejects_files_that_are_not_images(self):
+        response = self.upload(self.courses[0], SimpleUploadedFile('cover.jpg', b'not an image'))
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(COVER_WORKERS=1)
+    def test_pool_renders_in_another_process(self):
+        self.addCleanup(covers._reset_executor)
+        self.addCleanup(lambda: covers.get_executor().shutdown())
+        course = self.courses[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.upload(course, self.image())
+        self.assertEqual((response.status_code, response.data['cover']), (202, None))
+        self.assertEqual(len(callbacks), 1)
+
+        digest = Course.objects.get(pk=course.pk).cover_original
+        future = covers.get_executor().submit(
+            covers.render, str(covers.original_path(digest)), str(covers.rendition_dir(digest))
+        )
+        future.result(timeout=60)
+        self.assertTrue(covers.is_rendered(digest))
+        self.assertEqual(covers.mark_ready(course.pk, digest), 1)
+
+
+class QuizGradingTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.students = [
+            User.objects.create_user(email=f'student{i}@example.com', password='pass12345', role='student')
+            for i in range(2)
+        ]
+        self.course = Course.objects.create(
+            title='Python', description='Intro', category=Category.objects.create(name='Programming'),
+            instructor=self.instructor,
+        )
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+        self.quiz = self.client.post(f'/lms/courses/{self.course.pk}/quizzes/', {'title': 'Basics'}).data['id']
+        self.single = self.add_question(options=['1', '2', '3'], correct=[1])
+        self.multi = self.add_question(options=['a', 'b', 'c', 'd'], correct=[0, 2], points=2, partial_credit=True)
+
+    def add_question(self, **data):
+        response = self.client.post(f'/lms/quizzes/{self.quiz}/questions/', {'text': 'Q', **data}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def submit(self, student, answers):
+        self.client.force_authenticate(student)
+        return self.client.post(f'/lms/quizzes/{self.quiz}/submissions/', {'answers': answers}, format='json')
+
+    def test_grades_batches_with_partial_credit(self):
+        key = AnswerKey([(1, 0b010, 1.0, False), (2, 0b0101, 2.0, True)])
+        masks = np.array([
+            [0b010, 0b0101],  # all right
+            [0b010, 0b0001],  # half of the multiple choice
+            [0b011, 0b0111],  # extra option: single choice wrong, one right option cancelled
+            [0b000, 0b1111],  # everything picked earns nothing
+        ])
+        np.testing.assert_allclose(key.grade(masks), [3.0, 2.0, 1.0, 0.0])
+        self.assertEqual(key.max_score, 3.0)
+        # Rows of unknown submissions or questions are ignored
+        answers = np.array([[10, 1, 0b010], [10, 9, 0b1], [11, 2, 0b0101], [12, 1, 0b010]])
+        np.testing.assert_array_equal(key.matrix(np.array([10, 11]), answers), [[0b010, 0], [0, 0b0101]])
+
+    def test_submission_is_graded_once(self):
+        response = self.submit(self.students[0], {str(self.single): [1], str(self.multi): [0]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['score'], response.data['max_score']), (2.0, 3.0))
+        self.assertEqual(self.submit(self.students[0], {}).status_code, 400)
+        self.assertEqual(self.submit(self.students[1], {str(self.single): [5]}).status_code, 400)
+        self.assertEqual(self.submit(self.students[1], {'12345': [0]}).status_code, 400)
+
+    def test_students_do_not_see_the_key(self):
+        self.client.force_authenticate(self.students[0])
+        questions = self.client.get(f'/lms/quizzes/{self.quiz}/').data['questions']
+        self.assertEqual([question['id'] for question in questions], [self.single, self.multi])
+        self.assertNotIn('correct', questions[0])
+
+    def test_changing_the_key_regrades_submissions(self):
+        self.submit(self.students[0], {str(self.single): [2], str(self.multi): [0, 2]})
+        self.submit(self.students[1], {str(self.single): [1]})
+        self.client.force_authenticate(self.instructor)
+        # The regrade waits for the commit and runs outside the request
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.put(f'/lms/questions/{self.single}/', {'correct': [2]}, format='json')
+        self.assertEqual((response.status_code, len(callbacks)), (200, 1))
+        self.assertEqual(
+            dict(QuizSubmission.objects.values_list('student__email', 'score')),
+            {'student0@example.com': 2.0, 'student1@example.com': 1.0},
+        )
+        self.assertEqual(regrade_quiz(self.quiz), 2)
+        scores = dict(QuizSubmission.objects.values_list('student__email', 'score'))
+        self.assertEqual(scores, {'student0@example.com': 3.0, 'student1@example.com': 0.0})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.delete(f'/lms/questions/{self.multi}/')
+        self.assertEqual(len(callbacks), 1)
+        regrade_quiz(self.quiz)
+        self.assertEqual(
+            sorted(QuizSubmission.objects.values_list('score', 'max_score')), [(0.0, 1.0), (1.0, 1.0)]
+        )
+
+        # Edits that leave the grading alone schedule nothing
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.put(f'/lms/questions/{self.single}/', {'text': 'Renamed'}, format='json')
+        self.assertEqual(callbacks, [])
+
+    def test_regrade_runs_once_more_when_the_key_changes_meanwhile(self):
+        self.client.force_authenticate(self.instructor)
+        started = []
+        with mock.patch('lms.grading.threading.Thread') as thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/lms/quizzes/{self.quiz}/regrade/')
+            self.assertEqual(response.status_code, 202)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/lms/quizzes/{self.quiz}/regrade/')
+            self.assertEqual(thread.call_count, 1)
+            target = thread.call_args.kwargs['target']
+
+        # The thread closes its connections when done, which would end the test's transaction
+        with mock.patch('lms.grading.regrade_quiz', side_effect=started.append), \
+                mock.patch('lms.grading.connections.close_all'):
+            target(self.quiz)
+        self.assertEqual(started, [self.quiz, self.quiz])
+        self.assertEqual(grading._running, {})
+
+
+class GradebookTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.course = Course.objects.create(
+            title='Python', description='Intro', category=Category.objects.create(name='Programming'),
+            instructor=self.instructor,
+        )
+        self.students = [
+            User.objects.create_user(email=f'{name.lower()}@example.com', password='pass12345', full_name=name)
+            for name in ('Ann', 'Bob', 'Cy, Jr.')
+        ]
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course)
+        self.quizzes = [
+            Quiz.objects.create(course=self.course, title='Quiz 1', weight=1),
+            Quiz.objects.create(course=self.course, title='Final', weight=3),
+        ]
+        for quiz, points in zip(self.quizzes, (10, 20)):
+            Question.objects.create(quiz=quiz, text='Q', options=['a', 'b'], correct=1, points=points)
+        # Ann: 100% and 50%, Bob: 50% and missed the final, Cy: only the final, 100%
+        for student, quiz, score in [
+            (self.students[0], self.quizzes[0], 10), (self.students[0], self.quizzes[1], 10),
+            (self.students[1], self.quizzes[0], 5), (self.students[2], self.quizzes[1], 20),
+        ]:
+            QuizSubmission.objects.create(quiz=quiz, student=student, score=score)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def export(self, kind):
+        response = self.client.get(f'/lms/courses/{self.course.pk}/gradebook/?export={kind}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_summary_statistics(self):
+        data = self.client.get(f'/lms/courses/{self.course.pk}/gradebook/').data
+        self.assertEqual(data['students'], 3)
+        first, final = data['assessments']
+        self.assertEqual((first['submitted'], first['mean'], first['max'], first['max_score']), (2, 7.5, 10.0, 10.0))
+        self.assertEqual((final['submitted'], final['mean'], final['p50']), (2, 15.0, 15.0))
+        self.assertEqual((data['total']['min'], data['total']['max']), (12.5, 75.0))
+
+    def test_csv_export(self):
+        rows = list(csv.reader(io.StringIO(self.export('csv'))))
+        self.assertEqual(rows[0], ['student_id', 'email', 'name', 'Quiz 1', 'Final', 'total', 'percentile'])
+        self.assertEqual(rows[1][2:], ['Ann', '10.00', '10.00', '62.50', '66.67'])
+        self.assertEqual(rows[2][2:], ['Bob', '5.00', '', '12.50', '33.33'])
+        self.assertEqual(rows[3][2:], ['Cy, Jr.', '', '20.00', '75.00', '100.00'])
+
+    def test_csv_export_neutralises_formulas(self):
+        self.quizzes[0].title = '=HYPERLINK("http://evil.example")'
+        self.quizzes[0].save()
+        User.objects.filter(pk=self.students[0].pk).update(full_name='@SUM(1+1)')
+        User.objects.filter(pk=self.students[1].pk).update(full_name='-2+3')
+        rows = list(csv.reader(io.StringIO(self.export('csv'))))
+        self.assertEqual(rows[0][3], '\'=HYPERLINK("http://evil.example")')
+        self.assertEqual([row[2] for row in rows[1:]], ["'-2+3", "'@SUM(1+1)", 'Cy, Jr.'])
+        # JSON has no formulas, so the ndjson export keeps the text as is
+        self.assertEqual(json.loads(self.export('ndjson').splitlines()[0])['name'], '-2+3')
+
+    def test_ndjson_export(self):
+        rows = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual(rows[1], {
+            'student': self.students[1].pk, 'email': 'bob@example.com', 'name': 'Bob',
+            'scores': [5.0, None], 'total': 12.5, 'percentile': 33.33,
+        })
+
+    def test_only_the_course_owner_sees_the_gradebook(self):
+        other = User.objects.create_user(email='other@example.com', password='pass12345', role='instructor')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/lms/courses/{self.course.pk}/gradebook/').status_code, 403)
+
+
+class FlakySMTPBackend(BaseEmailBackend):
+    """
+    Refuses refused@example.com, rejects the messages to ``rejected``, and
+    drops the connection on the first ``drops`` sends
+    """
+    drops = 0
+    rejected = ()
+    lock = threading.Lock()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to == ['refused@example.com']:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'No such user')})
+            if message.to[0] in self.rejected:
+                raise smtplib.SMTPDataError(554, b'Message rejected as spam')
+            with self.lock:
+                dropped, FlakySMTPBackend.drops = FlakySMTPBackend.drops > 0, max(FlakySMTPBackend.drops - 1, 0)
+            if dropped:
+                raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+            mail.outbox.append(message)
+        return len(messages)
+
+
+@override_settings(ANNOUNCEMENT_DELIVERY={'BATCH_SIZE': 2, 'CONNECTIONS': 2, 'RETRIES': 2, 'RETRY_DELAY': 0})
+class AnnouncementTests(TestCase):
+    def setUp(self):
+        FlakySMTPBackend.drops, FlakySMTPBackend.rejected = 0, ()
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', password='pass12345', full_name='Instructor', role='instructor'
+        )
+        self.course = Course.objects.create(
+            title='Python', description='Intro', category=Category.objects.create(name='Programming'),
+            instructor=self.instructor,
+        )
+        for email in ['a@example.com', 'b@example.com', 'refused@example.com', 'c@example.com', 'd@example.com']:
+            student = User.objects.create_user(email=email, password='pass12345', role='student')
+            Enrollment.objects.create(student=student, course=self.course)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def post(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                f'/lms/courses/{self.course.pk}/announcements/', {'subject': 'Exam moved', 'body': 'To Friday.'}
+            )
+        self.assertEqual((response.status_code, response.data['status'], len(callbacks)), (202, 'pending', 1))
+        return response.data['id']
+
+    def statuses(self):
+        return dict(AnnouncementDelivery.objects.values_list('student__email', 'status'))
+
+    def test_fans_out_to_the_roster_in_chunks(self):
+        announcement = run_announcement(self.post())
+        self.assertEqual(
+            (announcement.status, announcement.recipients, announcement.sent, announcement.failed), ('done', 5, 5, 0)
+        )
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].subject, '[Python] Exam moved')
+        self.assertEqual(set(self.statuses().values()), {'sent'})
+
+    @override_settings(EMAIL_BACKEND='lms.tests.FlakySMTPBackend')
+    def test_refused_recipients_fail_and_dropped_connections_retry(self):
+        FlakySMTPBackend.drops = 2
+        announcement = run_announcement(self.post())
+        self.assertEqual((announcement.sent, announcement.failed), (4, 1))
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(self.statuses()['refused@example.com'], 'failed')
+        response = self.client.get(f'/lms/announcements/{announcement.pk}/deliveries/?status=failed')
+        self.assertIn('No such user', response.data['deliveries'][0]['error'])
+
+    @override_settings(EMAIL_BACKEND='lms.tests.FlakySMTPBackend')
+    def test_rejected_messages_fail_without_reconnecting(self):
+        FlakySMTPBackend.rejected = ('c@example.com',)
+        announcement_id = self.post()
+        # Retries log a warning
+        with self.assertNoLogs('lms.announcements', 'WARNING'):
+            announcement = run_announcement(announcement_id)
+        self.assertEqual((announcement.sent, announcement.failed), (3, 2))
+        self.assertEqual(self.statuses()['c@example.com'], 'failed')
+        self.assertIn('rejected as spam', AnnouncementDelivery.objects.get(student__email='c@example.com').error)
+
+    def test_resuming_does_not_send_twice(self):
+        announcement_id = self.post()
+        run_announcement(announcement_id)
+        # A send whose worker died long ago
+        Announcement.objects.filter(pk=announcement_id).update(
+            status='sending', cursor=0, updated_at=datetime.now(dt_timezone.utc) - timedelta(hours=1)
+        )
+        run_announcement(announcement_id)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_an_announcement_being_sent_is_not_claimed_again(self):
+        announcement_id = self.post()
+        Announcement.objects.filter(pk=announcement_id).update(status='sending', updated_at=datetime.now(dt_timezone.utc))
+        announcement = run_announcement(announcement_id)
+        self.assertEqual((announcement.status, len(mail.outbox)), ('sending', 0))
+
+        # Two workers read the pending row; only the first UPDATE wins
+        Announcement.objects.filter(pk=announcement_id).update(status='pending')
+        first, second = Announcement.objects.get(pk=announcement_id), Announcement.objects.get(pk=announcement_id)
+        self.assertEqual((claim(first), claim(second)), (True, False))
+        self.assertEqual((first.status, first.recipients), ('sending', 5))
+
+    def test_only_the_course_owner_can_post(self):
+        other = User.objects.create_user(email='other@example.com', password='pass12345', role='instructor')
+        self.client.force_authenticate(other)
+        response = self.client.post(f'/lms/courses/{self.course.pk}/announcements/', {'subject': 'Hi', 'body': 'Hi'})
+        self.assertEqual(response.status_code, 403)
+
+
+class DeletionJobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password='pass12345', role='admin')
+        self.instructors = [
+            User.objects.create_user(email=f'instructor{i}@example.com', password='pass12345', role='instructor')
+            for i in range(2)
+        ]
+        self.students = [
+            User.objects.create_user(email=f'student{i}@example.com', password='pass12345', role='student')
+            for i in range(2)
+        ]
+        self.root = Category.objects.create(name='Programming')
+        self.child = Category.objects.create(name='Python', parent=self.root)
+        self.other = Category.objects.create(name='Design')
+        # Two courses in the subtree of root, one outside it by another instructor
+        self.courses = [
+            self.course('Django', self.child, self.instructors[0]),
+            self.course('Basics', self.root, self.instructors[0]),
+            self.course('Figma', self.other, self.instructors[1]),
+        ]
+        Course.refresh_enrollment_counts()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def course(self, title, category, instructor):
+        course = Course.objects.create(title=title, description='Intro', category=category, instructor=instructor)
+        lesson = Lesson.objects.create(module=Module.objects.create(course=course, title='M'), title='L')
+        question = Question.objects.create(
+            quiz=Quiz.objects.create(course=course, title='Q'), text='Q', options=['a', 'b'], correct=1
+        )
+        announcement = Announcement.objects.create(course=course, subject='Hi', body='Hi')
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=course)
+            LessonProgress.objects.create(student=student, lesson=lesson, updated_at=datetime.now(dt_timezone.utc))
+            submission = QuizSubmission.objects.create(quiz=question.quiz, student=student, score=1)
+            QuizAnswer.objects.create(submission=submission, question=question, selected=0b10)
+            AnnouncementDelivery.objects.create(announcement=announcement, student=student)
+        return course
+
+    def schedule(self, url):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(url)
+        self.assertEqual((response.status_code, len(callbacks)), (202, 1))
+        return response.data['job']['id']
+
+    def remaining(self, model, **filters):
+        return set(model._base_manager.filter(**filters).values_list('pk', flat=True))
+
+    @mock.patch('lms.deletion.BATCH_SIZE', 2)
+    def test_category_job_removes_the_subtree(self):
+        job_id = self.schedule(f'/lms/categories/{self.root.pk}/')
+        # Hidden right away, before any row is deleted
+        self.assertFalse(Category.objects.filter(pk__in=[self.root.pk, self.child.pk]).exists())
+        self.assertFalse(Course.objects.filter(pk__in=[self.courses[0].pk, self.courses[1].pk]).exists())
+
+        job = run_deletion_job(job_id)
+        self.assertEqual((job.status, job.deleted), ('done', job.total))
+        self.assertEqual(self.remaining(Category), {self.other.pk})
+        self.assertEqual(self.remaining(Course), {self.courses[2].pk})
+        for model in (Module, Quiz, Announcement):
+            self.assertEqual(set(model.objects.values_list('course_id', flat=True)), {self.courses[2].pk})
+        self.assertEqual(self.remaining(Enrollment), self.remaining(Enrollment, course=self.courses[2]))
+        self.assertEqual(QuizAnswer.objects.count(), 2)
+        self.assertEqual(LessonProgress.objects.count(), 2)
+
+        response = self.client.get(f'/lms/deletions/{job_id}/')
+        self.assertEqual((response.data['status'], response.data['deleted']), ('done', job.total))
+
+    def test_course_job_leaves_other_courses_alone(self):
+        before = {
+            model: model.objects.count() for model in (Enrollment, LessonProgress, QuizAnswer, AnnouncementDelivery)
+        }
+        job = run_deletion_job(self.schedule(f'/lms/courses/{self.courses[0].pk}/delete/'))
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(self.remaining(Course), {self.courses[1].pk, self.courses[2].pk})
+        for model, count in before.items():
+            self.assertEqual(model.objects.count(), count - 2)
+        # Course, module, lesson, quiz, question, announcement and two rows of five kinds
+        self.assertEqual(job.total, 6 + 2 * 5)
+
+    def test_user_jobs_recount_enrollments(self):
+        job = run_deletion_job(self.schedule(f'/api/users/{self.students[0].pk}/delete/'))
+        self.assertEqual(job.status, 'done')
+        self.assertFalse(User.objects.filter(pk=self.students[0].pk).exists())
+        self.assertEqual(self.remaining(Enrollment), self.remaining(Enrollment, student=self.students[1]))
+        self.assertEqual(list(Course.objects.values_list('enrollment_count', flat=True).distinct()), [1])
+
+        # An instructor takes their courses, and their students' enrollments in them, along
+        job = run_deletion_job(self.schedule(f'/api/users/{self.instructors[0].pk}/delete/'))
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(self.remaining(Course), {self.courses[2].pk})
+        self.assertEqual(self.remaining(Enrollment), self.remaining(Enrollment, course=self.courses[2]))
+        self.assertTrue(User.objects.filter(pk=self.students[1].pk).exists())
+
+    def test_plan_deletes_referencing_rows_first(self):
+        for target_type, target in [
+            ('category', self.root), ('course', self.courses[0]), ('user', self.instructors[0]),
+        ]:
+            models = [queryset.model for queryset in _plan(DeletionJob(target_type=target_type, target_id=target.pk))]
+            for position, model in enumerate(models):
+                referenced = {
+                    field.related_model for field in model._meta.concrete_fields
+                    if field.is_relation and field.related_model is not model
+                }
+                # Whatever a model points at must not have been deleted before it
+                self.assertFalse(referenced & set(models[:position]), (target_type, model))
+        categories = _plan(DeletionJob(target_type='category', target_id=self.root.pk))[-1]
+        # Children before their parents
+        self.assertEqual(list(categories.values_list('pk', flat=True)), [self.child.pk, self.root.pk])
+        self.assertEqual(_plan(DeletionJob(target_type='category', target_id=0)), [])
+
+    def test_run_deletions_resumes_failed_and_interrupted_jobs(self):
+        failed = self.schedule(f'/lms/courses/{self.courses[0].pk}/delete/')
+        interrupted = self.schedule(f'/lms/courses/{self.courses[1].pk}/delete/')
+        real_delete = deletion._delete_in_batches
+        calls = []
+
+        def crash_on_third_table(queryset, job):
+            calls.append(queryset.model)
+            if len(calls) == 3:
+                raise RuntimeError('disk I/O error')
+            real_delete(queryset, job)
+
+        with mock.patch('lms.deletion._delete_in_batches', crash_on_third_table), self.assertLogs('lms.deletion'):
+            job = run_deletion_job(failed)
+        self.assertEqual((job.status, job.error), ('failed', 'disk I/O error'))
+        self.assertGreater(job.deleted, 0)
+        # As if the worker running it had been killed
+        DeletionJob.objects.filter(pk=interrupted).update(status='running')
+
+        call_command('run_deletions', stdout=io.StringIO())
+        for job in DeletionJob.objects.filter(pk__in=[failed, interrupted]):
+            self.assertEqual((job.status, job.deleted), ('done', job.total))
+        self.assertEqual(self.remaining(Course), {self.courses[2].pk})
+        self.assertEqual(Course.objects.get().enrollment_count, 2)
+
+
+class OutboxTests(TestCase):
+    KEYS = ('users', 'users:student', 'users:instructor', 'courses', 'enrollments')
+
+    def record(self, *events):
+        with transaction.atomic():
+            return [record_event(event_type, **payload) for event_type, payload in events]
+
+    def signups(self, count):
+        return self.record(*[('user.created', {'role': 'student'})] * count)
+
+    def test_each_event_is_projected_once(self):
+        self.record(
+            ('user.created', {'role': 'student'}), ('user.created', {'role': 'instructor'}),
+            ('course.created', {}), ('category.updated', {}),
+            ('enrollment.created', {}), ('enrollment.created', {}), ('enrollment.deleted', {}),
+        )
+        consumer = StatsConsumer()
+        # Events of other types are not delivered
+        self.assertEqual(consume(consumer), 6)
+        self.assertEqual(consume(consumer), 0)
+        self.assertEqual(get_counters(*self.KEYS), {
+            'users': 2, 'users:student': 1, 'users:instructor': 1, 'courses': 1, 'enrollments': 1,
+        })
+
+    def test_failed_batch_keeps_neither_its_writes_nor_its_checkpoint(self):
+        self.signups(3)
+
+        class Crashing(StatsConsumer):
+            def handle(self, events):
+                super().handle(events)
+                raise RuntimeError('worker killed')
+
+        with self.assertRaises(RuntimeError):
+            consume(Crashing())
+        self.assertEqual(get_counters('users')['users'], 0)
+        self.assertFalse(ConsumerCheckpoint.objects.filter(name='stats', position__gt=0).exists())
+
+        self.assertEqual(consume(StatsConsumer()), 3)
+        self.assertEqual(get_counters('users')['users'], 3)
+
+    def test_resumes_from_its_checkpoint(self):
+        events = self.signups(5)
+        consumer = StatsConsumer()
+        self.assertEqual([consume_batch(consumer, batch_size=2) for _ in range(2)], [2, 2])
+        self.assertEqual(ConsumerCheckpoint.objects.get(name='stats').position, events[3].pk)
+
+        # A new process picks up where the last one stopped
+        self.signups(2)
+        self.assertEqual(consume(StatsConsumer(), batch_size=2), 3)
+        self.assertEqual(get_counters('users', 'users:student'), {'users': 7, 'users:student': 7})
+
+    def test_reset_rebuilds_from_the_base_tables(self):
+        for i in range(3):
+            User.objects.create_user(email=f'student{i}@example.com', password='pass12345', role='student')
+        # Already counted by the rebuild, so never applied on top of it
+        self.signups(3)
+        call_command('consume_events', 'stats', '--reset', stdout=io.StringIO())
+        self.assertEqual(get_counters('users', 'users:student'), {'users': 3, 'users:student': 3})
+        self.assertEqual(consume(StatsConsumer()), 0)
+        self.assertEqual(get_counters(*self.KEYS), {key: current_counters().get(key, 0) for key in self.KEYS})
+
+    def test_rebuilt_counters_agree_with_deltas_while_a_user_is_deleted(self):
+        instructor = User.objects.create_user(email='teacher@example.com', password='pass12345', role='instructor')
+        Course.objects.create(
+            title='Python', description='Intro', category=Category.objects.create(name='Programming'),
+            instructor=instructor,
+        )
+        consumer = StatsConsumer()
+        reset_consumer(consumer)
+        with self.captureOnCommitCallbacks():
+            schedule_deletion('user', instructor)
+        # The job has not run: the instructor and the course are hidden but still in the tables
+        consume(consumer)
+        keys = ('users', 'users:instructor', 'courses', 'categories')
+        self.assertEqual(get_counters(*keys), {'users': 0, 'users:instructor': 0, 'courses': 0, 'categories': 1})
+        reset_consumer(consumer)
+        self.assertEqual(get_counters(*keys), {'users': 0, 'users:instructor': 0, 'courses': 0, 'categories': 1})
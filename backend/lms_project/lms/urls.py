@@ -3,36 +3,107 @@ from .views import (
     # Category views
     CategoryListCreateView,
     CategoryDetailView,
+    CategoryTreeView,
+    CategoryCoursesView,
     # Course views
     CourseListView,
+    CourseFacetsView,
     CourseDetailView,
+    CourseBatchDetailView,
     CourseCreateView,
     CourseUpdateView,
     CourseDeleteView,
+    CourseCoverView,
     InstructorCoursesView,
+    DeletionJobDetailView,
     # Enrollment views
     StudentEnrollView,
     StudentUnenrollView,
     StudentEnrollmentsView,
     CourseEnrollmentsView,
+    # Content views
+    CourseModulesView,
+    ModuleDetailView,
+    ModuleLessonsView,
+    LessonDetailView,
+    # Progress views
+    LessonProgressView,
+    CourseProgressView,
+    # Material views
+    CourseMaterialsView,
+    MaterialUploadCreateView,
+    MaterialUploadView,
+    MaterialDetailView,
+    MaterialDownloadView,
+    # Quiz views
+    CourseQuizzesView,
+    QuizDetailView,
+    QuizQuestionsView,
+    QuestionDetailView,
+    QuizSubmissionsView,
+    QuizRegradeView,
+    # Gradebook views
+    CourseGradebookView,
+    # Announcement views
+    CourseAnnouncementsView,
+    AnnouncementDeliveriesView,
 )
 
 urlpatterns = [
     # Category endpoints
     path('categories/', CategoryListCreateView.as_view(), name='category-list-create'),
     path('categories/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
+    path('categories/tree/', CategoryTreeView.as_view(), name='category-tree'),
+    path('categories/<int:pk>/tree/', CategoryTreeView.as_view(), name='category-subtree'),
+    path('categories/<int:pk>/courses/', CategoryCoursesView.as_view(), name='category-courses'),
     
     # Course endpoints
     path('courses/', CourseListView.as_view(), name='course-list'),
     path('courses/<int:pk>/', CourseDetailView.as_view(), name='course-detail'),
+    path('courses/batch/', CourseBatchDetailView.as_view(), name='course-batch-detail'),
+    path('courses/facets/', CourseFacetsView.as_view(), name='course-facets'),
     path('courses/create/', CourseCreateView.as_view(), name='course-create'),
     path('courses/<int:pk>/update/', CourseUpdateView.as_view(), name='course-update'),
     path('courses/<int:pk>/delete/', CourseDeleteView.as_view(), name='course-delete'),
+    path('courses/<int:pk>/cover/', CourseCoverView.as_view(), name='course-cover'),
     path('instructor/courses/', InstructorCoursesView.as_view(), name='instructor-courses'),
+    path('deletions/<int:pk>/', DeletionJobDetailView.as_view(), name='deletion-job-detail'),
     
     # Enrollment endpoints
     path('courses/<int:course_id>/enroll/', StudentEnrollView.as_view(), name='student-enroll'),
     path('courses/<int:course_id>/unenroll/', StudentUnenrollView.as_view(), name='student-unenroll'),
     path('student/enrollments/', StudentEnrollmentsView.as_view(), name='student-enrollments'),
     path('courses/<int:course_id>/enrollments/', CourseEnrollmentsView.as_view(), name='course-enrollments'),
+    
+    # Content endpoints
+    path('courses/<int:course_id>/modules/', CourseModulesView.as_view(), name='course-modules'),
+    path('modules/<int:pk>/', ModuleDetailView.as_view(), name='module-detail'),
+    path('modules/<int:module_id>/lessons/', ModuleLessonsView.as_view(), name='module-lessons'),
+    path('lessons/<int:pk>/', LessonDetailView.as_view(), name='lesson-detail'),
+    
+    # Progress endpoints
+    path('lessons/<int:pk>/progress/', LessonProgressView.as_view(), name='lesson-progress'),
+    path('courses/<int:course_id>/progress/', CourseProgressView.as_view(), name='course-progress'),
+    
+    # Material endpoints
+    path('courses/<int:course_id>/materials/', CourseMaterialsView.as_view(), name='course-materials'),
+    path('courses/<int:course_id>/materials/uploads/', MaterialUploadCreateView.as_view(), name='material-upload-create'),
+    path('materials/uploads/<uuid:pk>/', MaterialUploadView.as_view(), name='material-upload'),
+    path('materials/<int:pk>/', MaterialDetailView.as_view(), name='material-detail'),
+    path('materials/<int:pk>/download/', MaterialDownloadView.as_view(), name='material-download'),
+    
+    # Quiz endpoints
+    path('courses/<int:course_id>/quizzes/', CourseQuizzesView.as_view(), name='course-quizzes'),
+    path('quizzes/<int:pk>/', QuizDetailView.as_view(), name='quiz-detail'),
+    path('quizzes/<int:quiz_id>/questions/', QuizQuestionsView.as_view(), name='quiz-questions'),
+    path('questions/<int:pk>/', QuestionDetailView.as_view(), name='question-detail'),
+    path('quizzes/<int:quiz_id>/submissions/', QuizSubmissionsView.as_view(), name='quiz-submissions'),
+    path('quizzes/<int:quiz_id>/regrade/', QuizRegradeView.as_view(), name='quiz-regrade'),
+    
+    # Gradebook endpoints
+    path('courses/<int:course_id>/gradebook/', CourseGradebookView.as_view(), name='course-gradebook'),
+    
+    # Announcement endpoints
+    path('courses/<int:course_id>/announcements/', CourseAnnouncementsView.as_view(), name='course-announcements'),
+    path('announcements/<int:pk>/deliveries/', AnnouncementDeliveriesView.as_view(), name='announcement-deliveries'),
 ]
\ No newline at end of file
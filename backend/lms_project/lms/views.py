@@ -1,13 +1,50 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
-from .models import Category, Course, Enrollment
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Prefetch, Q, Subquery
+from .models import (
+    Announcement, AnnouncementDelivery, ArchivedEnrollment, Category, Course, CourseMaterial, DeletionJob, Enrollment,
+    Lesson, LessonProgress, MaterialUpload, Module, Question, Quiz, QuizAnswer, QuizSubmission,
+)
 from .serializers import (
     CategorySerializer, 
     CourseListSerializer, 
     CourseDetailSerializer, 
     CourseCreateUpdateSerializer,
     EnrollmentSerializer,
-    StudentEnrollmentSerializer
+    StudentEnrollmentSerializer,
+    ArchivedEnrollmentSerializer,
+    StudentArchivedEnrollmentSerializer,
+    DeletionJobSerializer,
+    ModuleSerializer,
+    LessonSerializer,
+    ProgressPingSerializer,
+    CourseMaterialSerializer,
+    MaterialUploadSerializer,
+    QuizSerializer,
+    QuestionSerializer,
+    QuestionPublicSerializer,
+    QuizAnswersSerializer,
+    QuizSubmissionSerializer,
+    AnnouncementSerializer,
+    AnnouncementDeliverySerializer,
+)
+from . import covers, materials
+from .announcements import schedule_announcement
+from .archive import include_archived
+from .catalog import (
+    facet_counts, filter_by_tags, filter_courses, paginate, selected_tags, sort_courses,
 )
+from .deletion import schedule_deletion
+from .gradebook import Gradebook
+from .grading import AnswerKey, schedule_regrade
+from .history import close_period, open_period
+from .outbox import record_event
+from .progress import progress_buffer
+from lms_project.tenancy import tenant_db
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
@@ -15,6 +52,52 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from api.permissions import IsInstructor, IsStudent, IsAdmin, IsInstructorOrAdmin
 
 
+def with_course_counts(categories):
+    """Annotate each category with its own (not subtree) visible course count"""
+    return categories.annotate(num_courses=Count('courses', filter=Q(courses__is_deleted=False)))
+
+
+def can_edit_course(user, course):
+    """Admins edit every course, instructors only their own"""
+    return user.role == 'admin' or (user.role == 'instructor' and course.instructor_id == user.id)
+
+
+def can_view_course_content(user, course):
+    """Course owner, admins and enrolled students"""
+    return can_edit_course(user, course) or Enrollment.objects.filter(student=user, course=course).exists()
+
+
+def next_position(items):
+    return (items.aggregate(last=Max('position'))['last'] or 0) + 1
+
+
+def build_category_tree(categories):
+    """
+    Nest categories ordered by path into dicts with direct and subtree course
+    counts. Parents come before children in path order, so one pass links
+    them and one reverse pass rolls the counts up; no recursion, no queries.
+    """
+    nodes, roots = {}, []
+    for category in categories:
+        node = {
+            'id': category.id,
+            'name': category.name,
+            'description': category.description,
+            'parent': category.parent_id,
+            'courses_count': category.num_courses,
+            'subtree_courses_count': category.num_courses,
+            'children': [],
+        }
+        nodes[category.path] = node
+        parent = nodes.get(category.path[:category.path.rstrip('/').rfind('/') + 1])
+        (parent['children'] if parent else roots).append(node)
+    for path in reversed(list(nodes)):
+        parent = nodes.get(path[:path.rstrip('/').rfind('/') + 1])
+        if parent:
+            parent['subtree_courses_count'] += nodes[path]['subtree_courses_count']
+    return roots
+
+
 # ==================== Category Views ====================
 
 class CategoryListCreateView(APIView):
@@ -26,14 +109,16 @@ class CategoryListCreateView(APIView):
         return [AllowAny()]
     
     def get(self, request):
-        categories = Category.objects.all()
+        categories = with_course_counts(Category.objects.order_by('path'))
         serializer = CategorySerializer(categories, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     def post(self, request):
         serializer = CategorySerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=tenant_db()):
+                category = serializer.save()
+                record_event('category.created', category.pk, name=category.name)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -55,28 +140,97 @@ class CategoryDetailView(APIView):
         category = get_object_or_404(Category, pk=pk)
         serializer = CategorySerializer(category, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=tenant_db()):
+                serializer.save()
+                record_event('category.updated', category.pk, fields=sorted(serializer.validated_data))
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def delete(self, request, pk):
         category = get_object_or_404(Category, pk=pk)
-        category.delete()
-        return Response({"message": "Category deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
+        # Hidden now, courses and enrollments are removed in background batches
+        job = schedule_deletion('category', category, requested_by=request.user)
+        return Response(
+            {"message": "Category scheduled for deletion", "job": DeletionJobSerializer(job).data},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class CategoryTreeView(APIView):
+    """
+    Category hierarchy with course counts (public)
+    GET /lms/categories/tree/ for the whole tree, /lms/categories/<id>/tree/ for one subtree
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request, pk=None):
+        categories = Category.objects.order_by('path')
+        if pk is not None:
+            root = get_object_or_404(Category, pk=pk)
+            categories = categories.filter(root.subtree())
+        return Response(build_category_tree(with_course_counts(categories)), status=status.HTTP_200_OK)
+
+
+class CategoryCoursesView(APIView):
+    """All courses in a category and its subcategories at any depth (public)"""
+    permission_classes = [AllowAny]
+    
+    def get(self, request, pk):
+        category = get_object_or_404(Category, pk=pk)
+        courses = Course.objects.filter(category.subtree('category__path')).select_related(
+            'category', 'instructor'
+        ).prefetch_related('tags')
+        serializer = CourseListSerializer(courses, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 # ==================== Course Views ====================
 
 class CourseListView(APIView):
-    """List all courses (public)"""
+    """
+    List all courses (public)
+    Filter by tags with ?topic=python,web&level=beginner&language=en (any value
+    within a facet, every facet given) and by ?category=, ?instructor=,
+    ?created_after=, ?created_before= and ?min_enrollments=. Sort with
+    ?sort=newest|title|popularity and page with ?limit=&offset=.
+    Tag counts for the same filters come from /lms/courses/facets/.
+    """
     permission_classes = [AllowAny]
     
     def get(self, request):
-        courses = Course.objects.all().select_related('category', 'instructor')
-        serializer = CourseListSerializer(courses, many=True)
+        params = request.query_params
+        selected = selected_tags(params)
+        try:
+            courses = filter_courses(filter_by_tags(Course.objects.all(), selected), params)
+            listing = paginate(sort_courses(courses, params), params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        listing = listing.select_related('category', 'instructor').prefetch_related('tags')
+        serializer = CourseListSerializer(listing, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class CourseFacetsView(APIView):
+    """
+    Tag counts over every course matching the catalog filters (public)
+    GET /lms/courses/facets/?topic=python&level=beginner&category=<id>
+    Takes the filters of the course list; sorting and paging do not apply.
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        params = request.query_params
+        selected = selected_tags(params)
+        try:
+            courses = filter_courses(filter_by_tags(Course.objects.all(), selected), params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'selected': selected,
+            'facets': facet_counts(courses),
+        }, status=status.HTTP_200_OK)
+
+
 class CourseDetailView(APIView):
     """Get course details (public)"""
     permission_classes = [AllowAny]
@@ -87,6 +241,56 @@ class CourseDetailView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class CourseBatchDetailView(APIView):
+    """
+    Get details for many courses at once (public)
+    GET /lms/courses/batch/?ids=1,2,3
+    Uses a constant number of queries regardless of how many ids are asked for.
+    """
+    permission_classes = [AllowAny]
+    MAX_IDS = 100
+    
+    def get(self, request):
+        try:
+            ids = [int(i) for i in request.query_params.get('ids', '').split(',') if i.strip()]
+        except ValueError:
+            return Response({"error": "ids must be a comma-separated list of integers"}, status=status.HTTP_400_BAD_REQUEST)
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return Response({"error": "ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.MAX_IDS:
+            return Response(
+                {"error": f"At most {self.MAX_IDS} ids can be requested at once"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        category_courses = Course.objects.filter(category=OuterRef('category')).values('category').annotate(
+            count=Count('pk')
+        ).values('count')
+        courses = Course.objects.filter(pk__in=ids).select_related('category', 'instructor').prefetch_related(
+            'tags'
+        ).annotate(
+            category_num_courses=Subquery(category_courses),
+        )
+        courses_by_id = {}
+        for course in courses:
+            course.category.num_courses = course.category_num_courses or 0
+            courses_by_id[course.id] = course
+        
+        context = {'request': request}
+        if request.user.is_authenticated and request.user.role == 'student':
+            context['enrolled_course_ids'] = set(
+                Enrollment.objects.filter(student=request.user, course_id__in=courses_by_id).values_list('course_id', flat=True)
+            )
+        
+        found = [courses_by_id[i] for i in ids if i in courses_by_id]
+        serializer = CourseDetailSerializer(found, many=True, context=context)
+        return Response({
+            'results': serializer.data,
+            'missing': [i for i in ids if i not in courses_by_id],
+        }, status=status.HTTP_200_OK)
+
+
 class CourseCreateView(APIView):
     """Create a new course (instructor or admin)"""
     permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
@@ -105,7 +309,9 @@ class CourseCreateView(APIView):
             else:
                 instructor = request.user
             
-            serializer.save(instructor=instructor)
+            with transaction.atomic(using=tenant_db()):
+                course = serializer.save(instructor=instructor)
+                record_event('course.created', course.pk, category=course.category_id, instructor=instructor.pk)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -126,7 +332,9 @@ class CourseUpdateView(APIView):
         
         serializer = CourseCreateUpdateSerializer(course, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=tenant_db()):
+                serializer.save()
+                record_event('course.updated', course.pk, fields=sorted(serializer.validated_data))
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -150,25 +358,90 @@ class CourseDeleteView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        course.delete()
-        return Response({"message": "Course deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
+        job = schedule_deletion('course', course, requested_by=request.user)
+        return Response(
+            {"message": "Course scheduled for deletion", "job": DeletionJobSerializer(job).data},
+            status=status.HTTP_202_ACCEPTED
+        )
 
 
 class InstructorCoursesView(APIView):
-    """List courses created by the logged-in instructor or all courses for admin"""
+    """
+    List courses created by the logged-in instructor or all courses for admin
+    Takes the same filter, sort and paging parameters as the course list.
+    """
     permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
     
     def get(self, request):
+        params = request.query_params
         # Admins can see all courses, instructors see only their own
         if request.user.role == 'admin':
-            courses = Course.objects.all().select_related('category', 'instructor')
+            courses = Course.objects.all()
         else:
-            courses = Course.objects.filter(instructor=request.user).select_related('category')
+            courses = Course.objects.filter(instructor=request.user)
+        try:
+            courses = paginate(sort_courses(filter_courses(courses, params), params), params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        courses = courses.select_related('category', 'instructor').prefetch_related('tags')
         
         serializer = CourseListSerializer(courses, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class DeletionJobDetailView(APIView):
+    """Progress of a background deletion (admin or the user who requested it)"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, pk):
+        job = get_object_or_404(DeletionJob, pk=pk)
+        if request.user.role != 'admin' and job.requested_by_id != request.user.id:
+            return Response(
+                {"error": "You can only view your own deletion jobs"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = DeletionJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class CourseCoverView(APIView):
+    """
+    Upload or remove a course cover image (course owner or admin)
+    POST multipart with an "image" file; renditions are rendered in the
+    background unless the same image was uploaded before.
+    """
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def post(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        if not can_edit_course(request.user, course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        image = request.FILES.get('image')
+        if image is None:
+            return Response({"error": "Send the cover as an \"image\" file"}, status=status.HTTP_400_BAD_REQUEST)
+        if image.size > settings.COVER_MAX_SIZE:
+            return Response(
+                {"error": f"Cover images are limited to {settings.COVER_MAX_SIZE} bytes"}, 
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        try:
+            covers.check_image(image)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        digest = covers.store_original(image)
+        if covers.set_cover(course, digest):
+            return Response({"status": "ready", "cover": covers.cover_urls(digest)}, status=status.HTTP_200_OK)
+        return Response({"status": "processing", "cover": None}, status=status.HTTP_202_ACCEPTED)
+    
+    def delete(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        if not can_edit_course(request.user, course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        covers.clear_cover(course)
+        return Response({"message": "Cover removed"}, status=status.HTTP_204_NO_CONTENT)
+
+
 # ==================== Enrollment Views ====================
 
 class StudentEnrollView(APIView):
@@ -178,14 +451,29 @@ class StudentEnrollView(APIView):
     def post(self, request, course_id):
         course = get_object_or_404(Course, pk=course_id)
         
-        # Check if already enrolled
-        if Enrollment.objects.filter(student=request.user, course=course).exists():
+        # Seat check, duplicate check and insert run as one statement
+        with transaction.atomic(using=tenant_db()):
+            enrollment, outcome = Enrollment.objects.enroll(request.user, course)
+            if enrollment is not None:
+                Course.all_objects.filter(pk=course.pk).update(enrollment_count=F('enrollment_count') + 1)
+                open_period(request.user, course, enrollment.enrolled_at)
+                record_event('enrollment.created', enrollment.pk, student=request.user.pk, course=course.pk)
+        if outcome == Enrollment.objects.ALREADY_ENROLLED:
             return Response(
                 {"error": "You are already enrolled in this course"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if outcome == Enrollment.objects.COURSE_ENDED:
+            return Response(
+                {"error": "This course has ended"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if outcome == Enrollment.objects.COURSE_FULL:
+            return Response(
+                {"error": "This course is full"}, 
+                status=status.HTTP_409_CONFLICT
+            )
         
-        enrollment = Enrollment.objects.create(student=request.user, course=course)
         serializer = EnrollmentSerializer(enrollment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -196,18 +484,30 @@ class StudentUnenrollView(APIView):
     
     def delete(self, request, course_id):
         enrollment = get_object_or_404(Enrollment, student=request.user, course_id=course_id)
-        enrollment.delete()
+        with transaction.atomic(using=tenant_db()):
+            record_event('enrollment.deleted', enrollment.pk, student=request.user.pk, course=enrollment.course_id)
+            close_period(request.user, enrollment.course_id)
+            enrollment.delete()
+            Course.all_objects.filter(pk=enrollment.course_id).update(enrollment_count=F('enrollment_count') - 1)
         return Response({"message": "Successfully unenrolled from course"}, status=status.HTTP_204_NO_CONTENT)
 
 
 class StudentEnrollmentsView(APIView):
-    """List all enrollments for logged-in student"""
+    """List all enrollments for logged-in student (?include_archived=true adds ended courses)"""
     permission_classes = [IsAuthenticated, IsStudent]
     
     def get(self, request):
-        enrollments = Enrollment.objects.filter(student=request.user).select_related('course__category', 'course__instructor')
-        serializer = StudentEnrollmentSerializer(enrollments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        enrollments = Enrollment.objects.filter(student=request.user).select_related(
+            'course__category', 'course__instructor'
+        ).prefetch_related('course__tags')
+        data = StudentEnrollmentSerializer(enrollments, many=True).data
+        
+        if include_archived(request):
+            archived = ArchivedEnrollment.objects.filter(student=request.user).select_related(
+                'course__category', 'course__instructor'
+            ).prefetch_related('course__tags')
+            data = data + StudentArchivedEnrollmentSerializer(archived, many=True).data
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class CourseEnrollmentsView(APIView):
@@ -229,6 +529,672 @@ class CourseEnrollmentsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        enrollments = Enrollment.objects.filter(course=course).select_related('student')
-        serializer = EnrollmentSerializer(enrollments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        enrollments = Enrollment.objects.filter(course=course).select_related('student', 'course')
+        data = EnrollmentSerializer(enrollments, many=True).data
+        
+        if include_archived(request):
+            archived = ArchivedEnrollment.objects.filter(course=course).select_related('student', 'course')
+            data = data + ArchivedEnrollmentSerializer(archived, many=True).data
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# ==================== Content Views ====================
+
+class CourseModulesView(APIView):
+    """Course outline: modules with their lessons in order, or add a module (course owner or admin)"""
+    
+    def get_permissions(self):
+        if self.request.method == 'POST':
+            return [IsAuthenticated(), IsInstructorOrAdmin()]
+        return [AllowAny()]
+    
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        modules = Module.objects.filter(course=course).prefetch_related(
+            Prefetch('lessons', queryset=Lesson.objects.only('id', 'module', 'title', 'duration_seconds', 'position'))
+        )
+        serializer = ModuleSerializer(modules, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        if not can_edit_course(request.user, course):
+            return Response(
+                {"error": "You can only add modules to your own courses"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = ModuleSerializer(data=request.data)
+        if serializer.is_valid():
+            position = serializer.validated_data.get('position') or next_position(course.modules.all())
+            serializer.save(course=course, position=position)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ModuleDetailView(APIView):
+    """Rename, move or delete a module (course owner or admin)"""
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def put(self, request, pk):
+        module = get_object_or_404(Module.objects.select_related('course'), pk=pk)
+        if not can_edit_course(request.user, module.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = ModuleSerializer(module, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def delete(self, request, pk):
+        module = get_object_or_404(Module.objects.select_related('course'), pk=pk)
+        if not can_edit_course(request.user, module.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        with transaction.atomic(using=tenant_db()):
+            # One DELETE for the progress rows instead of loading them through the collector
+            LessonProgress.objects.filter(lesson__module=module).delete()
+            module.delete()
+        return Response({"message": "Module deleted"}, status=status.HTTP_204_NO_CONTENT)
+
+
+class ModuleLessonsView(APIView):
+    """Add a lesson to a module (course owner or admin)"""
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def post(self, request, module_id):
+        module = get_object_or_404(Module.objects.select_related('course'), pk=module_id)
+        if not can_edit_course(request.user, module.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = LessonSerializer(data=request.data)
+        if serializer.is_valid():
+            position = serializer.validated_data.get('position') or next_position(module.lessons.all())
+            serializer.save(module=module, position=position)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class LessonDetailView(APIView):
+    """
+    Get a lesson (enrolled students, the course owner and admins),
+    or update or delete it (course owner or admin)
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_lesson(self, pk):
+        return get_object_or_404(Lesson.objects.select_related('module__course'), pk=pk)
+    
+    def get(self, request, pk):
+        lesson = self.get_lesson(pk)
+        if not can_view_course_content(request.user, lesson.module.course):
+            return Response(
+                {"error": "Enroll in this course to view its lessons"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = LessonSerializer(lesson)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    def put(self, request, pk):
+        lesson = self.get_lesson(pk)
+        if not can_edit_course(request.user, lesson.module.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = LessonSerializer(lesson, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def delete(self, request, pk):
+        lesson = self.get_lesson(pk)
+        if not can_edit_course(request.user, lesson.module.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        with transaction.atomic(using=tenant_db()):
+            LessonProgress.objects.filter(lesson=lesson).delete()
+            lesson.delete()
+        return Response({"message": "Lesson deleted"}, status=status.HTTP_204_NO_CONTENT)
+
+
+# ==================== Progress Views ====================
+
+class LessonProgressView(APIView):
+    """
+    Report playback progress in a lesson (enrolled students)
+    POST /lms/lessons/<id>/progress/ {"position_seconds": 95, "completed": false}
+    Pings are buffered and written in batches (lms.progress), hence 202.
+    """
+    permission_classes = [IsAuthenticated, IsStudent]
+    
+    def post(self, request, pk):
+        serializer = ProgressPingSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # The only query on the hot path: the lesson exists and the student is enrolled
+        duration = Lesson.objects.filter(
+            pk=pk, module__course__enrollments__student=request.user
+        ).values_list('duration_seconds', flat=True).first()
+        if duration is None:
+            if not Lesson.objects.filter(pk=pk).exists():
+                return Response({"error": "Lesson not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(
+                {"error": "You are not enrolled in this course"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        position = serializer.validated_data['position_seconds']
+        if duration:
+            position = min(position, duration)
+        progress_buffer.record(request.user.id, int(pk), position, serializer.validated_data['completed'])
+        return Response({"position_seconds": position}, status=status.HTTP_202_ACCEPTED)
+
+
+class CourseProgressView(APIView):
+    """Progress of the logged-in student through every lesson of a course"""
+    permission_classes = [IsAuthenticated, IsStudent]
+    
+    def get(self, request, course_id):
+        if not Enrollment.objects.filter(student=request.user, course_id=course_id).exists():
+            return Response(
+                {"error": "You are not enrolled in this course"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        lessons = Lesson.objects.filter(module__course_id=course_id).order_by(
+            'module__position', 'module_id', 'position', 'id'
+        ).values_list('id', flat=True)
+        saved = {
+            row['lesson']: (row['position_seconds'], row['completed'], row['updated_at'])
+            for row in LessonProgress.objects.filter(
+                student=request.user, lesson__module__course_id=course_id
+            ).values('lesson', 'position_seconds', 'completed', 'updated_at')
+        }
+        # Pings still waiting in this process's buffer are newer than what is saved
+        for lesson, (position, completed, at) in progress_buffer.pending_for(request.user.id).items():
+            previous = saved.get(lesson)
+            saved[lesson] = (position, completed or bool(previous and previous[1]), at)
+        
+        rows = []
+        for lesson in lessons:
+            position, completed, at = saved.get(lesson, (0, False, None))
+            rows.append({'lesson': lesson, 'position_seconds': position, 'completed': completed, 'updated_at': at})
+        done = sum(row['completed'] for row in rows)
+        return Response({
+            'course': int(course_id),
+            'lessons_total': len(rows),
+            'lessons_completed': done,
+            'percent': round(100 * done / len(rows), 1) if rows else 0.0,
+            'lessons': rows,
+        }, status=status.HTTP_200_OK)
+
+
+# ==================== Material Views ====================
+
+class CourseMaterialsView(APIView):
+    """List the files attached to a course (enrolled students, course owner, admin)"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        if not can_view_course_content(request.user, course):
+            return Response(
+                {"error": "Enroll in this course to view its materials"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = CourseMaterialSerializer(CourseMaterial.objects.filter(course=course).order_by('id'), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MaterialUploadCreateView(APIView):
+    """
+    Start a resumable upload (course owner or admin)
+    POST /lms/courses/<id>/materials/uploads/ {"title", "file_name", "size", "content_type"}
+    Then PUT the bytes in chunks to /lms/materials/uploads/<upload id>/.
+    """
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        if not can_edit_course(request.user, course):
+            return Response(
+                {"error": "You can only add materials to your own courses"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = MaterialUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(course=course, uploaded_by=request.user)
+            return Response(
+                {**serializer.data, "max_chunk_size": materials.max_chunk_size()}, 
+                status=status.HTTP_201_CREATED
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MaterialUploadView(APIView):
+    """
+    Resume, continue or abort an upload (the uploader or an admin)
+    GET    returns how many bytes have been received
+    PUT    appends a chunk: raw body with "Content-Range: bytes <first>-<last>/<total>",
+           where <first> must equal the received count; the last chunk creates the material
+    DELETE aborts the upload
+    """
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def get_upload(self, request, pk):
+        upload = get_object_or_404(MaterialUpload, pk=pk)
+        if request.user.role != 'admin' and upload.uploaded_by_id != request.user.id:
+            return None
+        return upload
+    
+    def get(self, request, pk):
+        upload = self.get_upload(request, pk)
+        if upload is None:
+            return Response({"error": "You can only access your own uploads"}, status=status.HTTP_403_FORBIDDEN)
+        return Response(MaterialUploadSerializer(upload).data, status=status.HTTP_200_OK)
+    
+    def put(self, request, pk):
+        upload = self.get_upload(request, pk)
+        if upload is None:
+            return Response({"error": "You can only access your own uploads"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            first, last = materials.parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), upload.size)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        length = last - first + 1
+        if length > materials.max_chunk_size():
+            return Response(
+                {"error": f"Chunks are limited to {materials.max_chunk_size()} bytes"}, 
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        if first != upload.received:
+            return Response(
+                {"error": "Chunk does not start at the received offset", "received": upload.received}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        if request.META.get('CONTENT_LENGTH') != str(length):
+            return Response({"error": "Content-Length must match Content-Range"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Streamed straight from the socket to disk, BLOCK_SIZE bytes at a time
+        written = materials.write_chunk(materials.partial_path(upload), first, request.stream, length)
+        if written != length:
+            return Response(
+                {"error": "Incomplete chunk, resend it", "received": upload.received}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        received = first + length
+        # Conditional on the offset, so of two concurrent copies of a chunk only one counts
+        if not MaterialUpload.objects.filter(pk=upload.pk, received=first).update(
+            received=received, updated_at=timezone.now()
+        ):
+            return Response(
+                {"error": "Upload changed meanwhile, ask for the received offset"}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        if received < upload.size:
+            return Response({"received": received, "size": upload.size}, status=status.HTTP_200_OK)
+        
+        storage_name, content_type = materials.finish_upload(upload)
+        with transaction.atomic(using=tenant_db()):
+            material = CourseMaterial.objects.create(
+                course_id=upload.course_id, title=upload.title, file_name=upload.file_name,
+                content_type=content_type, size=upload.size, uploaded_by_id=upload.uploaded_by_id,
+                storage_name=storage_name,
+            )
+            upload.delete()
+        return Response(CourseMaterialSerializer(material).data, status=status.HTTP_201_CREATED)
+    
+    def delete(self, request, pk):
+        upload = self.get_upload(request, pk)
+        if upload is None:
+            return Response({"error": "You can only access your own uploads"}, status=status.HTTP_403_FORBIDDEN)
+        path = materials.partial_path(upload)
+        upload.delete()
+        materials.remove_files([path])
+        return Response({"message": "Upload aborted"}, status=status.HTTP_204_NO_CONTENT)
+
+
+class MaterialDetailView(APIView):
+    """Delete a material and its file (course owner or admin)"""
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def delete(self, request, pk):
+        material = get_object_or_404(CourseMaterial.objects.select_related('course'), pk=pk)
+        if not can_edit_course(request.user, material.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        path = materials.material_path(material)
+        material.delete()
+        materials.remove_files([path])
+        return Response({"message": "Material deleted"}, status=status.HTTP_204_NO_CONTENT)
+
+
+class MaterialDownloadView(APIView):
+    """
+    Download a material (enrolled students, course owner, admin)
+    Supports "Range: bytes=<first>-<last>" for seeking and resuming (206), and
+    ?download=true for an attachment instead of inline display. Only video,
+    audio, PDF and (non-SVG) images are ever displayed inline.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, pk):
+        material = get_object_or_404(CourseMaterial.objects.select_related('course'), pk=pk)
+        if not can_view_course_content(request.user, material.course):
+            return Response(
+                {"error": "Enroll in this course to download its materials"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        as_attachment = request.query_params.get('download', '').lower() in ('1', 'true', 'yes')
+        return materials.download_response(request, material, as_attachment)
+
+
+# ==================== Quiz Views ====================
+
+class CourseQuizzesView(APIView):
+    """List a course's quizzes (enrolled students, course owner, admin), or add one (course owner or admin)"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        if not can_view_course_content(request.user, course):
+            return Response(
+                {"error": "Enroll in this course to view its quizzes"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = QuizSerializer(Quiz.objects.filter(course=course).order_by('id'), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        if not can_edit_course(request.user, course):
+            return Response(
+                {"error": "You can only add quizzes to your own courses"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = QuizSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(course=course)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class QuizDetailView(APIView):
+    """
+    Get a quiz with its questions (enrolled students, course owner, admin),
+    or update or delete it (course owner or admin). Only the course owner
+    and admins see the answer key.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_quiz(self, pk):
+        return get_object_or_404(Quiz.objects.select_related('course'), pk=pk)
+    
+    def get(self, request, pk):
+        quiz = self.get_quiz(pk)
+        editor = can_edit_course(request.user, quiz.course)
+        if not editor and not can_view_course_content(request.user, quiz.course):
+            return Response(
+                {"error": "Enroll in this course to view its quizzes"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        question_serializer = QuestionSerializer if editor else QuestionPublicSerializer
+        data = QuizSerializer(quiz).data
+        data['questions'] = question_serializer(quiz.questions.all(), many=True).data
+        return Response(data, status=status.HTTP_200_OK)
+    
+    def put(self, request, pk):
+        quiz = self.get_quiz(pk)
+        if not can_edit_course(request.user, quiz.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = QuizSerializer(quiz, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def delete(self, request, pk):
+        quiz = self.get_quiz(pk)
+        if not can_edit_course(request.user, quiz.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        with transaction.atomic(using=tenant_db()):
+            # Leaves first, with one DELETE each, instead of loading answers through the collector
+            QuizAnswer.objects.filter(question__quiz=quiz).delete()
+            QuizSubmission.objects.filter(quiz=quiz).delete()
+            Question.objects.filter(quiz=quiz).delete()
+            quiz.delete()
+        return Response({"message": "Quiz deleted"}, status=status.HTTP_204_NO_CONTENT)
+
+
+class QuizQuestionsView(APIView):
+    """
+    Add a question to a quiz (course owner or admin)
+    POST /lms/quizzes/<id>/questions/ {"text", "options": [...], "correct": [0], "points": 1, "partial_credit": false}
+    Existing submissions are regraded in the background, since the maximum score changes.
+    """
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def post(self, request, quiz_id):
+        quiz = get_object_or_404(Quiz.objects.select_related('course'), pk=quiz_id)
+        if not can_edit_course(request.user, quiz.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = QuestionSerializer(data=request.data)
+        if serializer.is_valid():
+            position = serializer.validated_data.get('position') or next_position(quiz.questions.all())
+            with transaction.atomic(using=tenant_db()):
+                serializer.save(quiz=quiz, position=position)
+                schedule_regrade(quiz.pk)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class QuestionDetailView(APIView):
+    """
+    Update or delete a question (course owner or admin). Changing the key,
+    points or partial credit, or deleting the question, regrades every
+    submission to the quiz in the background, in batches (lms.grading).
+    """
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def get_question(self, pk):
+        return get_object_or_404(Question.objects.select_related('quiz__course'), pk=pk)
+    
+    def put(self, request, pk):
+        question = self.get_question(pk)
+        if not can_edit_course(request.user, question.quiz.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        graded_as = (question.correct, question.points, question.partial_credit)
+        serializer = QuestionSerializer(question, data=request.data, partial=True)
+        if serializer.is_valid():
+            with transaction.atomic(using=tenant_db()):
+                question = serializer.save()
+                if (question.correct, question.points, question.partial_credit) != graded_as:
+                    schedule_regrade(question.quiz_id)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def delete(self, request, pk):
+        question = self.get_question(pk)
+        if not can_edit_course(request.user, question.quiz.course):
+            return Response({"error": "You can only edit your own courses"}, status=status.HTTP_403_FORBIDDEN)
+        with transaction.atomic(using=tenant_db()):
+            question.delete()
+            schedule_regrade(question.quiz_id)
+        return Response({"message": "Question deleted"}, status=status.HTTP_204_NO_CONTENT)
+
+
+class QuizSubmissionsView(APIView):
+    """
+    Submit answers to a quiz (enrolled students, once); graded right away
+    POST /lms/quizzes/<id>/submissions/ {"answers": {"<question id>": [0, 2]}}
+    GET lists every submission for the course owner and admins (?limit=, ?offset=),
+    and the student's own submission otherwise.
+    """
+    
+    def get_permissions(self):
+        if self.request.method == 'POST':
+            return [IsAuthenticated(), IsStudent()]
+        return [IsAuthenticated()]
+    
+    def get(self, request, quiz_id):
+        quiz = get_object_or_404(Quiz.objects.select_related('course'), pk=quiz_id)
+        submissions = QuizSubmission.objects.filter(quiz=quiz).select_related('student').order_by('id')
+        if can_edit_course(request.user, quiz.course):
+            try:
+                submissions = paginate(submissions, request.query_params)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            submissions = submissions.filter(student=request.user)
+        serializer = QuizSubmissionSerializer(submissions, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    def post(self, request, quiz_id):
+        serializer = QuizAnswersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        quiz = get_object_or_404(Quiz, pk=quiz_id)
+        if not Enrollment.objects.filter(student=request.user, course_id=quiz.course_id).exists():
+            return Response(
+                {"error": "You are not enrolled in this course"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        questions = list(quiz.questions.values_list('id', 'correct', 'points', 'partial_credit', 'options'))
+        option_counts = {row[0]: len(row[4]) for row in questions}
+        answers = {}
+        for question_id, selected in serializer.validated_data['answers'].items():
+            question_id = int(question_id) if str(question_id).isdigit() else None
+            if question_id not in option_counts:
+                return Response({"error": "Answers must be for questions of this quiz"}, status=status.HTTP_400_BAD_REQUEST)
+            if selected >> option_counts[question_id]:
+                return Response(
+                    {"error": f"Question {question_id} has only {option_counts[question_id]} options"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            answers[question_id] = selected
+        
+        key = AnswerKey(row[:4] for row in questions)
+        try:
+            with transaction.atomic(using=tenant_db()):
+                submission = QuizSubmission.objects.create(
+                    quiz=quiz, student=request.user, score=key.grade_answers(answers), max_score=key.max_score,
+                    graded_at=timezone.now(),
+                )
+                QuizAnswer.objects.bulk_create([
+                    QuizAnswer(submission=submission, question_id=question_id, selected=selected)
+                    for question_id, selected in answers.items()
+                ])
+        except IntegrityError:
+            return Response({"error": "You have already submitted this quiz"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(QuizSubmissionSerializer(submission).data, status=status.HTTP_201_CREATED)
+
+
+class QuizRegradeView(APIView):
+    """
+    Grade every submission again against the current answer key (course owner or admin).
+    Returns 202 right away; the submissions are regraded in the background.
+    """
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def post(self, request, quiz_id):
+        quiz = get_object_or_404(Quiz.objects.select_related('course'), pk=quiz_id)
+        if not can_edit_course(request.user, quiz.course):
+            return Response({"error": "You can only regrade your own quizzes"}, status=status.HTTP_403_FORBIDDEN)
+        schedule_regrade(quiz.pk)
+        return Response({"message": "Regrade started"}, status=status.HTTP_202_ACCEPTED)
+
+
+# ==================== Gradebook Views ====================
+
+class CourseGradebookView(APIView):
+    """
+    Student x quiz grade matrix of a course (course owner or admin)
+    GET /lms/courses/<id>/gradebook/ returns per-quiz and total statistics;
+    ?export=csv or ?export=ndjson streams a row per enrolled student with their
+    scores, weighted total (percent) and percentile rank.
+    """
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        if not can_edit_course(request.user, course):
+            return Response(
+                {"error": "You can only view the gradebook of your own courses"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        export = request.query_params.get('export')
+        if export not in (None, 'csv', 'ndjson'):
+            return Response({"error": "export must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        gradebook = Gradebook.for_course(course.pk)
+        if export is None:
+            return Response({'course': course.pk, **gradebook.summary()}, status=status.HTTP_200_OK)
+        if export == 'csv':
+            response = StreamingHttpResponse(gradebook.csv_chunks(), content_type='text/csv; charset=utf-8')
+        else:
+            response = StreamingHttpResponse(gradebook.ndjson_chunks(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = content_disposition_header(True, f"gradebook-{course.pk}.{export}")
+        return response
+
+
+# ==================== Announcement Views ====================
+
+class CourseAnnouncementsView(APIView):
+    """
+    List a course's announcements, newest first (enrolled students, course owner, admin),
+    or post one (course owner or admin). Posting only stores it: the emails to every
+    enrolled student go out in the background (lms.announcements), hence 202.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        if not can_view_course_content(request.user, course):
+            return Response(
+                {"error": "Enroll in this course to view its announcements"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        announcements = Announcement.objects.filter(course=course).select_related('author').order_by('-id')
+        try:
+            announcements = paginate(announcements, request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = AnnouncementSerializer(announcements, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        if not can_edit_course(request.user, course):
+            return Response(
+                {"error": "You can only post announcements to your own courses"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = AnnouncementSerializer(data=request.data)
+        if serializer.is_valid():
+            with transaction.atomic(using=tenant_db()):
+                announcement = serializer.save(course=course, author=request.user)
+                schedule_announcement(announcement)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AnnouncementDeliveriesView(APIView):
+    """
+    Delivery status of an announcement per student (course owner or admin)
+    Filter with ?status=pending|sent|failed and page with ?limit= and ?offset=.
+    """
+    permission_classes = [IsAuthenticated, IsInstructorOrAdmin]
+    
+    def get(self, request, pk):
+        announcement = get_object_or_404(Announcement.objects.select_related('course'), pk=pk)
+        if not can_edit_course(request.user, announcement.course):
+            return Response(
+                {"error": "You can only view deliveries of your own announcements"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        deliveries = AnnouncementDelivery.objects.filter(announcement=announcement)
+        delivery_status = request.query_params.get('status')
+        if delivery_status:
+            if delivery_status not in dict(AnnouncementDelivery.STATUS_CHOICES):
+                return Response({"error": "status must be pending, sent or failed"}, status=status.HTTP_400_BAD_REQUEST)
+            deliveries = deliveries.filter(status=delivery_status)
+        try:
+            deliveries = paginate(deliveries.select_related('student').order_by('id'), request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'announcement': AnnouncementSerializer(announcement).data,
+            'deliveries': AnnouncementDeliverySerializer(deliveries, many=True).data,
+        }, status=status.HTTP_200_OK)
@@ -3,6 +3,10 @@ ASGI config for lms_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve through an ASGI server (e.g. ``uvicorn lms_project.asgi:application``)
+to use the live admin dashboard stream at /api/dashboard/stream/; its async
+view holds connections open without tying up a worker thread each.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -0,0 +1,142 @@
+"""
+Runtime N+1 detection and slow-query logging.
+
+QueryInspectorMiddleware wraps every request in inspect_queries(), which
+installs a database execute wrapper on each connection. The wrapper groups
+SELECTs by shape (the SQL with its IN lists collapsed) and reports a shape
+repeated QUERY_INSPECTOR['N_PLUS_ONE_THRESHOLD'] times in one request, with
+the stack that issued it. Statements slower than SLOW_QUERY_MS are logged
+together with their query plan. MODE is 'warn' (log), 'raise' (used by the
+test runner so new N+1s fail tests) or 'off'.
+
+The middleware is async-capable, so async views are not pushed onto a
+thread, but it passes them through uninspected: their queries run in
+sync_to_async threads, whose connections the wrappers installed here do
+not reach.
+"""
+import logging
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('lms.queries')
+
+DEFAULTS = {
+    'MODE': 'warn',
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_QUERY_MS': 100,
+    'EXPLAIN_SLOW_QUERIES': True,
+}
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def get_setting(name):
+    return getattr(settings, 'QUERY_INSPECTOR', {}).get(name, DEFAULTS[name])
+
+
+def query_shape(sql):
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def _caller_stack():
+    """Stack frames from project code only, innermost last"""
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('query_inspector.py')
+    ]
+    return ''.join(traceback.format_list(frames))
+
+
+def explain(connection, sql, params):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+
+class QueryInspector:
+    def __init__(self, alias, label=''):
+        self.alias = alias
+        self.label = label
+        self.shapes = Counter()
+        self.reported = set()
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            self.check_repeats(sql)
+            if elapsed >= get_setting('SLOW_QUERY_MS'):
+                self.log_slow(context['connection'], sql, params, elapsed)
+        return result
+
+    def check_repeats(self, sql):
+        shape = query_shape(sql)
+        self.shapes[shape] += 1
+        count = self.shapes[shape]
+        if count < get_setting('N_PLUS_ONE_THRESHOLD') or shape in self.reported:
+            return
+        self.reported.add(shape)
+        message = f"Possible N+1 in {self.label}: same query ran {count} times\n{shape}\n{_caller_stack()}"
+        if get_setting('MODE') == 'raise':
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+    def log_slow(self, connection, sql, params, elapsed):
+        plan = ''
+        if get_setting('EXPLAIN_SLOW_QUERIES'):
+            self.explaining = True
+            try:
+                plan = explain(connection, sql, params)
+            except Exception as e:
+                plan = f"(EXPLAIN failed: {e})"
+            finally:
+                self.explaining = False
+        logger.warning("Slow query (%.1f ms) in %s\n%s\nPlan:\n%s", elapsed, self.label, sql, plan)
+
+
+@contextmanager
+def inspect_queries(label=''):
+    """Inspect every query run on any connection inside the block"""
+    if get_setting('MODE') == 'off':
+        yield None
+        return
+    inspectors = [QueryInspector(alias, label) for alias in connections]
+    with ExitStack() as stack:
+        for inspector in inspectors:
+            stack.enter_context(connections[inspector.alias].execute_wrapper(inspector))
+        yield inspectors
+
+
+class QueryInspectorMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        with inspect_queries(f"{request.method} {request.path}"):
+            return self.get_response(request)
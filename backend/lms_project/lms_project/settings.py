@@ -14,6 +14,7 @@ from pathlib import Path
 from datetime import timedelta
 import os
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 # Load environment variables from .env file
 load_dotenv()
@@ -53,6 +54,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'lms_project.tenancy.TenantMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,6 +62,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'lms_project.query_inspector.QueryInspectorMiddleware',
 ]
 
 ROOT_URLCONF = 'lms_project.urls'
@@ -89,9 +93,55 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,  # seconds to wait for the writer lock before failing
+        },
+        'TEST': {
+            # File-backed so concurrency tests get real SQLite locking semantics
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Organization tenancy (lms_project/tenancy.py): every slug in TENANTS gets its own
+# database, picked per request from the X-Tenant header, the subdomain under
+# TENANT_DOMAIN or the tenant claim of the JWT. Requests naming no tenant use default.
+# Create or update the tenant databases with ``manage.py migrate_tenants``.
+TENANTS = [slug.strip() for slug in os.getenv('TENANTS', '').split(',') if slug.strip()]
+TENANT_DOMAIN = os.getenv('TENANT_DOMAIN', '')
+TENANT_DB_DIR = Path(os.getenv('TENANT_DB_DIR', BASE_DIR / 'tenants'))
+for _slug in TENANTS:
+    DATABASES[f'tenant_{_slug}'] = {
+        **DATABASES['default'],
+        'NAME': TENANT_DB_DIR / f'{_slug}.sqlite3',
+        'TEST': {'NAME': BASE_DIR / f'test_db_{_slug}.sqlite3'},
+    }
+
+DATABASE_ROUTERS = ['lms_project.tenancy.TenantRouter']
+
+
+# N+1 and slow query detection (lms_project/query_inspector.py).
+# MODE is 'warn', 'raise' or 'off'; the test runner switches it to 'raise'.
+QUERY_INSPECTOR = {
+    'MODE': os.getenv('QUERY_INSPECTOR_MODE', 'warn'),
+    'N_PLUS_ONE_THRESHOLD': int(os.getenv('N_PLUS_ONE_THRESHOLD', '5')),
+    'SLOW_QUERY_MS': float(os.getenv('SLOW_QUERY_MS', '100')),
+    'EXPLAIN_SLOW_QUERIES': True,
+}
+
+TEST_RUNNER = 'lms_project.test_runner.QueryInspectingTestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'lms.queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -129,6 +179,17 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded media served by the web server (and by Django when DEBUG is on)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = Path(os.getenv('MEDIA_ROOT', BASE_DIR / 'media'))
+
+# Course cover renditions are rendered in a process pool of this size (lms/covers.py);
+# 0 renders on the request thread, for development and tests
+COVER_WORKERS = int(os.getenv('COVER_WORKERS', '2'))
+COVER_MAX_SIZE = int(os.getenv('COVER_MAX_SIZE', str(10 * 1024 ** 2)))
+# Uploaded originals (with their EXIF metadata) are kept here, outside MEDIA_ROOT
+COVER_ORIGINALS_DIR = Path(os.getenv('COVER_ORIGINALS_DIR', BASE_DIR / 'cover_originals'))
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User' 
 
@@ -141,10 +202,62 @@ AUTHENTICATION_BACKENDS = [
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.TenantJWTAuthentication',
     ),
+    # Token buckets for login/register/password reset (api/throttling.py).
+    # '<scope>' is per client IP, '<scope>_email' per submitted email address.
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.getenv('RATE_LIMIT_LOGIN', '20/min'),
+        'login_email': os.getenv('RATE_LIMIT_LOGIN_EMAIL', '5/min'),
+        'register': os.getenv('RATE_LIMIT_REGISTER', '10/hour'),
+        'password_reset': os.getenv('RATE_LIMIT_PASSWORD_RESET', '10/hour'),
+        'password_reset_email': os.getenv('RATE_LIMIT_PASSWORD_RESET_EMAIL', '3/hour'),
+    },
+    # Number of trusted reverse proxies in front of Django; 0 uses REMOTE_ADDR
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
+}
+
+# Request profiles captured with the X-Profile-Token header (api/profiling.py)
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', BASE_DIR / 'profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '100'))
+
+# Lesson progress pings are coalesced per worker and written in batches (lms/progress.py).
+# A crashed worker loses at most FLUSH_INTERVAL seconds of pings.
+PROGRESS_BUFFER = {
+    'FLUSH_INTERVAL': float(os.getenv('PROGRESS_FLUSH_INTERVAL', '5')),
+    'MAX_PENDING': int(os.getenv('PROGRESS_MAX_PENDING', '1000')),
 }
 
+# Course material files (lms/materials.py). MATERIALS_SENDFILE hands downloads to the
+# front-end server: 'x-accel-redirect' (nginx, an internal location serving MATERIALS_DIR
+# at MATERIALS_ACCEL_PREFIX) or 'x-sendfile' (Apache/lighttpd); empty streams from Django.
+MATERIALS_DIR = Path(os.getenv('MATERIALS_DIR', BASE_DIR / 'materials'))
+MATERIALS_SENDFILE = os.getenv('MATERIALS_SENDFILE', '')
+MATERIALS_ACCEL_PREFIX = os.getenv('MATERIALS_ACCEL_PREFIX', '/protected-materials/')
+MATERIAL_MAX_SIZE = int(os.getenv('MATERIAL_MAX_SIZE', str(2 * 1024 ** 3)))
+MATERIAL_MAX_CHUNK_SIZE = int(os.getenv('MATERIAL_MAX_CHUNK_SIZE', str(16 * 1024 ** 2)))
+# Unfinished uploads idle for longer than this are removed by purge_uploads
+MATERIAL_UPLOAD_TTL = int(os.getenv('MATERIAL_UPLOAD_TTL', str(24 * 3600)))
+
+# Submissions graded per batch when a quiz is regraded (lms/grading.py)
+GRADING_BATCH_SIZE = int(os.getenv('GRADING_BATCH_SIZE', '10000'))
+
+# Announcement emails (lms/announcements.py): roster chunk size, SMTP connections kept
+# open in parallel, retries (with a growing delay, in seconds) of a batch whose
+# connection fails, and seconds without progress after which a send counts as dead
+ANNOUNCEMENT_DELIVERY = {
+    'BATCH_SIZE': int(os.getenv('ANNOUNCEMENT_BATCH_SIZE', '500')),
+    'CONNECTIONS': int(os.getenv('ANNOUNCEMENT_SMTP_CONNECTIONS', '4')),
+    'RETRIES': int(os.getenv('ANNOUNCEMENT_RETRIES', '3')),
+    'RETRY_DELAY': float(os.getenv('ANNOUNCEMENT_RETRY_DELAY', '2')),
+    'STALE_AFTER': int(os.getenv('ANNOUNCEMENT_STALE_AFTER', '900')),
+}
+
+# Shared rate limit buckets for all workers on this host (empty disables it)
+RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', str(BASE_DIR / 'ratelimit.sqlite3'))
+# Keys each worker keeps in its in-process buckets before forgetting the least recent
+RATE_LIMIT_LOCAL_BUCKETS = int(os.getenv('RATE_LIMIT_LOCAL_BUCKETS', '10000'))
+
 # Simple JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=10),
@@ -152,6 +265,17 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Revoked JWTs (api/revocation.py): each worker keeps an in-memory Bloom filter of
+# revoked token ids sized for CAPACITY tokens at ERROR_RATE false positives. It picks up
+# revocations made by other workers every SYNC_INTERVAL seconds and is rebuilt without
+# expired tokens every REBUILD_INTERVAL seconds.
+TOKEN_REVOCATION = {
+    'CAPACITY': int(os.getenv('TOKEN_REVOCATION_CAPACITY', '100000')),
+    'ERROR_RATE': float(os.getenv('TOKEN_REVOCATION_ERROR_RATE', '0.001')),
+    'SYNC_INTERVAL': float(os.getenv('TOKEN_REVOCATION_SYNC_INTERVAL', '1')),
+    'REBUILD_INTERVAL': float(os.getenv('TOKEN_REVOCATION_REBUILD_INTERVAL', '3600')),
+}
+
 # Email Configuration (for password reset)
 # Load from environment variables
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
@@ -175,3 +299,6 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Tenant selection from browsers on another origin (lms_project/tenancy.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-tenant')
+
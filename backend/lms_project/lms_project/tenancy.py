@@ -0,0 +1,157 @@
+"""
+Organization tenancy: one database per tenant.
+
+Each slug in settings.TENANTS gets its own database alias, ``tenant_<slug>``,
+holding that organization's users, courses, enrollments and everything
+hanging off them. Requests that name no tenant use ``default``, so a
+single-organization install runs exactly as before. SQLite serializes
+writers per database file, so tenants never wait on each other's writes.
+
+TenantMiddleware resolves the tenant of a request from, in order, the
+X-Tenant header, the subdomain under TENANT_DOMAIN and the ``tenant`` claim
+of the bearer token (or dashboard stream ticket), and TenantRouter sends
+every query to its database.
+The tenant is kept in a context variable: it follows async views and
+sync_to_async, but not new threads or pool workers, whose targets must be
+wrapped with bind(). transaction.atomic(), on_commit() and raw cursors
+default to ``default`` and need ``using=tenant_db()``.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import JsonResponse
+
+ALIAS_PREFIX = 'tenant_'
+CLAIM = 'tenant'
+
+_current = contextvars.ContextVar('tenant', default=None)
+
+
+class UnknownTenant(LookupError):
+    pass
+
+
+def tenants():
+    return list(getattr(settings, 'TENANTS', []))
+
+
+def tenant_alias(slug):
+    return f"{ALIAS_PREFIX}{slug}" if slug else DEFAULT_DB_ALIAS
+
+
+def current_tenant():
+    """Slug of the tenant being served, None for the default database"""
+    return _current.get()
+
+
+def tenant_db():
+    """Database alias of the tenant being served"""
+    return tenant_alias(_current.get())
+
+
+@contextmanager
+def use_tenant(slug):
+    """Route the queries of the block to ``slug``'s database (None: default)"""
+    if slug is not None and slug not in tenants():
+        raise UnknownTenant(slug)
+    token = _current.set(slug)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def bind(fn):
+    """``fn`` wrapped to run under the current tenant, for threads and pools"""
+    slug = current_tenant()
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        with use_tenant(slug):
+            return fn(*args, **kwargs)
+    return run
+
+
+def _subdomain(request):
+    domain = getattr(settings, 'TENANT_DOMAIN', '')
+    if not domain:
+        return None
+    host = request.get_host().rsplit(':', 1)[0]
+    if host.endswith(f".{domain}"):
+        return host[:-len(domain) - 1]
+    return None
+
+
+def _token_claim(request):
+    # Only picks the database the user is looked up in; the authentication
+    # class still verifies the token and that the claim matches.
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import UntypedToken
+
+    parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+    # EventSource connections cannot send headers, the dashboard stream takes a ticket
+    raw_token = parts[1] if len(parts) == 2 else request.GET.get('ticket')
+    if not raw_token:
+        return None
+    try:
+        return UntypedToken(raw_token).get(CLAIM)
+    except TokenError:
+        return None
+
+
+def tenant_from_request(request):
+    """Slug named by the request, or None; raises UnknownTenant"""
+    slug = request.META.get('HTTP_X_TENANT') or _subdomain(request) or _token_claim(request)
+    if slug and slug not in tenants():
+        raise UnknownTenant(slug)
+    return slug or None
+
+
+class TenantMiddleware:
+    # Async-capable so the live dashboard stream stays on the event loop
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            request.tenant = tenant_from_request(request)
+        except UnknownTenant:
+            return JsonResponse({"error": "Unknown organization"}, status=404)
+        with use_tenant(request.tenant):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        try:
+            request.tenant = tenant_from_request(request)
+        except UnknownTenant:
+            return JsonResponse({"error": "Unknown organization"}, status=404)
+        with use_tenant(request.tenant):
+            return await self.get_response(request)
+
+
+class TenantRouter:
+    """Sends every query to the database of the current tenant"""
+
+    def _db(self, hints):
+        # Objects loaded from one database keep using it (related lookups, saves)
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return tenant_db()
+
+    def db_for_read(self, model, **hints):
+        return self._db(hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(hints)
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+# Tenants given their own test databases when TENANTS names none, so the
+# tenant isolation tests always run
+TEST_TENANTS = ['acme', 'globex']
+
+
+class QueryInspectingTestRunner(DiscoverRunner):
+    """Test runner that turns N+1 warnings from the query inspector into errors"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_INSPECTOR = {**getattr(settings, 'QUERY_INSPECTOR', {}), 'MODE': 'raise'}
+        if not getattr(settings, 'TENANTS', []):
+            add_tenant_databases(TEST_TENANTS)
+
+
+def add_tenant_databases(slugs):
+    """Configure tenant databases the way settings.py does for TENANTS"""
+    settings.TENANTS = list(slugs)
+    for slug in slugs:
+        alias = f'tenant_{slug}'
+        settings.DATABASES[alias] = {
+            **settings.DATABASES['default'],
+            'NAME': settings.TENANT_DB_DIR / f'{slug}.sqlite3',
+            'TEST': {'NAME': settings.BASE_DIR / f'test_db_{slug}.sqlite3'},
+        }
+        if 'settings' in connections.__dict__:
+            # The connection handler already read DATABASES
+            configured = connections.configure_settings({
+                'default': settings.DATABASES['default'], alias: settings.DATABASES[alias],
+            })
+            connections.settings[alias] = configured[alias]
@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -23,3 +25,6 @@ urlpatterns = [
     path('api/', include('api.urls')),  # Include API app URLs
     path('lms/', include('lms.urls')),  # Include LMS app URLs
 ]
+
+# In production the web server serves MEDIA_ROOT (course covers) itself
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,66 @@
+"""
+Warm-up hooks run before a server process takes traffic.
+
+A fresh worker otherwise pays for URL resolver construction, serializer
+field introspection and the first database round trips on live requests.
+gunicorn.conf.py runs the import-time pieces once in the master before
+forking (so workers inherit them copy-on-write) and the connection pieces
+in every worker after the fork.
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.db import connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_url_resolvers():
+    """Build the resolver tree and the reverse() lookup tables"""
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+    for pattern in ('/api/profile/', '/lms/courses/', '/lms/courses/1/'):
+        resolver.resolve(pattern)
+
+
+def warm_serializers():
+    """Instantiate every serializer once so DRF introspects and caches model fields"""
+    from rest_framework import serializers
+    import api.serializers
+    import lms.serializers
+
+    for module in (api.serializers, lms.serializers):
+        for value in vars(module).values():
+            if (isinstance(value, type) and issubclass(value, serializers.BaseSerializer)
+                    and value.__module__ == module.__name__):
+                value().fields
+
+
+def warm_database():
+    """Open connections and touch each model table so page cache and statements are hot"""
+    for alias in connections:
+        connections[alias].ensure_connection()
+    for model in apps.get_models():
+        model._base_manager.order_by().values_list('pk', flat=True).first()
+
+
+def close_database():
+    """Connections must never be shared across fork()"""
+    for conn in connections.all(initialized_only=True):
+        conn.close()
+
+
+def run(stages=('urls', 'serializers', 'database')):
+    """Run the requested warm-up stages and log how long each took"""
+    hooks = {
+        'urls': warm_url_resolvers,
+        'serializers': warm_serializers,
+        'database': warm_database,
+    }
+    for stage in stages:
+        started = time.perf_counter()
+        hooks[stage]()
+        logger.info("Warm-up %s took %.1f ms", stage, (time.perf_counter() - started) * 1000)
@@ -9,6 +9,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms_project.settings')
 django.setup()
 
 from accounts.models import User
+from lms.history import open_period
 from lms.models import Category, Course, Enrollment
 
 def create_users():
@@ -120,9 +121,13 @@ def create_enrollments():
             course=course
         )
         if created:
+            # The history behind cohort retention, as the enroll view records it
+            open_period(student1, course, enrollment.enrolled_at)
             print(f"✓ Enrolled {student1.email} in {course.title}")
         else:
             print(f"✓ Enrollment exists: {student1.email} in {course.title}")
+    # get_or_create bypasses enroll/unenroll, which keep this column in step
+    Course.refresh_enrollment_counts([course.pk for course in courses])
 
 if __name__ == "__main__":
     print("=" * 60)
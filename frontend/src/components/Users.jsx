@@ -22,7 +22,7 @@ function Users() {
 
       if (response.ok) {
         const data = await response.json();
-        setUsers(data);
+        setUsers(data.results);
       } else {
         setError('Failed to fetch users');
       }
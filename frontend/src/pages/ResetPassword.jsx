@@ -8,6 +8,7 @@ function ResetPassword() {
   const navigate = useNavigate();
   const [formData, setFormData] = useState({
     token: '',
+    tenant: '',
     new_password: '',
     confirm_password: ''
   });
@@ -17,6 +18,9 @@ function ResetPassword() {
 
   useEffect(() => {
     const token = searchParams.get('token');
+    // Links sent by an organization's site name it; its accounts live in its own database
+    const tenant = searchParams.get('tenant') || '';
+    setFormData(prev => ({ ...prev, tenant }));
     if (token) {
       setFormData(prev => ({ ...prev, token }));
     } else {
@@ -56,7 +60,10 @@ function ResetPassword() {
     try {
       const response = await fetch(`${API_BASE_URL}/api/password/reset/`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          ...(formData.tenant ? { 'X-Tenant': formData.tenant } : {})
+        },
         body: JSON.stringify({
           token: formData.token,
           new_password: formData.new_password
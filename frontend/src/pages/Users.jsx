@@ -6,15 +6,21 @@ function Users() {
   const [users, setUsers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  const [search, setSearch] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
 
   useEffect(() => {
-    fetchUsers();
-  }, []);
+    const timer = setTimeout(() => fetchUsers(), 250);
+    return () => clearTimeout(timer);
+  }, [search]);
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (cursor = null) => {
     try {
       const token = localStorage.getItem('access_token');
-      const response = await fetch(`${API_BASE_URL}/api/users/`, {
+      const params = new URLSearchParams();
+      if (search.trim()) params.set('q', search.trim());
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`${API_BASE_URL}/api/users/?${params}`, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
@@ -22,7 +28,8 @@ function Users() {
 
       if (response.ok) {
         const data = await response.json();
-        setUsers(data);
+        setUsers(cursor ? [...users, ...data.results] : data.results);
+        setNextCursor(data.next);
       } else {
         setError('Failed to fetch users');
       }
@@ -53,6 +60,14 @@ function Users() {
   return (
     <div className="p-6">
       <h1 className="text-2xl font-bold mb-4">User Management</h1>
+
+      <input
+        type="search"
+        value={search}
+        onChange={(e) => setSearch(e.target.value)}
+        placeholder="Search by name or email"
+        className="mb-4 w-full max-w-md px-3 py-2 border border-gray-300 rounded"
+      />
       
       <div className="bg-white rounded-lg shadow overflow-hidden">
         <table className="min-w-full divide-y divide-gray-200">
@@ -98,6 +113,17 @@ function Users() {
       {users.length === 0 && (
         <p className="text-center text-gray-500 mt-4">No users found</p>
       )}
+
+      {nextCursor && (
+        <div className="text-center mt-4">
+          <button
+            onClick={() => fetchUsers(nextCursor)}
+            className="px-4 py-2 bg-gray-100 text-gray-700 rounded hover:bg-gray-200"
+          >
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 }